@@ -0,0 +1,387 @@
+"""
+Precomputed Allocation Tables
+Allocation, glide-path and projection tables for every (horizon, risk, goal) cell
+
+A recommendation depends on only three inputs: time horizon, risk profile
+and goal. A nightly job computes every cell once and writes the tables to a
+single .npz file of plain arrays; the API loads it at startup and answers
+/investment/recommend with a lookup plus price scaling.
+
+Projections are stored per unit of monthly contribution. With no initial
+amount, every simulated path scales linearly with the contribution, so the
+percentile bands and final-value quantiles only need multiplying. Each
+projection follows the cell's glide path year by year. Open-ended goals keep
+one mix, so an h-year plan is the first h years of a longer one and a single
+simulation per risk profile fills every horizon; target-date goals de-risk
+towards their end date, so each horizon is simulated on its own.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+# Where the tables live
+TABLES_PATH = os.getenv("ALLOCATION_TABLES_PATH", "./data/allocation_tables.npz")
+
+# Horizons covered by the tables (1..MAX_HORIZON_YEARS years)
+MAX_HORIZON_YEARS = 50
+
+# How often (seconds) to look for a newer tables file written by the job
+TABLES_CHECK_SECONDS = 60
+
+# Quantile levels stored for final values (0.5% steps) - used for goal probability
+QUANTILE_LEVELS = np.linspace(0.0, 1.0, 201)
+
+# Goal categories and the words that map free-text goals onto them
+GOAL_KEYWORDS = {
+    "retirement": ["retire", "pension"],
+    "house": ["house", "home", "apartment", "flat", "property"],
+    "education": ["education", "school", "university", "college", "study", "studies"],
+    "car": ["car", "vehicle"],
+    "wealth": ["wealth", "grow", "rich", "passive income"],
+}
+GOAL_CATEGORIES = list(GOAL_KEYWORDS) + ["general"]
+
+# Goals with a target date de-risk as it approaches; open-ended ones keep their mix
+TARGET_DATE_GOALS = {"retirement", "house", "education", "car"}
+
+# Loaded tables (None until load_tables() finds a file)
+_tables: Optional[Dict] = None
+_tables_lock = threading.Lock()
+_last_check = 0.0
+
+
+# Map a free-text goal onto a table category
+def normalize_goal(goal: str) -> str:
+    text = (goal or "").lower()
+    for category, keywords in GOAL_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            return category
+    return "general"
+
+
+# Compute every table (nightly job)
+def build_tables(source: str = "risk_profiles", n_paths: int = 10000, seed: int = 7) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        source: "risk_profiles" (the RISK_PROFILES SPY/BND splits) or
+            "optimizer" (efficient-frontier allocations per risk profile)
+        n_paths: Monte Carlo paths per risk profile
+        seed: RNG seed so rebuilt tables are reproducible
+
+    Returns:
+        Dict of arrays ready for np.savez
+    """
+    # Job-only imports: investment_logic itself reads these tables
+    from investment_logic import RISK_PROFILES, PORTFOLIO_ETFS, determine_risk_profile
+    from monte_carlo import estimate_parameters, simulate_paths
+
+    profiles = list(RISK_PROFILES)
+
+    # Allocation per risk profile: {symbol: percentage}
+    if source == "optimizer":
+        from optimizer import optimize_portfolio
+        profile_weights = {
+            profile: {a["etf"]: a["percentage"] for a in optimize_portfolio(profile)["allocations"]}
+            for profile in profiles
+        }
+    elif source == "risk_profiles":
+        profile_weights = {
+            profile: {
+                PORTFOLIO_ETFS["stocks"]["etf"]: RISK_PROFILES[profile]["stocks"],
+                PORTFOLIO_ETFS["bonds"]["etf"]: RISK_PROFILES[profile]["bonds"],
+            }
+            for profile in profiles
+        }
+    else:
+        raise ValueError(f"Unknown table source: {source}")
+
+    # Column order = first appearance, so stocks stay ahead of bonds as in calculate_portfolio
+    symbols = list(dict.fromkeys(symbol for weights in profile_weights.values() for symbol in weights))
+    profile_matrix = np.array([
+        [profile_weights[profile].get(symbol, 0.0) for symbol in symbols] for profile in profiles
+    ], dtype=np.float32)
+
+    horizons = np.arange(1, MAX_HORIZON_YEARS + 1)
+    n_h, n_r, n_g, n_s = len(horizons), len(profiles), len(GOAL_CATEGORIES), len(symbols)
+
+    # Year-0 weights are the profile mix in every cell; the goal only shapes the glide path
+    weights = np.broadcast_to(profile_matrix[None, :, None, :], (n_h, n_r, n_g, n_s)).copy()
+
+    # Glide paths: row y is the mix for year y of an h-year plan. Target-date
+    # goals follow the mix for the years remaining; open-ended goals stay put.
+    remaining_profile = np.array([profiles.index(determine_risk_profile(h)) for h in horizons])
+    glide = np.zeros((n_h, n_r, n_g, MAX_HORIZON_YEARS, n_s), dtype=np.float32)
+    for hi, h in enumerate(horizons):
+        remaining = remaining_profile[h - np.arange(h) - 1]
+        for gi, goal in enumerate(GOAL_CATEGORIES):
+            if goal in TARGET_DATE_GOALS:
+                glide[hi, :, gi, :h] = profile_matrix[remaining][None, :, :]
+            else:
+                glide[hi, :, gi, :h] = profile_matrix[:, None, :]
+
+    # Simulation parameters of each profile's mix
+    profile_params = [estimate_parameters(profile_weights[profile], profile) for profile in profiles]
+    monthly_mu = np.array([params["monthly_mu"] for params in profile_params])
+    monthly_sigma = np.array([params["monthly_sigma"] for params in profile_params])
+    year_ends = np.arange(12, MAX_HORIZON_YEARS * 12 + 1, 12)
+
+    # Unit-contribution paths for a plan holding profile year_profiles[y] in year y
+    def simulate(year_profiles: np.ndarray) -> np.ndarray:
+        monthly_profiles = np.repeat(year_profiles, 12)
+        return simulate_paths(
+            1.0, len(monthly_profiles), monthly_mu[monthly_profiles], monthly_sigma[monthly_profiles],
+            n_paths=n_paths, seed=seed, snapshot_months=year_ends[:len(year_profiles)]
+        )
+
+    # Average return/volatility over the plan, for display
+    def plan_parameters(year_profiles: np.ndarray):
+        mu = monthly_mu[year_profiles].mean()
+        sigma = np.sqrt((monthly_sigma[year_profiles] ** 2).mean())
+        return float(np.expm1(12 * (mu + sigma ** 2 / 2))), float(sigma * np.sqrt(12))
+
+    # Projections per unit of monthly contribution, per cell: yearly bands,
+    # final-value quantiles and mean at the end of the plan
+    bands = np.zeros((n_h, n_r, n_g, MAX_HORIZON_YEARS, 3), dtype=np.float32)
+    quantiles = np.zeros((n_h, n_r, n_g, len(QUANTILE_LEVELS)), dtype=np.float32)
+    means = np.zeros((n_h, n_r, n_g), dtype=np.float32)
+    parameters = np.zeros((n_h, n_r, n_g, 2), dtype=np.float64)
+    parameter_sources = [params["source"] for params in profile_params]
+    target_goals = [gi for gi, goal in enumerate(GOAL_CATEGORIES) if goal in TARGET_DATE_GOALS]
+    open_goals = [gi for gi, goal in enumerate(GOAL_CATEGORIES) if goal not in TARGET_DATE_GOALS]
+
+    # Open-ended goals: one simulation per profile covers every horizon
+    for ri in range(n_r):
+        values = simulate(np.full(MAX_HORIZON_YEARS, ri))
+        profile_bands = np.quantile(values, [0.10, 0.50, 0.90], axis=0).T
+        profile_quantiles = np.quantile(values, QUANTILE_LEVELS, axis=0).T
+        profile_means = values.mean(axis=0)
+        for hi, h in enumerate(horizons):
+            bands[hi, ri, open_goals, :h] = profile_bands[:h]
+            quantiles[hi, ri, open_goals] = profile_quantiles[h - 1]
+            means[hi, ri, open_goals] = profile_means[h - 1]
+            parameters[hi, ri, open_goals] = plan_parameters(np.array([ri]))
+
+    # Target-date goals: the mix follows the glide path, which depends only on
+    # the horizon (the same rows for every risk profile)
+    for hi, h in enumerate(horizons):
+        year_profiles = remaining_profile[h - np.arange(h) - 1]
+        values = simulate(year_profiles)
+        bands[hi, :, target_goals, :h] = np.quantile(values, [0.10, 0.50, 0.90], axis=0).T
+        quantiles[hi, :, target_goals] = np.quantile(values[:, -1], QUANTILE_LEVELS)
+        means[hi, :, target_goals] = values[:, -1].mean()
+        parameters[hi, :, target_goals] = plan_parameters(year_profiles)
+
+    return {
+        "horizons": horizons,
+        "profiles": np.array(profiles),
+        "goals": np.array(GOAL_CATEGORIES),
+        "symbols": np.array(symbols),
+        "weights": weights,
+        "glide": glide,
+        "bands": bands,
+        "quantiles": quantiles,
+        "means": means,
+        "parameters": parameters,
+        "parameter_sources": np.array(parameter_sources),
+        "n_paths": np.array(n_paths),
+        "source": np.array(source),
+        "built_at": np.array(datetime.utcnow().isoformat()),
+    }
+
+
+# Write tables atomically so API workers never load a partial file
+def save_tables(tables: Dict[str, np.ndarray], path: str = TABLES_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, **tables)
+    os.replace(tmp_path, path)
+
+
+# Load tables into memory (startup); returns False when no file exists yet
+def load_tables(path: str = TABLES_PATH) -> bool:
+    global _tables, _last_check
+
+    _last_check = time.time()
+    if not os.path.exists(path):
+        print(f"ℹ️ No allocation tables at {path} - projections are skipped until they are built")
+        return False
+
+    with np.load(path) as data:
+        tables = {key: data[key] for key in data.files}
+
+    tables["mtime"] = os.path.getmtime(path)
+    tables["path"] = path
+    tables["profile_index"] = {name: i for i, name in enumerate(tables["profiles"].tolist())}
+    tables["goal_index"] = {name: i for i, name in enumerate(tables["goals"].tolist())}
+
+    with _tables_lock:
+        _tables = tables
+
+    print(f"✅ Allocation tables loaded ({tables['source']}, built {tables['built_at']})")
+    return True
+
+
+# Current tables, picking up a file (re)written by the nightly job
+def get_tables() -> Optional[Dict]:
+    global _last_check
+
+    tables = _tables
+    if time.time() - _last_check > TABLES_CHECK_SECONDS:
+        _last_check = time.time()
+        path = tables["path"] if tables else TABLES_PATH
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if mtime is not None and (tables is None or mtime != tables["mtime"]):
+            load_tables(path)
+            tables = _tables
+    return tables
+
+
+# Build the tables when none have been written yet (startup background step,
+# so projections don't wait for the nightly job)
+def ensure_tables() -> bool:
+    if get_tables() is not None:
+        return True
+    save_tables(build_tables())
+    return load_tables()
+
+
+# Check whether tables are loaded
+def is_loaded() -> bool:
+    return _tables is not None
+
+
+# Percentage for display: whole numbers stay ints (80, not 80.0)
+def _percentage(weight: float) -> float:
+    weight = round(float(weight), 2)
+    return int(weight) if weight.is_integer() else weight
+
+
+# Allocation and glide path for one cell
+def lookup_allocation(time_horizon_years: int, risk_profile: str, goal: str) -> Optional[Dict]:
+    """
+    Returns:
+        Dict with weights {symbol: percentage}, glide_path (one entry per
+        year) and goal_category, or None when there are no tables/no cell
+    """
+    tables = get_tables()
+    if tables is None or not 1 <= time_horizon_years <= len(tables["horizons"]):
+        return None
+
+    ri = tables["profile_index"].get(risk_profile)
+    if ri is None:
+        return None
+
+    goal_category = normalize_goal(goal)
+    hi = time_horizon_years - 1
+    gi = tables["goal_index"][goal_category]
+    symbols = tables["symbols"].tolist()
+
+    weights = tables["weights"][hi, ri, gi]
+    glide = tables["glide"][hi, ri, gi, :time_horizon_years]
+
+    return {
+        "goal_category": goal_category,
+        "weights": {s: _percentage(w) for s, w in zip(symbols, weights) if w > 0},
+        "glide_path": [
+            {"year": year + 1, **{s: _percentage(w) for s, w in zip(symbols, row) if w > 0}}
+            for year, row in enumerate(glide)
+        ]
+    }
+
+
+# Monte Carlo projection for a plan, scaled from the unit-contribution tables
+def lookup_projection(time_horizon_years: int, risk_profile: str, monthly_contribution: float,
+                      goal_amount: Optional[float] = None, goal: str = "general") -> Optional[Dict]:
+    """
+    Same shape as monte_carlo.run_projection, or None when not covered
+
+    The goal picks the glide path the projection follows (see lookup_allocation).
+    """
+    tables = get_tables()
+    # Tables written before projections were kept per cell have 3-D bands
+    if tables is None or tables["bands"].ndim != 5 or not 1 <= time_horizon_years <= len(tables["horizons"]):
+        return None
+
+    ri = tables["profile_index"].get(risk_profile)
+    if ri is None:
+        return None
+
+    years = time_horizon_years
+    cell = (years - 1, ri, tables["goal_index"][normalize_goal(goal)])
+    bands = tables["bands"][cell][:years].astype(np.float64) * monthly_contribution
+    annual_return, annual_volatility = tables["parameters"][cell]
+
+    projection = {
+        "years": years,
+        "n_paths": int(tables["n_paths"]),
+        "total_invested": round(monthly_contribution * years * 12, 2),
+        "annual_return": round(float(annual_return), 4),
+        "annual_volatility": round(float(annual_volatility), 4),
+        "parameter_source": str(tables["parameter_sources"][ri]),
+        "bands": {
+            "month": list(range(12, years * 12 + 1, 12)),
+            "p10": np.round(bands[:, 0], 2).tolist(),
+            "p50": np.round(bands[:, 1], 2).tolist(),
+            "p90": np.round(bands[:, 2], 2).tolist(),
+        },
+        "final": {
+            "p10": round(float(bands[-1, 0]), 2),
+            "p50": round(float(bands[-1, 1]), 2),
+            "p90": round(float(bands[-1, 2]), 2),
+            "mean": round(float(tables["means"][cell]) * monthly_contribution, 2),
+        },
+        "goal_amount": goal_amount,
+        "probability_of_goal": None
+    }
+
+    if goal_amount and monthly_contribution > 0:
+        # Share of paths whose final value per unit contribution reaches the goal
+        level = np.interp(goal_amount / monthly_contribution, tables["quantiles"][cell], QUANTILE_LEVELS)
+        projection["probability_of_goal"] = round(float(1.0 - level), 4)
+
+    return projection
+
+
+# Rebuild the tables forever on a fixed interval
+def run_build_loop(interval_hours: float, **kwargs):
+    while True:
+        try:
+            save_tables(build_tables(**kwargs))
+            print(f"✅ Allocation tables written to {TABLES_PATH}")
+        except Exception as e:
+            print(f"❌ Allocation table build error: {e}")
+        time.sleep(interval_hours * 3600)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build InvestBuddy allocation tables")
+    parser.add_argument("--source", choices=["risk_profiles", "optimizer"], default="risk_profiles")
+    parser.add_argument("--paths", type=int, default=10000, help="Monte Carlo paths per risk profile")
+    parser.add_argument("--every", type=float, default=None,
+                        help="Keep running, rebuilding every N hours")
+    args = parser.parse_args()
+
+    if args.every:
+        run_build_loop(args.every, source=args.source, n_paths=args.paths)
+    else:
+        started = time.time()
+        tables = build_tables(source=args.source, n_paths=args.paths)
+        save_tables(tables)
+        print(json.dumps({
+            "path": TABLES_PATH,
+            "source": args.source,
+            "symbols": tables["symbols"].tolist(),
+            "cells": int(np.prod(tables["weights"].shape[:3])),
+            "bytes": os.path.getsize(TABLES_PATH),
+            "seconds": round(time.time() - started, 2)
+        }, indent=2))
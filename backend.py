@@ -1,34 +1,153 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from openai import OpenAI
-from typing import List, Optional
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+from functools import partial
 import os
+import time
 import uuid
 
 # Import InvestBuddy modules
-from database import init_database, save_message, get_conversation_history, create_or_get_user
+from llm_client import LLM_PROVIDER, create_llm_client
+from database import init_database, save_message, get_conversation_history, create_or_get_user, save_recommendation_async
 from financial_api import get_stock_price, get_recommended_etfs
 from investment_logic import generate_investment_recommendation
 from prompts import INVESTMENT_ADVISOR_PROMPT
-from vector_store import get_ai_context
+from vector_store import get_ai_context, is_vector_store_ready, set_vector_store, ETFVectorStore
 from investment_platforms import get_all_platforms_for_ai, BEGINNERS_GUIDE
+from recommendation_analytics import get_recommendation_report
+from backtest import backtest_portfolios, backtest_risk_profiles
+from optimizer import optimize_portfolio
+from fx import get_usd_rates, warm_fx_history
+from rebalancing import rebalance_users
+from order_planner import plan_order_schedule
+from cost_simulator import compare_costs
+from goal_planner import plan_goal
+from quote_stream import (QUOTE_STREAM_DROPS, QUOTE_STREAM_PUSHES, SLOW_CONSUMER_SECONDS, handle_command,
+                          iter_sse_events, parse_symbols, quote_hub)
+from chart_history import get_chart_series, series_to_binary, series_to_json
+from etf_screener import PERCENT_COLUMNS, compare_etfs, get_table as get_screener_table, screen_etfs
+from allocation_tables import ensure_tables as ensure_allocation_tables, load_tables as load_allocation_tables
+from batch_recommendations import iter_list_rows, iter_request_rows, iter_text_lines, stream_batch_recommendations
+from startup import StartupOrchestrator
+from worker_stats import get_all_worker_stats, publish_periodically
+from telemetry import (HTTP_REQUEST_SECONDS, observe_stage, record_llm_usage, render_metrics, request_span,
+                       set_span_attributes, stage_span)
+from telemetry import publish_periodically as publish_metrics_periodically
+from profiler import (ADMIN_TOKEN, DEFAULT_INTERVAL_MS, finish_request_profile, get_request_profile, install_signal_handler,
+                      is_admin, list_request_profiles, profile_process, should_profile_request, start_request_profile)
 
 # Load .env variables
 load_dotenv()
 
-# Initialize database
-init_database()
+# Warm the quote cache in the background at startup (set to 0 to skip)
+WARMUP_MARKET_DATA = os.getenv("STARTUP_WARMUP_MARKET_DATA", "1") == "1"
 
-app = FastAPI()
+# Load the model in the importing (gunicorn master) process so forked
+# workers share it copy-on-write - set by gunicorn.conf.py
+PRELOAD_MODELS = os.getenv("INVESTBUDDY_PRELOAD_MODELS", "0") == "1"
 
-print("🔑 Checking API Key...")
-api_key = os.getenv("OPENAI_API_KEY")
-if api_key:
-    print(f"✅ API Key loaded: {api_key[:8]}...{api_key[-4:]}")
-else:
-    print("❌ API Key NOT found in environment!")
+startup = StartupOrchestrator()
+
+_preload_seconds = None
+if PRELOAD_MODELS:
+    _preload_started = time.time()
+    set_vector_store(ETFVectorStore())
+    _preload_seconds = time.time() - _preload_started
+
+# Chat-completions client (created during the core startup phase, LLM_PROVIDER picks it)
+client = None
+
+# Threads for blocking LLM calls. They mostly wait on the model, so allow far
+# more than asyncio.to_thread's default pool (CPU count + 4)
+LLM_THREADS = int(os.getenv("LLM_THREADS", "32"))
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_THREADS, thread_name_prefix="llm")
+
+
+# Core phase: cheap, must finish before serving traffic
+def _init_openai_client():
+    global client
+
+    if LLM_PROVIDER == "openai":
+        print("🔑 Checking API Key...")
+        api_key = os.getenv("OPENAI_API_KEY")
+        if api_key:
+            print(f"✅ API Key loaded: {api_key[:8]}...{api_key[-4:]}")
+        else:
+            print("❌ API Key NOT found in environment!")
+    else:
+        print(f"🤖 Using the {LLM_PROVIDER} LLM client")
+
+    client = create_llm_client()
+
+
+# Background phase: heavy components loaded after the server is up
+_pending_store = None
+
+
+def _load_embedding_model():
+    global _pending_store
+    _pending_store = ETFVectorStore(lazy=True)
+    _pending_store.load_model()
+
+
+def _load_embedding_matrix():
+    _pending_store.load_embeddings()
+    set_vector_store(_pending_store)
+
+
+def _warm_market_data():
+    get_recommended_etfs()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.run_core([
+        ("database", init_database),
+        ("openai_client", _init_openai_client),
+        ("allocation_tables", load_allocation_tables),
+    ])
+
+    background_steps = []
+    if _preload_seconds is not None:
+        startup.mark_ready("embedding_model", "preloaded", _preload_seconds)
+        startup.mark_ready("embedding_matrix", "preloaded", 0)
+    else:
+        background_steps += [
+            ("embedding_model", _load_embedding_model),
+            ("embedding_matrix", _load_embedding_matrix),
+        ]
+    if WARMUP_MARKET_DATA:
+        background_steps += [
+            ("market_data", _warm_market_data),
+            ("fx_history", warm_fx_history),
+        ]
+    background_steps.append(("allocation_tables_build", ensure_allocation_tables))
+    background_steps.append(("etf_screener", lambda: get_screener_table(refresh=True)))
+    startup.start_background(background_steps)
+
+    install_signal_handler()
+
+    stats_task = asyncio.create_task(publish_periodically())
+    metrics_task = asyncio.create_task(publish_metrics_periodically())
+    quotes_task = asyncio.create_task(quote_hub.run())
+
+    yield
+
+    stats_task.cancel()
+    metrics_task.cancel()
+    quotes_task.cancel()
+    await startup.shutdown()
+    _llm_executor.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS settings for Streamlit frontend
 app.add_middleware(
@@ -39,8 +158,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
-client = OpenAI(api_key=api_key)
+
+# Latency of every request, by route template (low label cardinality)
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status
+        )
+
+
+# Streaming responses: sampling stops when the headers are sent, before the
+# body (where these do their work) is produced, so they are never profiled
+UNPROFILED_STREAMING_PATHS = ("/investment/recommend/batch", "/stream/quotes")
+
+
+# Sampling profile of a request (X-Profile header or PROFILE_SAMPLE_RATE)
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    profiler = None
+    if request.url.path not in UNPROFILED_STREAMING_PATHS and \
+            should_profile_request(request.headers.get("x-profile"), request.headers.get("x-admin-token")):
+        profiler = start_request_profile()
+    if profiler is None:
+        return await call_next(request)
+
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        profile_id = finish_request_profile(profiler, request.method, route.path if route else "unmatched", status)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
 
 
 # Request/Response Models
@@ -71,6 +232,58 @@ def read_root():
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
+        with request_span("chat", model=request.model):
+            # The completion streams synchronously - run it off the event loop
+            # (the copied context keeps stage spans under the request span)
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(_llm_executor, context.run, _chat, request)
+    except Exception as e:
+        print(f"❌ Chat error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# /chat pipeline, one timed stage per step
+def _chat(request: ChatRequest) -> ChatResponse:
+    messages = build_chat_messages(request)
+
+    # Call OpenAI API, streamed so time to first token can be measured
+    with stage_span("llm_total", model=request.model):
+        llm_started = time.perf_counter()
+        try:
+            stream = client.chat.completions.create(
+                model=request.model,
+                messages=messages,
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            # The final chunk carries token usage and no choices
+            parts = []
+            usage = None
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not parts:
+                        observe_stage("llm_first_token", time.perf_counter() - llm_started)
+                    parts.append(chunk.choices[0].delta.content)
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+        except Exception:
+            record_llm_usage("/chat", request.model, None, status="error")
+            raise
+        record_llm_usage("/chat", request.model, usage)
+
+    with stage_span("serialization"):
+        bot_message = "".join(parts)
+        return ChatResponse(message=bot_message)
+
+
+# System prompt (profile, platforms, RAG context) plus conversation history
+def build_chat_messages(request: ChatRequest) -> List[Dict]:
+    """Assemble the messages /chat sends to the model (timed per stage)"""
+    with stage_span("profile_extraction"):
         # Convert Pydantic messages to dict format
         user_messages = [{"role": m.role, "content": m.content} for m in request.messages]
 
@@ -93,6 +306,20 @@ async def chat(request: ChatRequest):
                 last_user_message = msg["content"]
                 break
 
+    # Always include platform information and practical guides
+    with stage_span("platform_guide"):
+        platforms_info = get_all_platforms_for_ai()
+        practical_guide = BEGINNERS_GUIDE
+
+    # Get relevant ETF knowledge using RAG (with live data!)
+    # Skipped until the embedding model has loaded in the background
+    # (query embedding, vector search and live data are timed inside)
+    etf_context = ""
+    if last_user_message and is_vector_store_ready():
+        with stage_span("rag_context"):
+            etf_context = get_ai_context(last_user_message, n_results=3, include_live_data=True)
+
+    with stage_span("prompt_build"):
         # Start building the enhanced system prompt
         enhanced_system_prompt = INVESTMENT_ADVISOR_PROMPT
 
@@ -109,10 +336,6 @@ async def chat(request: ChatRequest):
 ---
 """
 
-        # Always include platform information and practical guides
-        platforms_info = get_all_platforms_for_ai()
-        practical_guide = BEGINNERS_GUIDE
-
         enhanced_system_prompt += f"""
 
 ---
@@ -128,12 +351,8 @@ async def chat(request: ChatRequest):
 ---
 """
 
-        # Get relevant ETF knowledge using RAG (with live data!)
-        if last_user_message:
-            etf_context = get_ai_context(last_user_message, n_results=3, include_live_data=True)
-
-            if etf_context:
-                enhanced_system_prompt += f"""
+        if etf_context:
+            enhanced_system_prompt += f"""
 **RELEVANT ETF KNOWLEDGE WITH LIVE DATA** (Use this to provide better, more detailed answers):
 
 {etf_context}
@@ -159,30 +378,9 @@ async def chat(request: ChatRequest):
 
         # Construct final messages: system prompt + conversation history
         messages = [{"role": "system", "content": enhanced_system_prompt}] + conversation_messages
+        set_span_attributes(prompt_chars=len(enhanced_system_prompt), messages=len(messages))
 
-        # Debug: Print message structure
-        print(f"\n🔍 Debug - Messages sent to AI:")
-        print(f"   System prompt length: {len(enhanced_system_prompt)} chars")
-        print(f"   Conversation messages: {len(conversation_messages)}")
-        if last_user_message:
-            print(f"   Last user message: {last_user_message[:100]}...")
-        print()
-
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model=request.model,
-            messages=messages,
-            temperature=0.7
-        )
-
-        bot_message = response.choices[0].message.content
-        return ChatResponse(message=bot_message)
-
-    except Exception as e:
-        print(f"❌ Chat error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return messages
 
 
 @app.get("/health")
@@ -190,6 +388,103 @@ def health_check():
     return {"status": "healthy"}
 
 
+# Readiness with per-component load status
+@app.get("/ready")
+def readiness_check():
+    status = startup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+# Memory usage of every worker process on this host
+@app.get("/workers")
+def worker_memory():
+    return {
+        "success": True,
+        "data": get_all_worker_stats()
+    }
+
+
+# Prometheus metrics for every worker on this host
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# Admin endpoints: 404 while ADMIN_TOKEN is unset, 403 on a wrong token
+def _require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+PROFILE_FORMATS = ("folded", "summary")
+
+
+def _check_profile_format(format: str):
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'folded' or 'summary'")
+
+
+# Profile in the requested format (folded stacks for flame graphs, or a summary)
+def _profile_response(profiler, format: str):
+    _check_profile_format(format)
+    if format == "folded":
+        return PlainTextResponse(profiler.folded())
+    return {"success": True, "data": profiler.summary()}
+
+
+# Time-boxed sampling profile of this worker process
+@app.post("/admin/profile")
+async def admin_profile(
+    seconds: float = 10,
+    interval_ms: float = DEFAULT_INTERVAL_MS,
+    format: str = "folded",
+    x_admin_token: Optional[str] = Header(None)
+):
+    _require_admin(x_admin_token)
+    # Reject a bad format before sampling for up to a couple of minutes
+    _check_profile_format(format)
+    try:
+        profiler = await asyncio.to_thread(profile_process, seconds, interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _profile_response(profiler, format)
+
+
+# Recent per-request profiles (optionally for one route)
+@app.get("/admin/profiles")
+def admin_profiles(route: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return {
+        "success": True,
+        "data": list_request_profiles(route)
+    }
+
+
+# All stored request profiles of a route merged into one
+@app.get("/admin/profiles/aggregate")
+def admin_profiles_aggregate(route: Optional[str] = None, format: str = "folded",
+                             x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    profiler = get_request_profile(route=route)
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="No request profiles stored")
+    return _profile_response(profiler, format)
+
+
+# One request profile by the X-Profile-Id it was returned with
+@app.get("/admin/profiles/{profile_id}")
+def admin_profile_by_id(profile_id: str, format: str = "folded", x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    profiler = get_request_profile(profile_id)
+    if profiler is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return _profile_response(profiler, format)
+
+
 # Simple webhook endpoint for n8n integration
 class SimpleMessageRequest(BaseModel):
     message: str
@@ -205,11 +500,16 @@ async def webhook_chat(request: SimpleMessageRequest):
             {"role": "user", "content": request.message}
         ]
 
-        response = client.chat.completions.create(
-            model=request.model,
-            messages=messages,
-            temperature=0.7
-        )
+        try:
+            # Blocking completion - run it on the LLM threads like /chat
+            response = await asyncio.get_running_loop().run_in_executor(
+                _llm_executor,
+                partial(client.chat.completions.create, model=request.model, messages=messages, temperature=0.7)
+            )
+        except Exception:
+            record_llm_usage("/webhook/chat", request.model, None, status="error")
+            raise
+        record_llm_usage("/webhook/chat", request.model, response.usage)
 
         bot_message = response.choices[0].message.content
         return {"response": bot_message, "success": True}
@@ -240,6 +540,120 @@ async def get_stock(symbol: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Daily closes for charts, downsampled to the chart width
+@app.get("/history/{symbol}")
+async def get_history(
+    symbol: str,
+    width: int = 800,
+    method: str = "lttb",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    since: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    method: lttb (shape-preserving), minmax (per-pixel range) or none
+    since: only bars after this date; pass the last_date of the previous response
+    format: json (columnar dates/closes) or binary (see chart_history.py)
+    """
+    if format not in ("json", "binary"):
+        raise HTTPException(status_code=400, detail="format must be json or binary")
+    try:
+        series = await asyncio.to_thread(get_chart_series, symbol, width, method, start, end, since)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if format == "binary":
+        return Response(
+            content=series_to_binary(series),
+            media_type="application/octet-stream",
+            headers={"X-Last-Date": series["last_date"] or "", "X-Total-Points": str(series["total_points"])}
+        )
+    return {
+        "success": True,
+        "data": series_to_json(series)
+    }
+
+
+# Live quotes over WebSocket: ?symbols=SPY,VOO and/or {"action": "subscribe", "symbols": [...]} messages
+@app.websocket("/ws/quotes")
+async def quotes_websocket(websocket: WebSocket, symbols: Optional[str] = None):
+    """
+    Server messages: {"type": "quotes", "data": {symbol: quote}} (only changed
+    quotes, coalesced), {"type": "heartbeat"}, {"type": "subscribed"} and {"type": "error"}.
+    """
+    await websocket.accept()
+    subscription = quote_hub.connect()
+    # Close code when the server ends the stream (slow consumer unless the reader fails)
+    close_code = 1013
+
+    # Client commands, applied while the loop below sends quotes. If the
+    # reader stops, the whole connection ends - a socket that ignores
+    # commands would look alive to the client.
+    async def read_commands():
+        nonlocal close_code
+        try:
+            while True:
+                await websocket.send_json(handle_command(quote_hub, subscription, await websocket.receive_text()))
+        except WebSocketDisconnect:
+            subscription.close("client disconnected")
+        except KeyError:
+            # receive_text() on a binary frame
+            close_code = 1003
+            subscription.close("commands must be JSON text frames")
+        except Exception as e:
+            print(f"❌ Quote stream command error: {e}")
+            close_code = 1011
+            subscription.close("command reader failed")
+
+    reader = asyncio.create_task(read_commands())
+    try:
+        if symbols:
+            quote_hub.subscribe(subscription, parse_symbols(symbols.split(",")))
+        while True:
+            batch = await subscription.next_batch()
+            message = {"type": "quotes", "data": batch} if batch else {"type": "heartbeat"}
+            # A client that stops reading fills its socket buffer - don't wait forever
+            await asyncio.wait_for(websocket.send_json(message), SLOW_CONSUMER_SECONDS)
+            if batch:
+                QUOTE_STREAM_PUSHES.inc()
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+    except ConnectionError as e:
+        if str(e) != "client disconnected":
+            await websocket.close(code=close_code, reason=str(e))
+    except asyncio.TimeoutError:
+        QUOTE_STREAM_DROPS.inc(reason="send_timeout")
+    except (WebSocketDisconnect, RuntimeError):
+        # Socket already closed
+        pass
+    finally:
+        reader.cancel()
+        quote_hub.disconnect(subscription)
+
+
+# Live quotes as Server-Sent Events (same stream as /ws/quotes, fixed symbol list)
+@app.get("/stream/quotes")
+async def stream_quotes(symbols: str):
+    """e.g. /stream/quotes?symbols=SPY,VOO - "quotes" events carry {symbol: quote}"""
+    subscription = quote_hub.connect()
+    try:
+        quote_hub.subscribe(subscription, parse_symbols(symbols.split(",")))
+    except ValueError as e:
+        quote_hub.disconnect(subscription)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        iter_sse_events(quote_hub, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Get recommended ETFs with prices
 @app.get("/etfs/recommended")
 async def get_etfs():
@@ -255,6 +669,68 @@ async def get_etfs():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Filter and sort every ETF (min_/max_ query parameters on any metric column)
+@app.get("/etfs/screener")
+async def etf_screener(
+    request: Request,
+    category: Optional[str] = None,
+    risk: Optional[str] = None,
+    sort_by: str = "expense_ratio",
+    descending: bool = False,
+    offset: int = 0,
+    limit: int = 20
+):
+    """
+    e.g. /etfs/screener?max_expense_ratio=0.1&min_dividend_yield=2&risk=low,medium&sort_by=ytd_return&descending=true
+
+    Percent metrics (expense_ratio, dividend_yield, ytd_return, month_return,
+    volatility) are filtered in percent; category and risk take comma-separated values.
+    """
+    try:
+        filters = {}
+        for key, value in request.query_params.items():
+            if key.startswith(("min_", "max_")):
+                column = key[4:]
+                filters[key] = float(value) / 100 if column in PERCENT_COLUMNS else float(value)
+
+        # A stale table is rebuilt from disk inside the call - keep it off the loop
+        result = await asyncio.to_thread(
+            screen_etfs,
+            filters=filters,
+            categories=category.split(",") if category else None,
+            risk_levels=[r.strip() for r in risk.split(",")] if risk else None,
+            sort_by=sort_by,
+            descending=descending,
+            offset=offset,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+# Side-by-side metrics for a few ETFs
+@app.get("/etfs/compare")
+async def etf_compare(symbols: str):
+    try:
+        rows = await asyncio.to_thread(compare_etfs, symbols.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": rows
+    }
+
+
 # Generate investment recommendation
 class InvestmentRequest(BaseModel):
     salary: float
@@ -264,26 +740,323 @@ class InvestmentRequest(BaseModel):
     monthly_investment: float
     goal: str
     time_horizon_years: int
+    goal_amount: Optional[float] = None
+    session_id: Optional[str] = None
+    currency: str = "AZN"
 
 
 @app.post("/investment/recommend")
 async def recommend_investment(request: InvestmentRequest):
     """Generate personalized investment recommendation"""
     try:
-        recommendation = generate_investment_recommendation(
+        # Prices, FX and (without tables) the Monte Carlo run block - keep them off the loop
+        recommendation = await asyncio.to_thread(
+            generate_investment_recommendation,
             salary=request.salary,
             savings=request.savings,
             monthly_expenses=request.monthly_expenses,
             debt=request.debt,
             monthly_investment=request.monthly_investment,
             goal=request.goal,
-            time_horizon_years=request.time_horizon_years
+            time_horizon_years=request.time_horizon_years,
+            goal_amount=request.goal_amount,
+            currency=request.currency
         )
 
+        # Store the plan so analytics can report on it
+        if request.session_id and recommendation.get("portfolio"):
+            await save_recommendation_async(
+                session_id=request.session_id,
+                salary=request.salary,
+                savings=request.savings,
+                monthly_expenses=request.monthly_expenses,
+                debt=request.debt,
+                goal=request.goal,
+                time_horizon=request.time_horizon_years,
+                portfolio=recommendation["portfolio"],
+                recommendation_text=recommendation["recommendation_text"]
+            )
+
         return {
             "success": True,
             "data": recommendation
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Recommendation error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Bulk recommendations for partner onboarding
+@app.post("/investment/recommend/batch")
+async def recommend_investment_batch(request: Request, include_text: bool = False):
+    """
+    Generate recommendations for many users in one call
+
+    Body: JSON array, NDJSON (application/x-ndjson) or CSV (text/csv) with
+    the same fields as /investment/recommend, plus an optional "id".
+    Results stream back as NDJSON, one line per user, then a summary line.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type in ("application/x-ndjson", "application/jsonl", "text/csv"):
+        fmt = "csv" if content_type == "text/csv" else "ndjson"
+        rows = iter_request_rows(iter_text_lines(request.stream()), fmt)
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array, NDJSON or CSV")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of requests")
+        rows = iter_list_rows(body)
+
+    return StreamingResponse(
+        stream_batch_recommendations(rows, include_text=include_text),
+        media_type="application/x-ndjson"
+    )
+
+
+# Rebalance existing holdings
+class RebalanceRequest(BaseModel):
+    holdings: Dict[str, float]
+    monthly_contribution: float = 0
+    currency: str = "AZN"
+    time_horizon_years: Optional[int] = None
+    risk_profile: Optional[str] = None
+    goal: str = "general"
+    target_weights: Optional[Dict[str, float]] = None
+    allow_sells: bool = False
+
+
+@app.post("/investment/rebalance")
+async def rebalance_holdings(request: RebalanceRequest):
+    """Drift from target weights and the trades that fix it, new money to underweight ETFs first"""
+    try:
+        plans = await asyncio.to_thread(rebalance_users, [request.model_dump()])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": plans[0]
+    }
+
+
+# Whole/fractional share purchase schedule
+class OrderPlanRequest(BaseModel):
+    monthly_investment: float
+    months: int = 12
+    platform: Optional[str] = None
+    currency: str = "AZN"
+    time_horizon_years: Optional[int] = None
+    risk_profile: Optional[str] = None
+    goal: str = "general"
+    target_weights: Optional[Dict[str, float]] = None
+    holdings: Optional[Dict[str, float]] = None
+    fractional: Optional[bool] = None
+
+
+@app.post("/investment/order-plan")
+async def plan_share_orders(request: OrderPlanRequest):
+    """Month-by-month share orders that track the target allocation under a platform's rules"""
+    try:
+        plan = await asyncio.to_thread(plan_order_schedule, **request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": plan
+    }
+
+
+# Backtest allocations over cached price history
+@app.get("/investment/backtest")
+async def backtest_allocations(
+    years: int = 10,
+    monthly_investment: float = 100.0,
+    rebalance: str = "annual",
+    weights: Optional[str] = None,
+    currency: str = "USD"
+):
+    """
+    Replay monthly contributions across every rolling start date
+
+    Without weights, backtests every risk profile (SPY/BND splits).
+    weights: comma-separated SYMBOL:PERCENT pairs, e.g. "VTI:70,BND:30"
+    currency: measure returns in this currency (historical FX rates)
+    """
+    try:
+        if weights:
+            portfolio = {}
+            for pair in weights.split(","):
+                symbol, _, percent = pair.partition(":")
+                portfolio[symbol.strip()] = float(percent)
+            report = await asyncio.to_thread(
+                backtest_portfolios, {"custom": portfolio}, years, monthly_investment, rebalance,
+                currency=currency
+            )
+        else:
+            report = await asyncio.to_thread(
+                backtest_risk_profiles, years, monthly_investment, rebalance, currency=currency
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": report
+    }
+
+
+# Mean-variance allocation over the ETF knowledge base
+@app.get("/investment/optimize")
+async def optimize_allocation(
+    risk_profile: str = "moderate",
+    lookback_years: int = 10,
+    max_etfs: Optional[int] = None
+):
+    """Efficient-frontier allocation under the risk profile's volatility cap and ETF limit"""
+    try:
+        result = await asyncio.to_thread(
+            optimize_portfolio, risk_profile, lookback_years, None, max_etfs
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+# Inverse goal planning (required contribution, time to goal, success probability)
+@app.get("/investment/goal-plan")
+async def goal_plan(
+    goal_amount: float,
+    solve_for: str = "contribution",
+    years: Optional[int] = None,
+    monthly_contribution: Optional[float] = None,
+    initial_amount: float = 0,
+    confidence: float = 0.5,
+    risk_profile: Optional[str] = None,
+    goal: str = "general"
+):
+    """
+    Solve a goal plan for one unknown
+
+    solve_for=contribution needs years, time needs monthly_contribution,
+    probability needs both. Answers are cached per input bucket.
+    """
+    try:
+        result = await asyncio.to_thread(
+            plan_goal, goal_amount, solve_for, years, monthly_contribution,
+            initial_amount, confidence, risk_profile, goal
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+# Platform x ETF cost comparison
+@app.get("/investment/costs")
+async def investment_costs(
+    monthly_investment: float,
+    years: int = 20,
+    currency: str = "AZN",
+    symbols: Optional[str] = None,
+    platforms: Optional[str] = None,
+    risk_profile: str = "moderate",
+    annual_return: Optional[float] = None,
+    order_frequency_months: int = 1,
+    limit: int = 20
+):
+    """
+    Fee drag (commissions, FX spread, custody, expense ratio) of every
+    platform x ETF combination, cheapest first
+
+    symbols and platforms are comma-separated, e.g. symbols=SPY,VOO
+    """
+    try:
+        result = await asyncio.to_thread(
+            compare_costs,
+            monthly_investment,
+            years,
+            currency,
+            [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None,
+            [p.strip() for p in platforms.split(",") if p.strip()] if platforms else None,
+            risk_profile,
+            annual_return,
+            order_frequency_months,
+            None,
+            limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+# Current exchange rates
+@app.get("/fx/rates")
+async def fx_rates(base: str = "USD"):
+    """Units of each currency per 1 unit of `base`"""
+    try:
+        table = await asyncio.to_thread(get_usd_rates)
+        base_rate = table["rates"][base.upper()]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown currency: {base}")
+
+    return {
+        "success": True,
+        "data": {
+            "base": base.upper(),
+            "rates": {code: round(rate / base_rate, 6) for code, rate in table["rates"].items()},
+            "source": table["source"],
+            "fetched_at": table["fetched_at"]
+        }
+    }
+
+
+# Aggregate analytics over stored recommendations
+@app.get("/analytics/recommendations")
+async def recommendation_analytics(dimension: str = "recommendations", group_by: str = "goal,risk_profile"):
+    """
+    Aggregate stored recommendations, e.g. distribution of risk profiles by goal
+
+    dimension: "recommendations" or "allocations" (per-ETF rows)
+    group_by: comma-separated columns
+    """
+    columns = [column.strip() for column in group_by.split(",") if column.strip()]
+    try:
+        report = await asyncio.to_thread(get_recommendation_report, dimension, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "success": True,
+        "data": report
+    }
@@ -0,0 +1,287 @@
+"""
+Historical Backtesting
+Replay monthly contributions into ETF allocations over cached price history
+
+Every rolling start date is simulated at once: the return history is cut
+into overlapping windows with a strided view (no copies), and each month of
+the plan is one array step over all windows together. Month-end closes come
+from price_history, so a backtest never calls Yahoo inside a request.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from etf_knowledge import ETF_KNOWLEDGE_BASE
+from fx import get_monthly_fx_returns
+from investment_logic import RISK_PROFILES, PORTFOLIO_ETFS
+from price_history import get_monthly_returns
+
+# Rebalancing schedules -> months between rebalances (0 = let weights drift)
+REBALANCE_PERIODS = {
+    "monthly": 1,
+    "quarterly": 3,
+    "annual": 12,
+    "none": 0,
+}
+
+# Annual risk-free rate used for the Sharpe ratio
+DEFAULT_RISK_FREE_RATE = 0.02
+
+
+# Simulate one allocation over every rolling window of the history
+def backtest_windows(
+    returns: np.ndarray,
+    weights: np.ndarray,
+    months: int,
+    monthly_contribution: float = 100.0,
+    rebalance_every: int = 12,
+    step: int = 1
+) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        returns: (T x N) monthly simple returns
+        weights: (N,) target weights summing to 1
+        months: Length of each backtest window
+        monthly_contribution: Amount bought at the start of every month
+        rebalance_every: Months between rebalances (0 = never)
+        step: Months between consecutive start dates
+
+    Returns:
+        Dict with "values" (S x months) portfolio values at each month end
+        and "period_returns" (S x months) time-weighted monthly returns,
+        one row per start date
+    """
+    # (S x N x months) view of every window -> (S x months x N)
+    windows = sliding_window_view(returns, months, axis=0)[::step].transpose(0, 2, 1)
+    n_windows = windows.shape[0]
+
+    if rebalance_every == 1:
+        # Rebalanced every month: the portfolio return is just the weighted sum
+        period_returns = windows @ weights
+        growth = np.cumprod(1.0 + period_returns, axis=1)
+        # Each contribution grows from the start of its month to the end of the window
+        values = growth * np.cumsum(monthly_contribution / np.concatenate(
+            (np.ones((n_windows, 1)), growth[:, :-1]), axis=1
+        ), axis=1)
+        return {"values": values, "period_returns": period_returns}
+
+    holdings = np.zeros((n_windows, len(weights)))
+    values = np.empty((n_windows, months))
+    period_returns = np.empty((n_windows, months))
+    contribution = monthly_contribution * weights
+
+    for t in range(months):
+        holdings += contribution
+        start_value = holdings.sum(axis=1)
+        if rebalance_every and t % rebalance_every == 0:
+            holdings = start_value[:, None] * weights
+
+        holdings *= 1.0 + windows[:, t, :]
+        values[:, t] = holdings.sum(axis=1)
+        period_returns[:, t] = values[:, t] / start_value - 1.0
+
+    return {"values": values, "period_returns": period_returns}
+
+
+# CAGR, volatility, Sharpe and max drawdown for every window
+def compute_metrics(period_returns: np.ndarray,
+                    risk_free_rate: float = DEFAULT_RISK_FREE_RATE) -> Dict[str, np.ndarray]:
+    """
+    Metrics use time-weighted returns, so contributions don't count as gains
+
+    Args:
+        period_returns: (S x months) monthly returns
+
+    Returns:
+        Dict of (S,) arrays: cagr, volatility, sharpe, max_drawdown
+    """
+    months = period_returns.shape[1]
+    growth = np.cumprod(1.0 + period_returns, axis=1)
+
+    cagr = growth[:, -1] ** (12.0 / months) - 1.0
+
+    monthly_std = period_returns.std(axis=1, ddof=1) if months > 1 else np.zeros(len(period_returns))
+    volatility = monthly_std * np.sqrt(12)
+    excess = period_returns.mean(axis=1) - risk_free_rate / 12
+    sharpe = np.divide(excess * np.sqrt(12), monthly_std,
+                       out=np.zeros_like(excess), where=monthly_std > 0)
+
+    # Drawdown from the running peak, counting the starting value of 1
+    peaks = np.maximum(np.maximum.accumulate(growth, axis=1), 1.0)
+    max_drawdown = (growth / peaks - 1.0).min(axis=1)
+    max_drawdown = np.minimum(max_drawdown, 0.0)
+
+    return {"cagr": cagr, "volatility": volatility, "sharpe": sharpe, "max_drawdown": max_drawdown}
+
+
+# Distribution of one metric across start dates
+def _summarize(values: np.ndarray) -> Dict:
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        "p10": round(float(p10), 4),
+        "median": round(float(p50), 4),
+        "p90": round(float(p90), 4),
+        "min": round(float(values.min()), 4),
+        "max": round(float(values.max()), 4),
+    }
+
+
+# Validate {symbol: percentage} against the ETF knowledge base
+def _normalize_weights(weights: Dict[str, float]) -> Dict[str, float]:
+    normalized = {}
+    for symbol, weight in weights.items():
+        symbol = symbol.upper()
+        if symbol not in ETF_KNOWLEDGE_BASE:
+            raise ValueError(f"Unknown ETF: {symbol}")
+        if weight < 0:
+            raise ValueError(f"Negative weight for {symbol}")
+        if weight > 0:
+            normalized[symbol] = normalized.get(symbol, 0) + float(weight)
+
+    total = sum(normalized.values())
+    if total <= 0:
+        raise ValueError("Weights must add up to more than zero")
+    return {symbol: weight / total for symbol, weight in normalized.items()}
+
+
+# Backtest several named portfolios over the same history
+def backtest_portfolios(
+    portfolios: Dict[str, Dict[str, float]],
+    years: int = 10,
+    monthly_contribution: float = 100.0,
+    rebalance: str = "annual",
+    history_years: Optional[int] = None,
+    risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+    step: int = 1,
+    allow_download: bool = False,
+    currency: str = "USD"
+) -> Dict:
+    """
+    Backtest every portfolio across every rolling start date
+
+    Args:
+        portfolios: {name: {symbol: percentage}}
+        years: Length of each backtest window
+        monthly_contribution: Amount invested at the start of every month
+        rebalance: "monthly", "quarterly", "annual" or "none"
+        history_years: Limit the history used (default: all common history)
+        step: Months between start dates
+        allow_download: Download missing bars (offline jobs only)
+        currency: Investor's currency - USD returns are converted with
+            historical month-end FX rates, over the months those cover
+            ("fx" in the result says whether they were)
+
+    Returns:
+        Dict with the history window used and per-portfolio metric distributions
+    """
+    if rebalance not in REBALANCE_PERIODS:
+        raise ValueError(f"Unknown rebalance schedule: {rebalance}")
+    if years < 1:
+        raise ValueError("years must be at least 1")
+
+    portfolios = {name: _normalize_weights(weights) for name, weights in portfolios.items()}
+    symbols: List[str] = sorted({symbol for weights in portfolios.values() for symbol in weights})
+
+    history = get_monthly_returns(symbols, years=history_years, allow_download=allow_download)
+    if history is None:
+        raise ValueError(f"No cached price history for {', '.join(symbols)}")
+
+    months = years * 12
+    returns, return_months = history["returns"], history["months"]
+    if len(returns) < months:
+        raise ValueError(
+            f"Only {len(returns)} months of common history for {', '.join(symbols)}, need {months}"
+        )
+
+    # What a USD asset earned in the investor's currency
+    fx = {"converted": currency.upper() == "USD"}
+    if currency.upper() != "USD":
+        fx_history = get_monthly_fx_returns(currency, return_months, allow_download)
+        if fx_history is None:
+            fx["detail"] = f"No FX history for {currency.upper()} - returns are in USD"
+        else:
+            # The last unbroken stretch of months the FX history covers
+            covered = np.flatnonzero(fx_history["covered"])
+            end = covered[-1] + 1 if len(covered) else 0
+            gaps = np.flatnonzero(~fx_history["covered"][:end])
+            start = gaps[-1] + 1 if len(gaps) else 0
+            if end - start < months:
+                raise ValueError(
+                    f"FX history for {currency.upper()} covers only {end - start} months, need {months}"
+                )
+            returns, return_months = returns[start:end], return_months[start:end]
+            returns = (1.0 + returns) * (1.0 + fx_history["returns"][start:end])[:, None] - 1.0
+            fx["converted"] = True
+
+    starts = return_months[:len(returns) - months + 1:step]
+    total_invested = monthly_contribution * months
+
+    results = {}
+    for name, weights in portfolios.items():
+        w = np.array([weights.get(symbol, 0.0) for symbol in symbols])
+        simulated = backtest_windows(
+            returns, w, months, monthly_contribution, REBALANCE_PERIODS[rebalance], step
+        )
+        metrics = compute_metrics(simulated["period_returns"], risk_free_rate)
+        final_values = simulated["values"][:, -1]
+
+        results[name] = {
+            "weights": {symbol: round(weight * 100, 2) for symbol, weight in weights.items()},
+            "cagr": _summarize(metrics["cagr"]),
+            "volatility": _summarize(metrics["volatility"]),
+            "sharpe": _summarize(metrics["sharpe"]),
+            "max_drawdown": _summarize(metrics["max_drawdown"]),
+            "final_value": _summarize(final_values),
+            "worst_start": str(starts[int(final_values.argmin())]),
+            "best_start": str(starts[int(final_values.argmax())]),
+        }
+
+    return {
+        "years": years,
+        "rebalance": rebalance,
+        "currency": currency.upper(),
+        "fx": fx,
+        "monthly_contribution": monthly_contribution,
+        "total_invested": round(total_invested, 2),
+        "history": {
+            "start": str(return_months[0]),
+            "end": str(return_months[-1]),
+            "rolling_windows": len(starts),
+        },
+        "portfolios": results
+    }
+
+
+# Backtest the RISK_PROFILES splits with the ETFs calculate_portfolio uses
+def backtest_risk_profiles(years: int = 10, monthly_contribution: float = 100.0,
+                           rebalance: str = "annual", **kwargs) -> Dict:
+    stock_etf = PORTFOLIO_ETFS["stocks"]["etf"]
+    bond_etf = PORTFOLIO_ETFS["bonds"]["etf"]
+
+    portfolios = {
+        name: {stock_etf: profile["stocks"], bond_etf: profile["bonds"]}
+        for name, profile in RISK_PROFILES.items()
+    }
+    return backtest_portfolios(portfolios, years, monthly_contribution, rebalance, **kwargs)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for rebalance in REBALANCE_PERIODS:
+        started = time.perf_counter()
+        report = backtest_risk_profiles(years, 100.0, rebalance, allow_download=True)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        print(f"\n{years}y windows, {rebalance} rebalancing "
+              f"({report['history']['rolling_windows']} start dates, {elapsed_ms:.1f} ms)")
+        for name, result in report["portfolios"].items():
+            print(f"  {name:<13} CAGR {result['cagr']['median']:>7.2%}  "
+                  f"vol {result['volatility']['median']:>6.2%}  "
+                  f"Sharpe {result['sharpe']['median']:>5.2f}  "
+                  f"worst drawdown {result['max_drawdown']['min']:>7.2%}")
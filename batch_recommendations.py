@@ -0,0 +1,318 @@
+"""
+Batch Recommendations
+Column-wise recommendation engine for bulk user onboarding
+
+Requests are processed in chunks: each chunk is turned into NumPy columns,
+safety checks and allocations are evaluated for every row at once, and the
+ETF prices and FX rate table are fetched a single time per batch (each row
+is converted from its own currency with that table). Results stream
+back as NDJSON lines so partner imports of thousands of users never build
+one giant response in memory.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from financial_api import get_stock_price
+from fx import get_usd_rates
+from investment_logic import (
+    BASE_CURRENCY, EMERGENCY_FUND_MONTHS, HIGH_DEBT_THRESHOLD, RISK_PROFILES, PORTFOLIO_ETFS,
+    SAFE_TO_INVEST_MESSAGE, NOT_SAFE_TO_INVEST_MESSAGE,
+    build_priority_actions, generate_recommendation_text
+)
+
+# Rows evaluated per vectorized pass
+CHUNK_SIZE = 1000
+
+# Input fields: name -> default (None = required)
+NUMERIC_FIELDS = {
+    "salary": None,
+    "savings": None,
+    "monthly_expenses": None,
+    "debt": 0.0,
+    "monthly_investment": None,
+    "time_horizon_years": None,
+}
+
+# Risk profile index from determine_risk_profile's horizon cut-offs (<3, <7, 7+)
+RISK_PROFILE_ORDER = ["conservative", "moderate", "aggressive"]
+RISK_HORIZON_CUTOFFS = [3, 7]
+
+
+# Fetch the prices every row in the batch shares
+def fetch_batch_prices() -> Dict[str, Optional[float]]:
+    prices = {}
+    for asset_class, etf in PORTFOLIO_ETFS.items():
+        price_data = get_stock_price(etf["etf"])
+        prices[asset_class] = price_data["price"] if price_data else None
+    return prices
+
+
+# Validate raw rows and split them into columns
+def _to_columns(rows: List[Dict], usd_rates: Dict[str, float]) -> Tuple[Dict[str, np.ndarray], List[Dict], List[Dict]]:
+    """
+    Returns:
+        (columns for valid rows, the valid rows, error records for invalid rows)
+    """
+    valid_rows = []
+    values = {field: [] for field in NUMERIC_FIELDS}
+    currencies = []
+    errors = []
+
+    for row in rows:
+        try:
+            parsed = {}
+            for field, default in NUMERIC_FIELDS.items():
+                raw = row.get(field)
+                if raw in (None, ""):
+                    if default is None:
+                        raise ValueError(f"missing {field}")
+                    raw = default
+                parsed[field] = float(raw)
+            if not row.get("goal"):
+                raise ValueError("missing goal")
+            currency = str(row.get("currency") or BASE_CURRENCY).strip().upper()
+            if currency not in usd_rates:
+                raise ValueError(f"unsupported currency {currency}")
+        except (TypeError, ValueError) as e:
+            errors.append({"index": row.get("_index"), "id": row.get("id"), "error": str(e)})
+            continue
+
+        for field, value in parsed.items():
+            values[field].append(value)
+        currencies.append(currency)
+        valid_rows.append(row)
+
+    columns = {field: np.array(column, dtype=np.float64) for field, column in values.items()}
+    columns["currency"] = np.array(currencies, dtype=str)
+    return columns, valid_rows, errors
+
+
+# Evaluate safety checks and allocations for a whole chunk at once
+def evaluate_chunk(rows: List[Dict], prices: Dict[str, Optional[float]],
+                   include_text: bool = False, usd_rates: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Args:
+        rows: Raw request dicts (same fields as InvestmentRequest, plus optional "id");
+            amounts are in the row's "currency" (default AZN)
+        prices: Output of fetch_batch_prices()
+        include_text: Also render the full recommendation text (slower)
+        usd_rates: Units of each currency per 1 USD (default: current fx table)
+
+    Returns:
+        One result dict per row, shaped like /investment/recommend's data
+    """
+    if usd_rates is None:
+        usd_rates = get_usd_rates()["rates"]
+    columns, valid_rows, errors = _to_columns(rows, usd_rates)
+    if not valid_rows:
+        return errors
+
+    salary = columns["salary"]
+    savings = columns["savings"]
+    expenses = columns["monthly_expenses"]
+    debt = columns["debt"]
+    monthly_investment = columns["monthly_investment"]
+    horizon = columns["time_horizon_years"].astype(np.int64)
+
+    # Safety checks, column-wise
+    emergency_fund_needed = expenses * EMERGENCY_FUND_MONTHS
+    debt_ratio = np.divide(debt, salary, out=np.zeros_like(debt), where=salary > 0)
+    high_debt = debt_ratio > HIGH_DEBT_THRESHOLD
+    low_fund = savings < emergency_fund_needed
+    low_savings = (savings < expenses) & ~high_debt
+    can_invest = ~(high_debt | low_fund)
+    needs_actions = high_debt | low_fund | low_savings
+
+    # Allocations, column-wise
+    risk_index = np.digitize(horizon, RISK_HORIZON_CUTOFFS)
+    stock_pct = np.array([RISK_PROFILES[p]["stocks"] for p in RISK_PROFILE_ORDER])[risk_index]
+    bond_pct = np.array([RISK_PROFILES[p]["bonds"] for p in RISK_PROFILE_ORDER])[risk_index]
+
+    # Each row's currency per USD (one lookup per distinct currency), then USD and AZN amounts
+    codes, inverse = np.unique(columns["currency"], return_inverse=True)
+    local_per_usd = np.array([usd_rates[code] for code in codes])[inverse]
+    monthly_usd = monthly_investment / local_per_usd
+    monthly_azn = monthly_usd * usd_rates[BASE_CURRENCY]
+    amounts = {
+        asset_class: (pct, monthly_usd * pct / 100, monthly_azn * pct / 100, monthly_investment * pct / 100)
+        for asset_class, pct in (("stocks", stock_pct), ("bonds", bond_pct))
+    }
+    shares = {
+        asset_class: amount_usd / prices[asset_class] if prices.get(asset_class) else None
+        for asset_class, (_, amount_usd, _, _) in amounts.items()
+    }
+
+    results = []
+    for i, row in enumerate(valid_rows):
+        actions = []
+        if needs_actions[i]:
+            actions = build_priority_actions(
+                float(debt_ratio[i]), float(debt[i]), float(savings[i]),
+                float(expenses[i]), float(emergency_fund_needed[i]), str(columns["currency"][i])
+            )
+
+        result = {
+            "index": row.get("_index"),
+            "id": row.get("id"),
+            "is_safe_to_invest": bool(can_invest[i]),
+            "safety_message": SAFE_TO_INVEST_MESSAGE if can_invest[i] else NOT_SAFE_TO_INVEST_MESSAGE,
+            "safety_details": {
+                "can_invest": bool(can_invest[i]),
+                "emergency_fund_needed": float(emergency_fund_needed[i]),
+                "current_savings": float(savings[i]),
+                "debt_ratio": float(debt_ratio[i]),
+                "priority_actions": actions
+            }
+        }
+
+        if can_invest[i]:
+            portfolio = {
+                "risk_profile": RISK_PROFILE_ORDER[risk_index[i]],
+                "time_horizon_years": int(horizon[i]),
+                "currency": str(columns["currency"][i]),
+                "fx_rate_usd": round(float(1 / local_per_usd[i]), 6),
+                "monthly_investment_local": float(monthly_investment[i]),
+                "monthly_investment_azn": round(float(monthly_azn[i]), 2),
+                "monthly_investment_usd": round(float(monthly_usd[i]), 2),
+                "allocations": []
+            }
+            for asset_class, (pct, amount_usd, amount_azn, amount_local) in amounts.items():
+                if amount_usd[i] > 0 and shares[asset_class] is not None:
+                    etf = PORTFOLIO_ETFS[asset_class]
+                    portfolio["allocations"].append({
+                        "asset_type": etf["asset_type"],
+                        "etf": etf["etf"],
+                        "etf_name": etf["etf_name"],
+                        "percentage": int(pct[i]),
+                        "monthly_amount_usd": round(float(amount_usd[i]), 2),
+                        "monthly_amount_azn": round(float(amount_azn[i]), 2),
+                        "monthly_amount_local": round(float(amount_local[i]), 2),
+                        "current_price": prices[asset_class],
+                        "shares_per_month": round(float(shares[asset_class][i]), 4),
+                        "description": etf["description"]
+                    })
+            result["portfolio"] = portfolio
+
+            if include_text:
+                result["recommendation_text"] = generate_recommendation_text(
+                    portfolio, row["goal"], float(salary[i]), float(savings[i])
+                )
+
+        results.append(result)
+
+    return errors + results
+
+
+# Split a stream of byte chunks (e.g. request.stream()) into text lines
+async def iter_text_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+# Parse request rows from text lines (NDJSON or CSV)
+async def iter_request_rows(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Dict]:
+    index = 0
+    header = None
+
+    async for line in lines:
+        if not line.strip():
+            continue
+
+        if fmt == "csv":
+            values = next(csv.reader(io.StringIO(line)))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row = dict(zip(header, values))
+        else:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                row = {"_parse_error": str(e)}
+            if not isinstance(row, dict):
+                row = {"_parse_error": "each line must be a JSON object"}
+
+        row["_index"] = index
+        index += 1
+        yield row
+
+
+# Turn an in-memory list of requests into an async row stream
+async def iter_list_rows(rows: Iterable[Dict]) -> AsyncIterator[Dict]:
+    for index, row in enumerate(rows):
+        row = dict(row) if isinstance(row, dict) else {"_parse_error": "each request must be a JSON object"}
+        row["_index"] = index
+        yield row
+
+
+# Stream NDJSON results for a stream of request rows
+async def stream_batch_recommendations(
+    rows: AsyncIterator[Dict],
+    include_text: bool = False,
+    chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[str]:
+    """
+    Yields one JSON line per request, then a summary line with throughput
+    """
+    started = time.perf_counter()
+    # Provider calls block - keep them off the event loop
+    prices = await asyncio.to_thread(fetch_batch_prices)
+    usd_rates = (await asyncio.to_thread(get_usd_rates))["rates"]
+
+    total = 0
+    safe = 0
+    failed = 0
+    chunk: List[Dict] = []
+
+    def flush(chunk_rows):
+        nonlocal total, safe, failed
+        lines = []
+        for result in evaluate_chunk(chunk_rows, prices, include_text, usd_rates):
+            total += 1
+            if "error" in result:
+                failed += 1
+            elif result["is_safe_to_invest"]:
+                safe += 1
+            lines.append(json.dumps(result, ensure_ascii=False))
+        return "\n".join(lines) + "\n" if lines else ""
+
+    async for row in rows:
+        if "_parse_error" in row:
+            total += 1
+            failed += 1
+            yield json.dumps({"index": row["_index"], "error": row["_parse_error"]}) + "\n"
+            continue
+
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield flush(chunk)
+            chunk = []
+
+    if chunk:
+        yield flush(chunk)
+
+    elapsed = time.perf_counter() - started
+    yield json.dumps({
+        "summary": {
+            "count": total,
+            "safe_to_invest": safe,
+            "errors": failed,
+            "prices": prices,
+            "usd_rates": usd_rates,
+            "seconds": round(elapsed, 3),
+            "recommendations_per_second": round(total / elapsed, 1) if elapsed > 0 else None
+        }
+    }) + "\n"
@@ -0,0 +1,544 @@
+"""
+Offline Benchmarks
+Reproducible latency/throughput numbers for the backend, with no network
+
+Market data (Alpha Vantage, Yahoo Finance), FX rates, the embedding model
+and the LLM (llm_client.StubLLMClient) are replaced by deterministic stubs
+with configurable latency, so two runs on the same machine measure only our
+code:
+
+    vector_search   - ETFVectorStore.search latency
+    prompt_assembly - build_chat_messages (profile, platforms, RAG, prompt)
+    database_writes - save_message / save_recommendation rates on a temp SQLite file
+    recommend       - POST /investment/recommend throughput per concurrency level
+    chat            - POST /chat end-to-end latency per concurrency level
+    projection      - one 10k-path x 40-year Monte Carlo projection, simulated
+                      (table builds only) and looked up from allocation tables
+                      (the request path), against monte_carlo.PROJECTION_TARGET_MS
+
+Endpoints are called in-process through the ASGI app (httpx.ASGITransport),
+middleware included. --llm-base-url sends /chat through the OpenAI SDK to an
+OpenAI-compatible server instead (e.g. `python llm_client.py`). Results are
+written as JSON; pass --baseline to compare with an earlier run and exit
+non-zero on regressions.
+
+    python benchmarks.py --concurrency 1,4,16 --requests 200
+    python benchmarks.py --baseline data/benchmarks/benchmark-20260101-120000.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from llm_client import StubLLMClient, create_llm_client
+
+# Offline defaults - must be set before the app modules are imported
+os.environ.setdefault("FX_PROVIDER", "fixture")
+os.environ.setdefault("STARTUP_WARMUP_MARKET_DATA", "0")
+os.environ.setdefault("INVESTBUDDY_PRELOAD_MODELS", "0")
+
+RESULTS_DIR = "./data/benchmarks"
+
+SUITES = ["vector_search", "prompt_assembly", "database_writes", "recommend", "chat", "projection"]
+
+# Relative change that counts as a regression when comparing runs
+DEFAULT_REGRESSION_PCT = 10.0
+
+BENCHMARK_QUERIES = [
+    "I want safe investments for retirement",
+    "Which ETFs focus on technology?",
+    "What's good for beginners with low risk?",
+    "I want to invest in sustainable companies",
+    "Cheap index fund for the whole US market",
+    "Bonds to protect my savings",
+    "How do I invest in gold?",
+    "Dividend income every quarter",
+]
+
+CHAT_PROFILE = (
+    "User Profile:\n- Age: 29\n- Monthly income: 2500 AZN\n- Savings: 6000 AZN\n"
+    "- Goal: Buy a house in 8 years\n- Risk tolerance: moderate"
+)
+
+RECOMMEND_PAYLOAD = {
+    "salary": 2500,
+    "savings": 9000,
+    "monthly_expenses": 1200,
+    "debt": 0,
+    "monthly_investment": 300,
+    "goal": "house",
+    "time_horizon_years": 8,
+    "goal_amount": 40000,
+    "currency": "AZN",
+}
+
+
+# Deterministic stand-in for the sentence-transformers model
+class StubEmbeddingModel:
+    """Hashes words into a fixed-size unit vector (same text, same vector)"""
+
+    def __init__(self, dimensions: int = 384, latency_ms: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if isinstance(texts, str):
+            return self._embed(texts)
+        return np.vstack([self._embed(text) for text in texts])
+
+
+# Quote/history stand-in for yfinance.Ticker
+class StubTicker:
+    """Synthetic but stable prices per symbol"""
+
+    def __init__(self, symbol: str, latency_ms: float = 0.0):
+        self.symbol = symbol
+        self.latency_ms = latency_ms
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        self.price = float(rng.uniform(20, 500))
+        self.info = {
+            "regularMarketPrice": self.price,
+            "regularMarketPreviousClose": self.price * 0.995,
+            "previousClose": self.price * 0.995,
+            "volume": int(rng.integers(10_000, 5_000_000)),
+            "averageVolume": int(rng.integers(10_000, 5_000_000)),
+            "totalAssets": int(rng.integers(10**8, 10**11)),
+            "yield": 0.015,
+            "fiftyTwoWeekHigh": self.price * 1.2,
+            "fiftyTwoWeekLow": self.price * 0.8,
+        }
+
+    def history(self, period: str = "1mo"):
+        import pandas as pd
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        days = {"1d": 1, "5d": 5, "1mo": 21, "ytd": 200}.get(period, 21)
+        closes = self.price * np.linspace(0.95, 1.0, days)
+        return pd.DataFrame({"Close": closes, "Volume": np.full(days, self.info["volume"])})
+
+
+# yfinance and requests modules as seen by financial_api / live_etf_data
+class StubMarketData:
+    """Serves Alpha Vantage quotes (requests.get) and yfinance tickers"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    def Ticker(self, symbol: str) -> StubTicker:
+        return StubTicker(symbol, self.latency_ms)
+
+    def get(self, url: str, params: Optional[Dict] = None, timeout: float = None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        ticker = StubTicker(params["symbol"])
+        quote = {
+            "05. price": f"{ticker.price:.2f}",
+            "09. change": f"{ticker.price * 0.005:.2f}",
+            "10. change percent": "0.5025%",
+            "06. volume": str(ticker.info["volume"]),
+        }
+        return SimpleNamespace(json=lambda: {"Global Quote": quote})
+
+
+# Patch the network edges of the app and point storage at a temp database
+def install_stubs(config: Dict, workdir: str):
+    """
+    Returns:
+        The backend module, ready to serve with every dependency stubbed
+    """
+    import backend
+    import financial_api
+    import live_etf_data
+    import vector_store
+    from database import init_database, set_storage
+    from storage import SQLiteStorage
+
+    market = StubMarketData(config["market_latency_ms"])
+    financial_api.requests = market
+    financial_api.yf = market
+    live_etf_data.yf = market
+
+    set_storage(SQLiteStorage(os.path.join(workdir, "benchmark.db")))
+    init_database()
+
+    if config.get("llm_base_url"):
+        backend.client = create_llm_client("openai", base_url=config["llm_base_url"])
+    else:
+        backend.client = StubLLMClient(config["llm_first_token_ms"], config["llm_tokens_per_second"], config["llm_tokens"])
+
+    # Stub vectors take the numpy (normalized matrix) search path
+    store = vector_store.ETFVectorStore(cache_file=os.path.join(workdir, "etf_embeddings.pkl"), lazy=True)
+    store.embedding_model = StubEmbeddingModel(latency_ms=config["embedding_latency_ms"])
+    store.load_embeddings()
+    store.embeddings = np.asarray(store.embeddings, dtype=np.float32)
+    vector_store.MMAP_EMBEDDINGS = True
+    vector_store.set_vector_store(store)
+
+    return backend
+
+
+# Forget cached quotes so every suite starts cold
+def _clear_market_caches():
+    import financial_api
+    import live_etf_data
+
+    financial_api.clear_cache()
+    live_etf_data._price_cache.clear()
+
+
+# Latency list -> summary (milliseconds)
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict:
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0, "errors": errors}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "ops_per_second": round(len(values) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+# Time fn() n times, one call after another
+def _time_calls(fn, n: int, warmup: int = 5) -> Dict:
+    for i in range(min(warmup, n)):
+        fn(i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(n):
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# ETFVectorStore.search latency
+def bench_vector_search(config: Dict) -> Dict:
+    from vector_store import get_vector_store
+
+    store = get_vector_store()
+    queries = BENCHMARK_QUERIES
+    return {
+        f"top_{k}": _time_calls(lambda i: store.search(queries[i % len(queries)], n_results=k), config["iterations"])
+        for k in (3, 5)
+    }
+
+
+# Prompt assembly for /chat (RAG context with warm and cold quote caches)
+def bench_prompt_assembly(config: Dict) -> Dict:
+    import backend
+
+    def request(i: int):
+        return backend.ChatRequest(messages=[
+            backend.Message(role="system", content=CHAT_PROFILE),
+            backend.Message(role="user", content=BENCHMARK_QUERIES[i % len(BENCHMARK_QUERIES)]),
+        ])
+
+    def cold(i: int):
+        _clear_market_caches()
+        backend.build_chat_messages(request(i))
+
+    results = {"cold_cache": _time_calls(cold, max(config["iterations"] // 10, 1), warmup=0)}
+    results["warm_cache"] = _time_calls(lambda i: backend.build_chat_messages(request(i)), config["iterations"])
+    return results
+
+
+# Database writes: sequential, then threads sharing the file
+def bench_database_writes(config: Dict) -> Dict:
+    from database import save_message, save_recommendation
+
+    portfolio = {"risk_profile": "moderate", "monthly_investment_azn": 300,
+                 "allocations": [{"etf": "SPY", "percentage": 60}, {"etf": "BND", "percentage": 40}]}
+    operations = {
+        "save_message": lambda session: save_message(session, "user", "How should I invest 300 AZN a month?"),
+        "save_recommendation": lambda session: save_recommendation(
+            session, 2500, 9000, 1200, 0, "house", 8, portfolio, "Benchmark plan"
+        ),
+    }
+
+    results = {}
+    n = config["iterations"]
+    for name, operation in operations.items():
+        results[name] = {}
+        for workers in config["concurrency"]:
+            lock = threading.Lock()
+            latencies = []
+
+            def write(i: int):
+                call_started = time.perf_counter()
+                operation(f"bench-{i % 100}")
+                with lock:
+                    latencies.append(time.perf_counter() - call_started)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(write, range(n)))
+            results[name][f"c{workers}"] = summarize(latencies, time.perf_counter() - started)
+    return results
+
+
+# Fire n requests at one endpoint with a fixed number in flight
+async def _load_test(app, method: str, path: str, make_body, n: int, concurrency: int) -> Dict:
+    import httpx
+
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                call_started = time.perf_counter()
+                response = await client.request(method, path, json=make_body(i))
+                latencies.append(time.perf_counter() - call_started)
+                if response.status_code != 200:
+                    errors += 1
+
+        # Warm up routes and caches outside the timed window
+        await asyncio.gather(*(one(i) for i in range(min(concurrency, n))))
+        latencies.clear()
+        errors = 0
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        return summarize(latencies, time.perf_counter() - started, errors)
+
+
+# POST /investment/recommend throughput (stores each plan)
+def bench_recommend(config: Dict) -> Dict:
+    import backend
+
+    def body(i: int) -> Dict:
+        return {**RECOMMEND_PAYLOAD, "monthly_investment": 100 + i % 50 * 10, "session_id": f"bench-{i % 100}"}
+
+    return {
+        f"c{c}": asyncio.run(_load_test(backend.app, "POST", "/investment/recommend", body, config["requests"], c))
+        for c in config["concurrency"]
+    }
+
+
+# POST /chat end-to-end latency
+def bench_chat(config: Dict) -> Dict:
+    import backend
+
+    def body(i: int) -> Dict:
+        return {"messages": [
+            {"role": "system", "content": CHAT_PROFILE},
+            {"role": "user", "content": BENCHMARK_QUERIES[i % len(BENCHMARK_QUERIES)]},
+        ]}
+
+    return {
+        f"c{c}": asyncio.run(_load_test(backend.app, "POST", "/chat", body, config["requests"], c))
+        for c in config["concurrency"]
+    }
+
+
+# Monte Carlo projection latency against the target: simulation (table builds) and table lookup (requests)
+def bench_projection(config: Dict) -> Dict:
+    import allocation_tables
+    from monte_carlo import PROJECTION_TARGET_MS, run_projection
+
+    weights = {"SPY": 80, "BND": 20}
+    # Each simulation takes tens of milliseconds - fewer calls than the fast suites
+    n = max(config["iterations"] // 20, 10)
+    results = {"target_ms": PROJECTION_TARGET_MS}
+    results["simulate_10k_40y"] = _time_calls(
+        lambda i: run_projection(300, 40, weights, "aggressive", goal_amount=200_000, seed=i), n
+    )
+
+    # Tables built into a temp file; the app's own tables (if any) are restored afterwards
+    saved = allocation_tables._tables, allocation_tables._last_check
+    try:
+        with tempfile.TemporaryDirectory(prefix="investbuddy-tables-") as tables_dir:
+            path = os.path.join(tables_dir, "allocation_tables.npz")
+            allocation_tables.save_tables(allocation_tables.build_tables(), path)
+            allocation_tables.load_tables(path)
+            results["table_lookup_40y"] = _time_calls(
+                lambda i: allocation_tables.lookup_projection(40, "aggressive", 300 + i, 200_000, goal="house"),
+                config["iterations"]
+            )
+    finally:
+        allocation_tables._tables, allocation_tables._last_check = saved
+
+    for case in ("simulate_10k_40y", "table_lookup_40y"):
+        results[case]["within_target"] = results[case]["p50_ms"] <= PROJECTION_TARGET_MS
+    return results
+
+
+SUITE_FUNCTIONS = {
+    "vector_search": bench_vector_search,
+    "prompt_assembly": bench_prompt_assembly,
+    "database_writes": bench_database_writes,
+    "recommend": bench_recommend,
+    "chat": bench_chat,
+    "projection": bench_projection,
+}
+
+
+# Current commit, so results can be tied to the code they measured
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# Run the selected suites with stubs installed
+def run_benchmarks(config: Dict, suites: Optional[List[str]] = None) -> Dict:
+    """
+    Args:
+        config: iterations, requests, concurrency (list) and stub latencies
+        suites: Names from SUITES (default: all)
+
+    Returns:
+        {"meta": {...}, "config": {...}, "results": {suite: {...}}}
+    """
+    suites = suites or SUITES
+    unknown = [s for s in suites if s not in SUITE_FUNCTIONS]
+    if unknown:
+        raise ValueError(f"Unknown suite: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="investbuddy-bench-") as workdir:
+        install_stubs(config, workdir)
+
+        results = {}
+        for suite in suites:
+            print(f"⏱️ {suite}...")
+            _clear_market_caches()
+            started = time.perf_counter()
+            results[suite] = SUITE_FUNCTIONS[suite](config)
+            print(f"   done in {time.perf_counter() - started:.1f}s")
+
+    return {
+        "meta": {
+            "run_id": uuid.uuid4().hex[:12],
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+
+
+# Flatten results to {"suite.case.metric": value}
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key == "ops_per_second"):
+            flat[path] = float(value)
+    return flat
+
+
+# Compare two runs metric by metric
+def compare_results(baseline: Dict, current: Dict, threshold_pct: float = DEFAULT_REGRESSION_PCT) -> List[Dict]:
+    """
+    Latencies (*_ms) regress when they grow, ops_per_second when it drops
+
+    Returns:
+        One row per metric present in both runs, with change_pct and regression flag
+    """
+    before, after = _flatten(baseline["results"]), _flatten(current["results"])
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        old, new = before[metric], after[metric]
+        if not old:
+            continue
+        change_pct = (new - old) / old * 100
+        worse = -change_pct if metric.endswith("ops_per_second") else change_pct
+        rows.append({
+            "metric": metric,
+            "baseline": old,
+            "current": new,
+            "change_pct": round(change_pct, 2),
+            "regression": worse > threshold_pct,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline InvestBuddy benchmarks")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated: {', '.join(SUITES)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated in-flight request counts")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--iterations", type=int, default=500, help="Calls per in-process benchmark")
+    parser.add_argument("--llm-first-token-ms", type=float, default=50.0)
+    parser.add_argument("--llm-tokens", type=int, default=50, help="Completion tokens per reply")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=1000.0)
+    parser.add_argument("--llm-base-url", default=None, help="OpenAI-compatible server instead of the in-process stub")
+    parser.add_argument("--market-latency-ms", type=float, default=0.0, help="Per stubbed quote/history call")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Per stubbed encode call")
+    parser.add_argument("--output", default=None, help="JSON file (default: data/benchmarks/benchmark-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_PCT, help="Regression threshold in %%")
+    args = parser.parse_args()
+
+    config = {
+        "iterations": args.iterations,
+        "requests": args.requests,
+        "concurrency": [int(c) for c in args.concurrency.split(",")],
+        "llm_first_token_ms": args.llm_first_token_ms,
+        "llm_tokens": args.llm_tokens,
+        "llm_tokens_per_second": args.llm_tokens_per_second,
+        "llm_base_url": args.llm_base_url,
+        "market_latency_ms": args.market_latency_ms,
+        "embedding_latency_ms": args.embedding_latency_ms,
+    }
+    report = run_benchmarks(config, [s.strip() for s in args.suites.split(",") if s.strip()])
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare_results(json.load(f), report, args.threshold)
+        regressions = [row for row in rows if row["regression"]]
+        for row in rows:
+            marker = "❌" if row["regression"] else "  "
+            print(f"{marker} {row['metric']:<55} {row['baseline']:>12.3f} -> {row['current']:>12.3f} "
+                  f"({row['change_pct']:+.1f}%)")
+        print(f"{'❌' if regressions else '✅'} {len(regressions)} regression(s) over {args.threshold:g}%")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,231 @@
+"""
+Chart History
+Downsampled daily price series for charts, from the local bar store
+
+A chart only needs about one point per pixel, so series are reduced on the
+server before they are sent:
+
+    lttb    - Largest-Triangle-Three-Buckets: keeps the points that carry
+              the visual shape (one per bucket), best for line charts
+    minmax  - lowest and highest close of every pixel column, so no spike
+              is lost (up to two points per pixel)
+    none    - every bar
+
+Series come back as columns (dates, closes) in JSON, or as a compact binary
+frame. A client that already has a series asks for `since=<last date>` and
+gets only the newer bars. Reduced series are cached per request shape until
+the underlying bars are reloaded.
+
+Binary layout (little endian):
+
+    4 bytes  b"IBH1"
+    uint32   point count N
+    int32[N] dates as days since 1970-01-01
+    float32[N] closes
+"""
+
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from price_history import get_daily_bars
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax", "none")
+
+# Chart widths accepted (points for lttb, pixel columns for minmax)
+MIN_WIDTH = 10
+MAX_WIDTH = 5000
+
+BINARY_MAGIC = b"IBH1"
+
+# Reduced series kept in memory
+SERIES_CACHE_SIZE = 512
+
+_series_cache: "OrderedDict[tuple, Dict[str, np.ndarray]]" = OrderedDict()
+_series_lock = threading.Lock()
+
+
+# Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Args:
+        x: (N,) increasing positions (e.g. days)
+        y: (N,) values
+        threshold: Points to keep (first and last always kept)
+
+    Returns:
+        Sorted indices into x / y
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+
+    # Inner points split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # Average point of every bucket (the third triangle corner for the bucket before it)
+    x_sums = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    y_sums = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    x_avg = np.append(x_sums / counts, x[-1])
+    y_avg = np.append(y_sums / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        # Twice the triangle area (a, candidate, next bucket average)
+        area = np.abs(
+            (x[a] - x_avg[b + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (y_avg[b + 1] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+# Min and max of every pixel column, in time order
+def minmax(y: np.ndarray, width: int) -> np.ndarray:
+    """
+    Returns:
+        Sorted indices (about 2 * width, first and last point always included)
+    """
+    n = len(y)
+    if 2 * width >= n:
+        return np.arange(n)
+
+    bucket = np.arange(n) * width // n
+    # Within each bucket, sorted by value: first = min, last = max
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    keep = np.union1d(order[starts], order[ends])
+    return np.union1d(keep, [0, n - 1])
+
+
+# Bars of one symbol between optional dates (local store only)
+def _load_series(symbol: str, start: Optional[str], end: Optional[str], since: Optional[str]):
+    bars = get_daily_bars(symbol, allow_download=False)
+    if bars is None or len(bars["close"]) == 0:
+        raise LookupError(f"No price history for {symbol}")
+
+    dates, closes = bars["dates"], bars["close"]
+    lo, hi = 0, len(dates)
+    if start:
+        lo = max(lo, int(np.searchsorted(dates, np.datetime64(start, "D"), side="left")))
+    if since:
+        lo = max(lo, int(np.searchsorted(dates, np.datetime64(since, "D"), side="right")))
+    if end:
+        hi = min(hi, int(np.searchsorted(dates, np.datetime64(end, "D"), side="right")))
+    return bars["loaded_at"], dates[lo:hi], closes[lo:hi], len(dates)
+
+
+# Chart series for one symbol
+def get_chart_series(
+    symbol: str,
+    width: int = 800,
+    method: str = "lttb",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    since: Optional[str] = None
+) -> Dict:
+    """
+    Args:
+        symbol: ETF symbol
+        width: Target points (lttb) or pixel columns (minmax)
+        method: One of DOWNSAMPLE_METHODS
+        start, end: Date range (YYYY-MM-DD, inclusive)
+        since: Only bars after this date (delta update)
+
+    Returns:
+        Dict with "dates" (datetime64[D]) and "closes" arrays plus counts
+
+    Raises:
+        ValueError: bad arguments
+        LookupError: no local history for the symbol
+    """
+    symbol = symbol.upper()
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+    if not MIN_WIDTH <= width <= MAX_WIDTH:
+        raise ValueError(f"width must be between {MIN_WIDTH} and {MAX_WIDTH}")
+    try:
+        loaded_at, dates, closes, total = _load_series(symbol, start, end, since)
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+
+    # Bars reloaded from disk get a new loaded_at, which retires older entries
+    key = (symbol, width, method, start, end, since, loaded_at)
+    with _series_lock:
+        cached = _series_cache.get(key)
+        if cached is not None:
+            _series_cache.move_to_end(key)
+            return cached
+
+    if method == "lttb":
+        keep = lttb(dates.astype(np.int64), closes, width)
+    elif method == "minmax":
+        keep = minmax(closes, width)
+    else:
+        keep = np.arange(len(dates))
+
+    series = {
+        "symbol": symbol,
+        "method": method,
+        "dates": dates[keep],
+        "closes": closes[keep],
+        "points": int(len(keep)),
+        "range_points": int(len(dates)),
+        "total_points": total,
+        "last_date": str(dates[-1]) if len(dates) else since,
+    }
+    with _series_lock:
+        _series_cache[key] = series
+        while len(_series_cache) > SERIES_CACHE_SIZE:
+            _series_cache.popitem(last=False)
+    return series
+
+
+# Columnar JSON body
+def series_to_json(series: Dict) -> Dict:
+    return {
+        **{k: v for k, v in series.items() if k not in ("dates", "closes")},
+        "dates": np.datetime_as_string(series["dates"], unit="D").tolist(),
+        "closes": np.round(series["closes"], 4).tolist(),
+    }
+
+
+# Compact binary frame (see module docstring)
+def series_to_binary(series: Dict) -> bytes:
+    days = series["dates"].astype("datetime64[D]").astype(np.int64).astype("<i4")
+    closes = series["closes"].astype("<f4")
+    return BINARY_MAGIC + struct.pack("<I", len(days)) + days.tobytes() + closes.tobytes()
+
+
+# Decode a binary frame (clients, tests)
+def binary_to_series(payload: bytes) -> Dict[str, np.ndarray]:
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError("Not a chart history frame")
+    (count,) = struct.unpack_from("<I", payload, 4)
+    days = np.frombuffer(payload, dtype="<i4", count=count, offset=8)
+    closes = np.frombuffer(payload, dtype="<f4", count=count, offset=8 + 4 * count)
+    return {"dates": days.astype("datetime64[D]"), "closes": closes}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    symbol = sys.argv[1] if len(sys.argv) > 1 else "SPY"
+    for method in DOWNSAMPLE_METHODS:
+        started = time.perf_counter()
+        series = get_chart_series(symbol, width=800, method=method)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"📈 {symbol} {method:<6} {series['points']:>6} of {series['total_points']} points "
+              f"in {elapsed:.2f} ms, {len(series_to_binary(series)):,} bytes binary")
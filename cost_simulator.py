@@ -0,0 +1,253 @@
+"""
+Cost Simulator
+Fee drag of every platform x ETF combination on a monthly contribution plan
+
+Each combination grows a fixed monthly contribution at an assumed return,
+minus its costs:
+
+    commission     - per order, from the platform's fee schedule
+    fx_spread      - lost converting each deposit to USD
+    custody        - platform fee per year on assets
+    expense_ratio  - ETF fee per year on assets
+    account_fee    - flat platform fee per month
+
+With constant contributions the end value has a closed form (an annuity
+with growth g per month, minus an annuity of account fees), so every
+platform, ETF, horizon and cost scenario is one broadcast array expression:
+(scenarios x platforms x ETFs x horizons). Cost drag is the gap to the same
+plan with no costs; each component's drag is measured with only that cost
+switched on.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from etf_knowledge import EXPENSE_RATIOS, ETF_KNOWLEDGE_BASE
+from fx import get_rate
+from investment_logic import BASE_CURRENCY
+from investment_platforms import PLATFORM_TRADING_RULES
+from monte_carlo import FALLBACK_ASSUMPTIONS
+
+# Cost components, in the order of the scenario axis after "all" and "none"
+COST_COMPONENTS = ["commission", "fx_spread", "custody", "expense_ratio", "account_fee"]
+
+# Share price used for per-share commissions when no quote is given
+REFERENCE_PRICE_USD = 100.0
+
+# Horizons reported alongside the main one
+REPORT_YEARS = [1, 5, 10, 20, 30]
+
+
+# Scenario masks: (S x components) with rows all, none, then each cost alone
+def _scenario_masks() -> np.ndarray:
+    n = len(COST_COMPONENTS)
+    return np.vstack([np.ones(n), np.zeros(n), np.eye(n)])
+
+
+# Per-order commission for every platform at once
+def _order_commissions(order_usd: np.ndarray, prices: np.ndarray, rules: List[Dict]) -> np.ndarray:
+    """
+    Args:
+        order_usd: (P,) order size per platform
+        prices: (E,) USD share prices
+        rules: P platform rule dicts
+
+    Returns:
+        (P x E) commission per order
+    """
+    column = lambda field: np.array([r[field] for r in rules], dtype=np.float64)[:, None]
+    shares = order_usd[:, None] / prices[None, :]
+    fees = column("fee_fixed_usd") + column("fee_per_share_usd") * shares + column("fee_pct") * order_usd[:, None]
+    fees = np.maximum(fees, column("min_fee_usd"))
+    return np.where(order_usd[:, None] > 0, fees, 0.0)
+
+
+# End values for every scenario, platform, ETF and horizon
+def simulate_costs(
+    monthly_usd: float,
+    horizons_months: np.ndarray,
+    annual_return: float,
+    rules: List[Dict],
+    expense_ratios: np.ndarray,
+    prices: np.ndarray,
+    convert_deposits: bool = True,
+    order_frequency_months: int = 1
+) -> np.ndarray:
+    """
+    Args:
+        monthly_usd: Contribution per month, before costs
+        horizons_months: (H,) plan lengths in months
+        annual_return: Expected gross return per year
+        rules: P platform rule dicts (PLATFORM_TRADING_RULES entries)
+        expense_ratios: (E,) ETF expense ratios (fractions per year)
+        prices: (E,) USD share prices for per-share commissions
+        convert_deposits: Deposits arrive in another currency (FX spread applies)
+        order_frequency_months: Buy every this many months (fewer commissions,
+            cash waits uninvested for (k-1)/2 months on average)
+
+    Returns:
+        (S x P x E x H) end values in USD, scenarios as in _scenario_masks()
+    """
+    masks = _scenario_masks()
+    on = {name: masks[:, i][:, None, None] for i, name in enumerate(COST_COMPONENTS)}
+    column = lambda field: np.array([r[field] for r in rules], dtype=np.float64)[None, :, None]
+    k = max(int(order_frequency_months), 1)
+
+    # Money reaching the market each month, after FX spread and commissions
+    fx_spread = column("fx_spread_pct") * on["fx_spread"] if convert_deposits else 0.0
+    deposited = monthly_usd * (1.0 - fx_spread)
+    order_usd = monthly_usd * k * (1.0 - np.array([r["fx_spread_pct"] for r in rules]) * convert_deposits)
+    commission = _order_commissions(order_usd, prices, rules)[None, :, :] / k * on["commission"]
+    # Batching orders to save commissions leaves cash idle - charged to commissions
+    waiting = np.where(on["commission"] > 0, (1.0 + annual_return) ** (-(k - 1) / 24), 1.0)
+    net = np.maximum(deposited - commission, 0.0) * waiting
+
+    # Monthly growth factor after percentage-of-assets fees
+    yearly = (
+        (1.0 + annual_return)
+        * (1.0 - expense_ratios[None, None, :] * on["expense_ratio"])
+        * (1.0 - column("custody_fee_pct") * on["custody"])
+    )
+    g = (yearly ** (1 / 12))[..., None]
+    account_fee = (column("account_fee_usd") * on["account_fee"])[..., None]
+
+    # V_T = net * g (g^T - 1) / (g - 1) - fee * (g^T - 1) / (g - 1)
+    t = np.asarray(horizons_months, dtype=np.float64)
+    growth = g ** t
+    near_one = np.abs(g - 1.0) < 1e-12
+    annuity = np.where(near_one, t, (growth - 1.0) / np.where(near_one, 1.0, g - 1.0))
+    return net[..., None] * g * annuity - account_fee * annuity
+
+
+# Ranked platform x ETF cost comparison for one plan
+def compare_costs(
+    monthly_investment: float,
+    years: int = 20,
+    currency: str = BASE_CURRENCY,
+    symbols: Optional[List[str]] = None,
+    platforms: Optional[List[str]] = None,
+    risk_profile: str = "moderate",
+    annual_return: Optional[float] = None,
+    order_frequency_months: int = 1,
+    prices: Optional[Dict[str, float]] = None,
+    limit: Optional[int] = None
+) -> Dict:
+    """
+    Args:
+        monthly_investment: Contribution per month, in currency
+        years: Main horizon for the ranking
+        currency: Currency of the contribution (and of the reported amounts)
+        symbols: ETFs to compare (default: every ETF with a known expense ratio)
+        platforms: Platform names (default: all in PLATFORM_TRADING_RULES)
+        risk_profile: Picks the default return assumption
+        annual_return: Expected gross return per year (overrides risk_profile)
+        order_frequency_months: Buy every this many months
+        prices: {symbol: USD price} for per-share commissions
+        limit: Keep only the cheapest N combinations
+
+    Returns:
+        Dict with the assumptions, combinations ranked by end value, the
+        cheapest combination per platform, and drag at REPORT_YEARS
+    """
+    if monthly_investment <= 0:
+        raise ValueError("monthly_investment must be positive")
+    if not 1 <= years <= 60:
+        raise ValueError("years must be between 1 and 60")
+
+    symbols = [s.upper() for s in (symbols or EXPENSE_RATIOS.keys())]
+    unknown = [s for s in symbols if s not in EXPENSE_RATIOS]
+    if unknown:
+        raise ValueError(f"No expense ratio for {', '.join(unknown)}")
+    platforms = list(platforms or PLATFORM_TRADING_RULES.keys())
+    unknown = [p for p in platforms if p not in PLATFORM_TRADING_RULES]
+    if unknown:
+        raise ValueError(f"Unknown platform: {', '.join(unknown)}")
+
+    if annual_return is None:
+        annual_return = FALLBACK_ASSUMPTIONS.get(risk_profile, FALLBACK_ASSUMPTIONS["moderate"])[0]
+
+    currency = currency.upper()
+    usd_per_local = get_rate(currency, "USD")
+    monthly_usd = monthly_investment * usd_per_local
+
+    rules = [PLATFORM_TRADING_RULES[p] for p in platforms]
+    expense_ratios = np.array([EXPENSE_RATIOS[s] for s in symbols])
+    price_vector = np.array([(prices or {}).get(s, REFERENCE_PRICE_USD) for s in symbols], dtype=np.float64)
+    horizons = sorted({years, *REPORT_YEARS})
+    main = horizons.index(years)
+
+    values = simulate_costs(
+        monthly_usd, np.array(horizons) * 12, annual_return, rules, expense_ratios, price_vector,
+        convert_deposits=currency != "USD", order_frequency_months=order_frequency_months
+    ) / usd_per_local
+
+    # Drag = no-cost value minus value; components measured alone
+    all_costs, no_costs = values[0], values[1]
+    drag = no_costs - all_costs
+    component_drag = no_costs[None] - values[2:]
+    drag_pct = drag / no_costs * 100
+
+    # Rank by end value at the main horizon
+    order = np.argsort(-all_costs[..., main], axis=None)
+    if limit:
+        order = order[:limit]
+    p_index, e_index = np.unravel_index(order, all_costs.shape[:2])
+
+    ranking = []
+    for rank, (p, e) in enumerate(zip(p_index.tolist(), e_index.tolist()), start=1):
+        ranking.append({
+            "rank": rank,
+            "platform": platforms[p],
+            "etf": symbols[e],
+            "etf_name": ETF_KNOWLEDGE_BASE[symbols[e]]["name"],
+            "expense_ratio_pct": round(float(expense_ratios[e]) * 100, 3),
+            "end_value": round(float(all_costs[p, e, main]), 2),
+            "cost": round(float(drag[p, e, main]), 2),
+            "cost_pct": round(float(drag_pct[p, e, main]), 3),
+            "breakdown": {
+                name: round(float(component_drag[i, p, e, main]), 2)
+                for i, name in enumerate(COST_COMPONENTS)
+            },
+        })
+
+    best_per_platform = {}
+    for p, platform in enumerate(platforms):
+        e = int(np.argmax(all_costs[p, :, main]))
+        best_per_platform[platform] = {
+            "etf": symbols[e],
+            "end_value": round(float(all_costs[p, e, main]), 2),
+            "cost_pct": round(float(drag_pct[p, e, main]), 3),
+            "cost_pct_by_years": {
+                str(h): round(float(drag_pct[p, e, j]), 3) for j, h in enumerate(horizons)
+            },
+        }
+
+    return {
+        "assumptions": {
+            "monthly_investment": monthly_investment,
+            "currency": currency,
+            "years": years,
+            "annual_return": annual_return,
+            "order_frequency_months": order_frequency_months,
+            "no_cost_end_value": round(float(no_costs[0, 0, main]), 2),
+            "total_contributed": round(monthly_investment * years * 12, 2),
+        },
+        "ranking": ranking,
+        "best_per_platform": best_per_platform,
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import time
+
+    started = time.perf_counter()
+    result = compare_costs(200, years=20, limit=10)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"💸 Cheapest platform x ETF combinations (200 {BASE_CURRENCY}/month, 20 years, {elapsed:.1f} ms)")
+    for row in result["ranking"]:
+        print(f"{row['rank']:>2}. {row['platform']:<20} {row['etf']:<6} "
+              f"end {row['end_value']:>12,.2f}  cost {row['cost']:>10,.2f} ({row['cost_pct']:.2f}%)")
+    print(json.dumps(result["best_per_platform"], indent=2))
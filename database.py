@@ -1,13 +1,35 @@
 # Database module for InvestBuddy
+import os
 import sqlite3
-import json
-from datetime import datetime
 from typing import List, Dict, Optional
 
-# SQLite database file path
-DATABASE_PATH = "investbuddy.db"
+from storage import StorageBackend, create_storage
 
-# Initialize database connection
+# SQLite database file path (defaults to the file next to this module)
+DATABASE_PATH = os.getenv(
+    "DATABASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "investbuddy.db")
+)
+
+# Set DATABASE_URL=postgresql://... to share state between backend nodes
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Active storage backend (created on first use)
+_storage: Optional[StorageBackend] = None
+
+# Get or create the storage backend
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = create_storage(DATABASE_URL, DATABASE_PATH)
+    return _storage
+
+# Swap the storage backend (benchmarks, alternative deployments)
+def set_storage(storage: StorageBackend):
+    global _storage
+    _storage = storage
+
+# Initialize database connection (SQLite only - used by maintenance tools)
 def get_db_connection():
     conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
@@ -15,129 +37,21 @@ def get_db_connection():
 
 # Create all tables
 def init_database():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Users table - stores basic user session information
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Conversations table - stores chat messages
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES users(session_id)
-        )
-    """)
-
-    # Recommendations table - stores investment recommendations
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS recommendations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            salary REAL,
-            savings REAL,
-            monthly_expenses REAL,
-            debt REAL,
-            goal TEXT,
-            time_horizon INTEGER,
-            portfolio JSON,
-            recommendation_text TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES users(session_id)
-        )
-    """)
-
-    # Create indexes for better query performance
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_conversations_session
-        ON conversations(session_id)
-    """)
-
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_recommendations_session
-        ON recommendations(session_id)
-    """)
-
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully!")
+    storage = get_storage()
+    storage.init_schema()
+    print(f"Database initialized successfully! ({storage.name})")
 
 # Create or get user session
 def create_or_get_user(session_id: str) -> int:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Try to get existing user
-    cursor.execute("SELECT id FROM users WHERE session_id = ?", (session_id,))
-    user = cursor.fetchone()
-
-    if user:
-        # Update last active time
-        cursor.execute(
-            "UPDATE users SET last_active = ? WHERE session_id = ?",
-            (datetime.now(), session_id)
-        )
-        user_id = user[0]
-    else:
-        # Create new user
-        cursor.execute(
-            "INSERT INTO users (session_id) VALUES (?)",
-            (session_id,)
-        )
-        user_id = cursor.lastrowid
-
-    conn.commit()
-    conn.close()
-    return user_id
+    return get_storage().create_or_get_user(session_id)
 
 # Save conversation message
 def save_message(session_id: str, role: str, content: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "INSERT INTO conversations (session_id, role, content) VALUES (?, ?, ?)",
-        (session_id, role, content)
-    )
-
-    conn.commit()
-    conn.close()
+    get_storage().save_message(session_id, role, content)
 
 # Get conversation history
 def get_conversation_history(session_id: str, limit: int = 50) -> List[Dict]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """SELECT role, content, timestamp
-           FROM conversations
-           WHERE session_id = ?
-           ORDER BY timestamp ASC
-           LIMIT ?""",
-        (session_id, limit)
-    )
-
-    messages = []
-    for row in cursor.fetchall():
-        messages.append({
-            "role": row[0],
-            "content": row[1],
-            "timestamp": row[2]
-        })
-
-    conn.close()
-    return messages
+    return get_storage().get_conversation_history(session_id, limit)
 
 # Save investment recommendation
 def save_recommendation(
@@ -151,62 +65,54 @@ def save_recommendation(
     portfolio: Dict,
     recommendation_text: str
 ):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """INSERT INTO recommendations
-           (session_id, salary, savings, monthly_expenses, debt, goal,
-            time_horizon, portfolio, recommendation_text)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (session_id, salary, savings, monthly_expenses, debt, goal,
-         time_horizon, json.dumps(portfolio), recommendation_text)
+    get_storage().save_recommendation(
+        session_id, salary, savings, monthly_expenses, debt, goal,
+        time_horizon, portfolio, recommendation_text
     )
 
-    conn.commit()
-    conn.close()
-
 # Get user's latest recommendation
 def get_latest_recommendation(session_id: str) -> Optional[Dict]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """SELECT * FROM recommendations
-           WHERE session_id = ?
-           ORDER BY created_at DESC
-           LIMIT 1""",
-        (session_id,)
-    )
-
-    row = cursor.fetchone()
-    conn.close()
-
-    if row:
-        return {
-            "id": row[0],
-            "session_id": row[1],
-            "salary": row[2],
-            "savings": row[3],
-            "monthly_expenses": row[4],
-            "debt": row[5],
-            "goal": row[6],
-            "time_horizon": row[7],
-            "portfolio": json.loads(row[8]) if row[8] else {},
-            "recommendation_text": row[9],
-            "created_at": row[10]
-        }
-    return None
+    return get_storage().get_latest_recommendation(session_id)
 
 # Clear conversation history
 def clear_conversation(session_id: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    get_storage().clear_conversation(session_id)
+
+# Aggregate stored recommendations (served from the columnar projection)
+def aggregate_recommendations(dimension: str = "recommendations", group_by: Optional[List[str]] = None) -> List[Dict]:
+    return get_storage().aggregate_recommendations(dimension, group_by or [])
+
+# Async versions for request handlers (native async driver on PostgreSQL)
+async def create_or_get_user_async(session_id: str) -> int:
+    return await get_storage().create_or_get_user_async(session_id)
+
+async def save_message_async(session_id: str, role: str, content: str):
+    await get_storage().save_message_async(session_id, role, content)
+
+async def get_conversation_history_async(session_id: str, limit: int = 50) -> List[Dict]:
+    return await get_storage().get_conversation_history_async(session_id, limit)
+
+async def save_recommendation_async(
+    session_id: str,
+    salary: float,
+    savings: float,
+    monthly_expenses: float,
+    debt: float,
+    goal: str,
+    time_horizon: int,
+    portfolio: Dict,
+    recommendation_text: str
+):
+    await get_storage().save_recommendation_async(
+        session_id, salary, savings, monthly_expenses, debt, goal,
+        time_horizon, portfolio, recommendation_text
+    )
 
-    cursor.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+async def get_latest_recommendation_async(session_id: str) -> Optional[Dict]:
+    return await get_storage().get_latest_recommendation_async(session_id)
 
-    conn.commit()
-    conn.close()
+async def clear_conversation_async(session_id: str):
+    await get_storage().clear_conversation_async(session_id)
 
 # Initialize database on module import
 if __name__ == "__main__":
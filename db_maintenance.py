@@ -0,0 +1,313 @@
+"""
+Database Maintenance Job
+Retention, archival and compaction for investbuddy.db
+
+Sessions whose last message is older than the retention window are archived
+to compressed partition files and removed from the `conversations` table.
+Freed pages are then returned to the OS with incremental VACUUM and the query
+planner statistics are refreshed with ANALYZE.
+
+Every write happens in a short transaction so online writers (the backend)
+are never blocked for long - run it from cron or with --every.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from database import DATABASE_PATH, DATABASE_URL
+
+# Maintenance configuration (override with environment variables)
+RETENTION_DAYS = int(os.getenv("CONVERSATION_RETENTION_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("CONVERSATION_ARCHIVE_DIR", "./archive")
+ARCHIVE_FORMAT = os.getenv("CONVERSATION_ARCHIVE_FORMAT", "jsonl")  # "jsonl" or "parquet"
+SESSIONS_PER_BATCH = int(os.getenv("MAINTENANCE_SESSIONS_PER_BATCH", "200"))
+VACUUM_PAGES_PER_STEP = int(os.getenv("MAINTENANCE_VACUUM_PAGES_PER_STEP", "512"))
+PAUSE_BETWEEN_STEPS = float(os.getenv("MAINTENANCE_PAUSE_SECONDS", "0.05"))
+
+# SQLite "auto_vacuum" value for INCREMENTAL mode
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+# Open a maintenance connection (autocommit, waits politely on locks)
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+# Total on-disk size of the database including its WAL file
+def _database_size(db_path: str) -> int:
+    total = 0
+    for path in (db_path, f"{db_path}-wal"):
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+# Find sessions with no activity inside the retention window
+def find_stale_sessions(conn: sqlite3.Connection, retention_days: int) -> List[str]:
+    cursor = conn.execute(
+        """SELECT session_id
+           FROM conversations
+           GROUP BY session_id
+           HAVING MAX(timestamp) < datetime('now', ?)""",
+        (f"-{retention_days} days",)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+# Write one partition file and return its size in bytes
+def _write_partition(rows: List[Dict], path: str, archive_format: str) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if archive_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(rows)
+        pq.write_table(table, path, compression="zstd")
+    else:
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    return os.path.getsize(path)
+
+
+# Archive rows grouped into month partitions
+def archive_rows(rows: List[Dict], archive_dir: str, run_id: str, batch_no: int,
+                 archive_format: str = ARCHIVE_FORMAT) -> Dict:
+    """
+    Write rows to archive_dir/conversations/month=YYYY-MM/part-<run>-<batch>.<ext>
+
+    Returns:
+        Dict with number of files and bytes written
+    """
+    extension = "parquet" if archive_format == "parquet" else "jsonl.gz"
+
+    partitions: Dict[str, List[Dict]] = {}
+    for row in rows:
+        month = str(row["timestamp"])[:7]
+        partitions.setdefault(month, []).append(row)
+
+    files = 0
+    bytes_written = 0
+    for month, month_rows in partitions.items():
+        path = os.path.join(
+            archive_dir, "conversations", f"month={month}",
+            f"part-{run_id}-{batch_no:05d}.{extension}"
+        )
+        bytes_written += _write_partition(month_rows, path, archive_format)
+        files += 1
+
+    return {"files": files, "bytes": bytes_written}
+
+
+# Archive and delete stale sessions in small batches
+def archive_stale_sessions(
+    conn: sqlite3.Connection,
+    retention_days: int = RETENTION_DAYS,
+    archive_dir: str = ARCHIVE_DIR,
+    archive_format: str = ARCHIVE_FORMAT,
+    sessions_per_batch: int = SESSIONS_PER_BATCH
+) -> Dict:
+    """
+    Move conversations of inactive sessions into the archive
+
+    Rows are written (and flushed) to the archive before they are deleted,
+    and only rows that were actually archived are deleted, so a message that
+    arrives for a stale session mid-run is kept.
+    """
+    sessions = find_stale_sessions(conn, retention_days)
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+
+    stats = {"sessions": 0, "rows": 0, "files": 0, "archive_bytes": 0}
+
+    for batch_no, start in enumerate(range(0, len(sessions), sessions_per_batch)):
+        batch = sessions[start:start + sessions_per_batch]
+        placeholders = ",".join("?" * len(batch))
+
+        cursor = conn.execute(
+            f"""SELECT id, session_id, role, content, timestamp
+                FROM conversations
+                WHERE session_id IN ({placeholders})
+                ORDER BY id""",
+            batch
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+        if not rows:
+            continue
+
+        written = archive_rows(rows, archive_dir, run_id, batch_no, archive_format)
+        max_id = rows[-1]["id"]
+
+        # Short write transaction - the backend only waits for this batch
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"""DELETE FROM conversations
+                    WHERE session_id IN ({placeholders}) AND id <= ?""",
+                batch + [max_id]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        stats["sessions"] += len(batch)
+        stats["rows"] += len(rows)
+        stats["files"] += written["files"]
+        stats["archive_bytes"] += written["bytes"]
+
+        time.sleep(PAUSE_BETWEEN_STEPS)
+
+    return stats
+
+
+# Return free pages to the OS a few hundred pages at a time
+def incremental_vacuum(conn: sqlite3.Connection, pages_per_step: int = VACUUM_PAGES_PER_STEP) -> int:
+    """
+    Run PRAGMA incremental_vacuum in small steps
+
+    Returns:
+        Number of pages released
+    """
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+        print("⚠️ auto_vacuum is not INCREMENTAL - run with --convert once to enable it")
+        return 0
+
+    released = 0
+    while True:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages == 0:
+            break
+
+        # executescript steps the pragma to completion; execute() frees one page
+        step = min(free_pages, pages_per_step)
+        conn.executescript(f"PRAGMA incremental_vacuum({step});")
+        freed = free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if freed <= 0:
+            break
+        released += freed
+        time.sleep(PAUSE_BETWEEN_STEPS)
+
+    return released
+
+
+# One-time switch of an existing database to incremental auto-vacuum
+def convert_to_incremental(conn: sqlite3.Connection):
+    """
+    auto_vacuum can only change with a full VACUUM, which locks the database.
+    Run this once during a quiet period; every later run is incremental.
+    """
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    print("✅ Database converted to incremental auto-vacuum")
+
+
+# Run a full maintenance pass
+def run_maintenance(
+    db_path: str = DATABASE_PATH,
+    retention_days: int = RETENTION_DAYS,
+    archive_dir: str = ARCHIVE_DIR,
+    archive_format: str = ARCHIVE_FORMAT,
+    convert: bool = False
+) -> Dict:
+    """
+    Archive stale sessions, compact the file and refresh statistics
+
+    Returns:
+        Report with archived counts and reclaimed bytes
+    """
+    started = time.time()
+    size_before = _database_size(db_path)
+
+    conn = _connect(db_path)
+    try:
+        if convert:
+            convert_to_incremental(conn)
+
+        archived = archive_stale_sessions(
+            conn,
+            retention_days=retention_days,
+            archive_dir=archive_dir,
+            archive_format=archive_format
+        )
+        pages_released = incremental_vacuum(conn)
+        conn.execute("ANALYZE")
+
+        # PASSIVE never waits on readers; it moves as much of the WAL as it can
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    finally:
+        conn.close()
+
+    size_after = _database_size(db_path)
+
+    report = {
+        "database": db_path,
+        "retention_days": retention_days,
+        "sessions_archived": archived["sessions"],
+        "rows_archived": archived["rows"],
+        "archive_files": archived["files"],
+        "archive_bytes": archived["archive_bytes"],
+        "pages_released": pages_released,
+        "size_before_bytes": size_before,
+        "size_after_bytes": size_after,
+        "reclaimed_bytes": max(size_before - size_after, 0),
+        "duration_seconds": round(time.time() - started, 3),
+        "finished_at": datetime.utcnow().isoformat()
+    }
+
+    print(
+        f"🧹 Maintenance done: archived {report['rows_archived']} messages from "
+        f"{report['sessions_archived']} sessions, reclaimed {report['reclaimed_bytes']:,} bytes"
+    )
+    return report
+
+
+# Run maintenance forever on a fixed interval
+def run_maintenance_loop(interval_hours: float, **kwargs):
+    while True:
+        try:
+            report = run_maintenance(**kwargs)
+            print(json.dumps(report))
+        except Exception as e:
+            print(f"❌ Maintenance error: {e}")
+        time.sleep(interval_hours * 3600)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="InvestBuddy database maintenance")
+    parser.add_argument("--db", default=DATABASE_PATH, help="Path to the SQLite database")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=ARCHIVE_FORMAT)
+    parser.add_argument("--convert", action="store_true",
+                        help="One-time full VACUUM to enable incremental auto-vacuum")
+    parser.add_argument("--every", type=float, default=None,
+                        help="Keep running, repeating every N hours")
+    args = parser.parse_args()
+
+    if DATABASE_URL and DATABASE_URL.startswith(("postgres://", "postgresql://")):
+        print("ℹ️ DATABASE_URL points at PostgreSQL - use autovacuum and pg_dump there instead")
+        raise SystemExit(0)
+
+    options = {
+        "db_path": args.db,
+        "retention_days": args.retention_days,
+        "archive_dir": args.archive_dir,
+        "archive_format": args.format
+    }
+
+    if args.every:
+        run_maintenance_loop(args.every, **options)
+    else:
+        print(json.dumps(run_maintenance(convert=args.convert, **options), indent=2))
@@ -389,10 +389,32 @@ ETF_KNOWLEDGE_BASE = {
     },
 }
 
+def parse_percentage(text):
+    """
+    Parse a percentage string like "0.09%" into a fraction (0.0009)
+
+    Returns None when the text isn't a percentage (e.g. "N/A")
+    """
+    try:
+        return float(str(text).strip().rstrip("%")) / 100
+    except ValueError:
+        return None
+
+# Numeric expense ratios (fractions per year), parsed once from the knowledge base
+EXPENSE_RATIOS = {
+    symbol: parse_percentage(info["expense_ratio"])
+    for symbol, info in ETF_KNOWLEDGE_BASE.items()
+    if parse_percentage(info["expense_ratio"]) is not None
+}
+
 def get_etf_info(symbol):
     """Get detailed information about a specific ETF"""
     return ETF_KNOWLEDGE_BASE.get(symbol.upper())
 
+def get_expense_ratio(symbol):
+    """Get an ETF's expense ratio as a fraction per year, or None if unknown"""
+    return EXPENSE_RATIOS.get(symbol.upper())
+
 def get_all_etf_symbols():
     """Get list of all ETF symbols in knowledge base"""
     return list(ETF_KNOWLEDGE_BASE.keys())
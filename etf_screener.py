@@ -0,0 +1,260 @@
+"""
+ETF Screener
+Filter, sort and compare the whole ETF universe from a columnar table
+
+Static facts (category, risk level, expense ratio) come from the knowledge
+base; market metrics (price, YTD and 1-month return, dividend yield) from
+the live-data cache, and volatility (and YTD when no live data is cached)
+from the local daily bars. Nothing here calls a market-data provider: the
+table is rebuilt from those caches every SCREENER_REFRESH_SECONDS.
+
+Each metric is one NumPy array (NaN = unknown), so a screen is a handful of
+vectorized comparisons over all ETFs, an argsort and a slice for the page.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from etf_knowledge import ETF_KNOWLEDGE_BASE, EXPENSE_RATIOS
+from live_etf_data import get_cached_live_etf_data
+from price_history import get_daily_bars
+
+# How old the table may get before the next request rebuilds it
+SCREENER_REFRESH_SECONDS = 300
+
+# Trading days used for volatility
+VOLATILITY_DAYS = 252
+
+# Risk labels (lowercase prefix) -> rank for min/max risk filters
+RISK_RANKS = {"very high": 4, "higher": 3, "medium": 2, "low": 1}
+
+# Numeric columns that can be filtered (min_/max_) and sorted
+NUMERIC_COLUMNS = ["expense_ratio", "dividend_yield", "ytd_return", "month_return",
+                   "volatility", "price", "risk_rank"]
+SORT_COLUMNS = NUMERIC_COLUMNS + ["symbol"]
+
+# Columns shown in percent (filters on them arrive in percent through the API)
+PERCENT_COLUMNS = {"expense_ratio", "dividend_yield", "ytd_return", "month_return", "volatility"}
+
+MAX_PAGE_SIZE = 100
+
+_table: Optional[Dict[str, np.ndarray]] = None
+_table_lock = threading.Lock()
+
+
+# Rank of a risk label ("Medium (Auto-Adjusting)" -> medium)
+def risk_rank(label: str) -> int:
+    text = (label or "").lower()
+    for prefix, rank in RISK_RANKS.items():
+        if text.startswith(prefix):
+            return rank
+    return 0
+
+
+# Number or NaN (live data uses "N/A" and 0 for unknown)
+def _number(value, zero_is_missing: bool = False) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return np.nan if zero_is_missing and number == 0 else number
+
+
+# Annualized volatility and YTD return from daily bars
+def _bar_metrics(symbol: str, year_start: np.datetime64):
+    bars = get_daily_bars(symbol, allow_download=False)
+    if bars is None or len(bars["close"]) < 2:
+        return np.nan, np.nan
+
+    close = bars["close"]
+    returns = np.diff(np.log(close[-(VOLATILITY_DAYS + 1):]))
+    volatility = float(returns.std(ddof=1) * np.sqrt(252)) if len(returns) > 1 else np.nan
+
+    this_year = bars["dates"] >= year_start
+    if this_year.any():
+        first = int(np.argmax(this_year))
+        start = close[first - 1] if first > 0 else close[first]
+        ytd = float(close[-1] / start - 1)
+    else:
+        ytd = np.nan
+    return volatility, ytd
+
+
+# Build the columnar table from the knowledge base and market-data caches
+def build_table() -> Dict[str, np.ndarray]:
+    symbols = list(ETF_KNOWLEDGE_BASE)
+    n = len(symbols)
+    columns = {name: np.full(n, np.nan) for name in NUMERIC_COLUMNS}
+    year_start = np.datetime64(f"{datetime.now().year}-01-01")
+
+    for i, symbol in enumerate(symbols):
+        info = ETF_KNOWLEDGE_BASE[symbol]
+        columns["expense_ratio"][i] = EXPENSE_RATIOS.get(symbol, np.nan)
+        columns["risk_rank"][i] = risk_rank(info["risk_level"])
+        columns["volatility"][i], columns["ytd_return"][i] = _bar_metrics(symbol, year_start)
+
+        live = get_cached_live_etf_data(symbol)
+        if live and not live.get("error"):
+            columns["price"][i] = _number(live.get("current_price"), zero_is_missing=True)
+            columns["dividend_yield"][i] = _number(live.get("dividend_yield"), zero_is_missing=True)
+            # Live changes are in percent, and 0 when live has no history for them;
+            # keep the bar-based YTD when live has none
+            ytd = _number(live.get("ytd_change"), zero_is_missing=True) / 100
+            if not np.isnan(ytd):
+                columns["ytd_return"][i] = ytd
+            columns["month_return"][i] = _number(live.get("month_change"), zero_is_missing=True) / 100
+
+    categories = np.array([ETF_KNOWLEDGE_BASE[s]["category"] for s in symbols])
+    risk_levels = np.array([ETF_KNOWLEDGE_BASE[s]["risk_level"] for s in symbols])
+    return {
+        **columns,
+        "symbol": np.array(symbols),
+        "name": np.array([ETF_KNOWLEDGE_BASE[s]["name"] for s in symbols]),
+        "category": categories,
+        "category_lower": np.char.lower(categories),
+        "risk_level": risk_levels,
+        "built_at": time.time(),
+    }
+
+
+# Current table, rebuilt when older than SCREENER_REFRESH_SECONDS
+def get_table(refresh: bool = False) -> Dict[str, np.ndarray]:
+    global _table
+
+    table = _table
+    if refresh or table is None or time.time() - table["built_at"] > SCREENER_REFRESH_SECONDS:
+        with _table_lock:
+            # Another thread may have rebuilt it while we waited
+            if refresh or _table is None or time.time() - _table["built_at"] > SCREENER_REFRESH_SECONDS:
+                _table = build_table()
+            table = _table
+    return table
+
+
+# Rows of the table as dicts (NaN -> None, returns in percent)
+def _rows(table: Dict[str, np.ndarray], indices: np.ndarray) -> List[Dict]:
+    def value(column: str, i: int, scale: float = 1.0, digits: int = 4):
+        number = table[column][i]
+        return None if np.isnan(number) else round(float(number) * scale, digits)
+
+    return [
+        {
+            "symbol": str(table["symbol"][i]),
+            "name": str(table["name"][i]),
+            "category": str(table["category"][i]),
+            "risk_level": str(table["risk_level"][i]),
+            "expense_ratio_pct": value("expense_ratio", i, 100, 3),
+            "dividend_yield_pct": value("dividend_yield", i, 100, 2),
+            "ytd_return_pct": value("ytd_return", i, 100, 2),
+            "month_return_pct": value("month_return", i, 100, 2),
+            "volatility_pct": value("volatility", i, 100, 2),
+            "price": value("price", i, 1, 2),
+        }
+        for i in indices.tolist()
+    ]
+
+
+# Filter, sort and page the ETF universe
+def screen_etfs(
+    filters: Optional[Dict[str, float]] = None,
+    categories: Optional[List[str]] = None,
+    risk_levels: Optional[List[str]] = None,
+    sort_by: str = "expense_ratio",
+    descending: bool = False,
+    offset: int = 0,
+    limit: int = 20
+) -> Dict:
+    """
+    Args:
+        filters: {"min_<column>" / "max_<column>": value} over NUMERIC_COLUMNS,
+            as fractions (max_expense_ratio=0.001 is 0.10%); unknown values never match
+        categories: Keep ETFs whose category contains any of these (case-insensitive)
+        risk_levels: Keep these risk levels (low, medium, higher, very high)
+        sort_by: Column from SORT_COLUMNS (unknown values sort last)
+        descending: Largest first
+        offset, limit: Page of the sorted result
+
+    Returns:
+        Dict with total matches, the page of rows and timings
+    """
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError(f"sort_by must be one of {', '.join(SORT_COLUMNS)}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+
+    table = get_table()
+    started = time.perf_counter()
+    mask = np.ones(len(table["symbol"]), dtype=bool)
+
+    for key, bound in (filters or {}).items():
+        if bound is None:
+            continue
+        bound_type, _, column = key.partition("_")
+        if bound_type not in ("min", "max") or column not in NUMERIC_COLUMNS:
+            raise ValueError(f"Unknown filter: {key}")
+        # Comparisons with NaN are False, so unknown values drop out
+        mask &= table[column] >= bound if bound_type == "min" else table[column] <= bound
+
+    if categories:
+        matches = np.zeros_like(mask)
+        for category in categories:
+            matches |= np.char.find(table["category_lower"], category.lower()) >= 0
+        mask &= matches
+
+    if risk_levels:
+        ranks = [RISK_RANKS.get(level.lower()) for level in risk_levels]
+        if None in ranks:
+            raise ValueError(f"risk_levels must be from {', '.join(RISK_RANKS)}")
+        mask &= np.isin(table["risk_rank"], ranks)
+
+    indices = np.flatnonzero(mask)
+    if sort_by == "symbol":
+        order = np.argsort(table["symbol"][indices], kind="stable")
+        if descending:
+            order = order[::-1]
+    else:
+        # NaN last either way; symbol breaks ties
+        values = table[sort_by][indices]
+        keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+        order = np.lexsort((table["symbol"][indices], keys))
+    page = indices[order][offset:offset + limit]
+    filter_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "total": int(len(indices)),
+        "offset": offset,
+        "limit": limit,
+        "sort_by": sort_by,
+        "descending": descending,
+        "etfs": _rows(table, page),
+        "filter_ms": round(filter_ms, 4),
+        "table_built_at": datetime.fromtimestamp(table["built_at"]).isoformat(timespec="seconds"),
+        "universe_size": int(len(table["symbol"])),
+    }
+
+
+# Side-by-side rows for a few symbols, in the order given
+def compare_etfs(symbols: List[str]) -> List[Dict]:
+    table = get_table()
+    positions = {symbol: i for i, symbol in enumerate(table["symbol"].tolist())}
+    symbols = [s.strip().upper() for s in symbols if s.strip()]
+    unknown = [s for s in symbols if s not in positions]
+    if unknown:
+        raise ValueError(f"Unknown ETF: {', '.join(unknown)}")
+    if not 2 <= len(symbols) <= 10:
+        raise ValueError("Compare between 2 and 10 ETFs")
+    return _rows(table, np.array([positions[s] for s in symbols]))
+
+
+if __name__ == "__main__":
+    import json
+
+    result = screen_etfs({"max_expense_ratio": 0.001}, sort_by="expense_ratio", limit=10)
+    print(f"🔎 {result['total']} ETFs with fees <= 0.10% ({result['filter_ms']:.3f} ms)")
+    print(json.dumps(result["etfs"], indent=2))
@@ -1,9 +1,13 @@
 import os
+import time
 import requests
 import yfinance as yf
 from typing import Optional, Dict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import shared_cache
+from fx import format_amount
+from telemetry import CACHE_ENTRIES, PROVIDER_FALLBACKS, record_cache, record_provider_call
 
 load_dotenv()
 
@@ -14,6 +18,7 @@ ALPHA_VANTAGE_BASE_URL = "https://www.alphavantage.co/query"
 # Price cache to reduce API calls
 price_cache = {}
 CACHE_DURATION_MINUTES = 15
+CACHE_ENTRIES.track(lambda: len(price_cache), cache="price_cache")
 
 # Popular ETFs for investment recommendations
 POPULAR_ETFS = {
@@ -29,6 +34,8 @@ POPULAR_ETFS = {
 
 # Get stock/ETF price using Alpha Vantage
 def get_price_alpha_vantage(symbol: str) -> Optional[Dict]:
+    started = time.perf_counter()
+    outcome, error = "empty", None
     try:
         params = {
             "function": "GLOBAL_QUOTE",
@@ -41,6 +48,7 @@ def get_price_alpha_vantage(symbol: str) -> Optional[Dict]:
 
         if "Global Quote" in data and data["Global Quote"]:
             quote = data["Global Quote"]
+            outcome = "ok"
             return {
                 "symbol": symbol,
                 "price": float(quote.get("05. price", 0)),
@@ -53,15 +61,21 @@ def get_price_alpha_vantage(symbol: str) -> Optional[Dict]:
 
         # Check if we hit rate limit
         if "Note" in data or "Information" in data:
+            outcome = "rate_limited"
             print(f"Alpha Vantage rate limit hit or error: {data}")
             return None
 
     except Exception as e:
+        outcome, error = "error", e
         print(f"Alpha Vantage error for {symbol}: {str(e)}")
         return None
+    finally:
+        record_provider_call("alpha_vantage", outcome, time.perf_counter() - started, error)
 
 # Get stock/ETF price using yfinance (fallback)
 def get_price_yfinance(symbol: str) -> Optional[Dict]:
+    started = time.perf_counter()
+    outcome, error = "empty", None
     try:
         ticker = yf.Ticker(symbol)
         info = ticker.info
@@ -73,6 +87,7 @@ def get_price_yfinance(symbol: str) -> Optional[Dict]:
             change = current_price - previous_close
             change_percent = (change / previous_close) * 100 if previous_close else 0
 
+            outcome = "ok"
             return {
                 "symbol": symbol,
                 "price": round(float(current_price), 2),
@@ -84,8 +99,11 @@ def get_price_yfinance(symbol: str) -> Optional[Dict]:
             }
 
     except Exception as e:
+        outcome, error = "error", e
         print(f"yfinance error for {symbol}: {str(e)}")
         return None
+    finally:
+        record_provider_call("yfinance", outcome, time.perf_counter() - started, error)
 
 # Main function to get stock price with caching and fallback
 def get_stock_price(symbol: str, use_cache: bool = True) -> Optional[Dict]:
@@ -95,8 +113,18 @@ def get_stock_price(symbol: str, use_cache: bool = True) -> Optional[Dict]:
         cache_time = datetime.fromisoformat(cached_data["timestamp"])
         if datetime.now() - cache_time < timedelta(minutes=CACHE_DURATION_MINUTES):
             print(f"Using cached price for {symbol}")
+            record_cache("price_cache", "hit")
             return cached_data
 
+    # Another worker on this host may already have fetched it
+    if use_cache:
+        shared_data = shared_cache.get("quotes", symbol, CACHE_DURATION_MINUTES * 60)
+        if shared_data:
+            price_cache[symbol] = shared_data
+            record_cache("price_cache", "shared_hit")
+            return shared_data
+        record_cache("price_cache", "expired" if symbol in price_cache else "miss")
+
     # Try Alpha Vantage first
     print(f"Fetching {symbol} from Alpha Vantage...")
     price_data = get_price_alpha_vantage(symbol)
@@ -105,10 +133,13 @@ def get_stock_price(symbol: str, use_cache: bool = True) -> Optional[Dict]:
     if not price_data:
         print(f"Falling back to yfinance for {symbol}...")
         price_data = get_price_yfinance(symbol)
+        if price_data:
+            PROVIDER_FALLBACKS.inc(from_provider="alpha_vantage", to_provider="yfinance")
 
     # Cache the result
     if price_data:
         price_cache[symbol] = price_data
+        shared_cache.set("quotes", symbol, price_data)
         return price_data
 
     print(f"Failed to fetch price for {symbol} from all sources")
@@ -140,14 +171,9 @@ def get_recommended_etfs() -> Dict[str, Dict]:
 
     return etf_data
 
-# Format price for display
-def format_price(price: float, currency: str = "USD") -> str:
-    if currency == "USD":
-        return f"${price:,.2f}"
-    elif currency == "AZN":
-        return f"{price:,.2f} AZN"
-    else:
-        return f"{price:,.2f}"
+# Format price for display (converting from another currency if given)
+def format_price(price: float, currency: str = "USD", from_currency: Optional[str] = None) -> str:
+    return format_amount(price, currency, from_currency)
 
 # Clear price cache
 def clear_cache():
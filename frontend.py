@@ -1,9 +1,120 @@
 import streamlit as st
 import requests
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 BACKEND_URL = "http://localhost:8000"
 
+# How long sidebar data is reused before asking the backend again
+ETF_PRICES_TTL_SECONDS = 60
+HEALTH_TTL_SECONDS = 10
+GOAL_PLAN_TTL_SECONDS = 300
+
+# How often the ETF panel redraws itself (it only reads memory)
+ETF_PANEL_REFRESH_SECONDS = 5
+
+
+# One pooled HTTP session for every rerun and user (keep-alive connections)
+@st.cache_resource
+def get_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Value refreshed in a background thread; readers never wait for it
+class BackgroundValue:
+    def __init__(self, fetch, ttl_seconds: float):
+        self.fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self.value = None
+        self.updated_at = 0.0
+        self.error = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _refresh(self):
+        try:
+            value = self.fetch()
+            with self._lock:
+                self.value, self.updated_at, self.error = value, time.time(), None
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+
+    # Latest value (None until the first fetch finishes); starts a refresh when stale
+    def get(self):
+        with self._lock:
+            stale = time.time() - self.updated_at > self.ttl_seconds
+            if stale and (self._pending is None or self._pending.done()):
+                self._pending = self._executor.submit(self._refresh)
+            return self.value
+
+
+def _fetch_recommended_etfs():
+    response = get_session().get(f"{BACKEND_URL}/etfs/recommended", timeout=5)
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+# ETF prices shared by every session, refreshed at most once per TTL
+@st.cache_resource
+def get_etf_prices() -> BackgroundValue:
+    return BackgroundValue(_fetch_recommended_etfs, ETF_PRICES_TTL_SECONDS)
+
+
+# Backend health, reused for a few seconds
+@st.cache_data(ttl=HEALTH_TTL_SECONDS, show_spinner=False)
+def fetch_health() -> bool:
+    try:
+        return get_session().get(f"{BACKEND_URL}/health", timeout=2).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+
+# Goal plan per slider position (errors raise, so they are not cached)
+@st.cache_data(ttl=GOAL_PLAN_TTL_SECONDS, show_spinner=False)
+def fetch_goal_plan(goal_amount: int, years: int, confidence: float, goal: str) -> dict:
+    response = get_session().get(
+        f"{BACKEND_URL}/investment/goal-plan",
+        params={
+            "goal_amount": goal_amount,
+            "solve_for": "contribution",
+            "years": years,
+            "confidence": confidence,
+            "goal": goal
+        },
+        timeout=5
+    )
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+# Popular ETFs panel: redraws from memory, never blocks the chat
+@st.fragment(run_every=ETF_PANEL_REFRESH_SECONDS)
+def etf_panel():
+    prices = get_etf_prices()
+    etfs = prices.get()
+    if etfs is None:
+        st.info("ETF prices unavailable" if prices.error else "Loading ETF prices...")
+        return
+
+    for symbol, data in etfs.items():
+        st.markdown(f"**{symbol}**")
+        st.caption(data['name'])
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            st.metric(label="Price", value=f"${data['price']:.2f}")
+        with col2:
+            st.metric(label="Change", value=data['change_percent'])
+        st.markdown("---")
+
 # Page config
 st.set_page_config(
     page_title="InvestBuddy - Your Investment Assistant",
@@ -294,39 +405,41 @@ else:
 
         st.markdown("---")
 
-        # Live ETF Prices
-        st.header("📊 Popular ETFs")
+        # Goal Planner (the backend caches answers per slider position)
+        st.header("🎯 Goal Planner")
+        goal_amount = st.slider("Goal amount (AZN)", min_value=1000, max_value=200000, value=30000, step=1000)
+        goal_years = st.slider("Years to reach it", min_value=1, max_value=40, value=5)
+        goal_confidence = st.select_slider(
+            "How sure do you want to be?",
+            options=[0.5, 0.75, 0.9],
+            value=0.75,
+            format_func=lambda c: f"{c:.0%}"
+        )
 
         try:
-            etfs_response = requests.get(f"{BACKEND_URL}/etfs/recommended", timeout=5)
-            if etfs_response.status_code == 200:
-                etfs = etfs_response.json()["data"]
-                for symbol, data in etfs.items():
-                    st.markdown(f"**{symbol}**")
-                    st.caption(data['name'])
-                    col1, col2 = st.columns([1, 1])
-                    with col1:
-                        st.metric(label="Price", value=f"${data['price']:.2f}")
-                    with col2:
-                        st.metric(label="Change", value=data['change_percent'])
-                    st.markdown("---")
-            else:
-                st.info("ETF prices unavailable")
+            plan = fetch_goal_plan(goal_amount, goal_years, goal_confidence, profile["primary_goal"])
+            st.metric("Needed per month", f"{plan['answer']['monthly_contribution']:,.0f} AZN")
+            st.caption(
+                f"{goal_confidence:.0%} chance of reaching {goal_amount:,} AZN in {goal_years} years "
+                f"({plan['expected_case']['monthly_contribution']:,.0f} AZN/month at the average return)"
+            )
         except Exception as e:
-            st.info("Loading ETF prices...")
+            st.info("Goal planner unavailable")
+
+        st.markdown("---")
+
+        # Live ETF Prices (loaded in the background)
+        st.header("📊 Popular ETFs")
+        etf_panel()
 
         st.markdown("---")
 
         # System Status
         st.header("⚙️ System Status")
 
-        try:
-            health = requests.get(f"{BACKEND_URL}/health", timeout=2)
-            if health.status_code == 200:
-                st.success("✅ Connected")
-            else:
-                st.error("❌ Error")
-        except:
+        if fetch_health():
+            st.success("✅ Connected")
+        else:
             st.error("❌ Offline")
 
         st.markdown("---")
@@ -351,7 +464,7 @@ else:
             with st.chat_message("assistant"):
                 with st.spinner("💭 Analyzing your situation..."):
                     try:
-                        response = requests.post(
+                        response = get_session().post(
                             f"{BACKEND_URL}/chat",
                             json={
                                 "messages": st.session_state.messages,
@@ -392,7 +505,7 @@ else:
         with st.chat_message("assistant"):
             with st.spinner("💭 Analyzing your situation..."):
                 try:
-                    response = requests.post(
+                    response = get_session().post(
                         f"{BACKEND_URL}/chat",
                         json={
                             "messages": st.session_state.messages,
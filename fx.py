@@ -0,0 +1,265 @@
+"""
+Currency Conversion
+Cached FX rates from a pluggable provider, plus historical rates for backtests
+
+Rates are kept as one USD-based table (units of each currency per 1 USD), so
+any conversion is a single division and a whole portfolio converts with one
+array operation. Providers:
+
+    yahoo    - live rates from Yahoo Finance (USD<XXX>=X), falls back to the fixture
+    fixture  - offline rates from FX_FIXTURE_PATH (JSON) or the built-in table
+
+Select one with FX_PROVIDER. Historical rates reuse the price_history bar
+cache, so backtests read FX the same way they read ETF prices: request paths
+only read the local store, which warm_fx_history fills at startup.
+"""
+
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+import shared_cache
+from telemetry import record_cache, record_provider_call
+
+# Provider selection and cache lifetime
+FX_PROVIDER = os.getenv("FX_PROVIDER", "yahoo")
+FX_FIXTURE_PATH = os.getenv("FX_FIXTURE_PATH")
+FX_CACHE_MINUTES = 60
+
+# Offline fallback: units of currency per 1 USD (AZN is pegged at 1.70)
+DEFAULT_USD_RATES = {
+    "USD": 1.0,
+    "AZN": 1.70,
+    "EUR": 0.92,
+    "GBP": 0.79,
+    "TRY": 34.0,
+    "RUB": 90.0,
+    "GEL": 2.70,
+    "KZT": 480.0,
+}
+
+# Currencies that get a symbol prefix instead of a code suffix
+CURRENCY_SYMBOLS = {
+    "USD": "$",
+    "EUR": "€",
+    "GBP": "£",
+}
+
+# In-memory rate table: {"rates": {currency: per USD}, "source", "fetched_at"}
+_rates_cache: Dict = {}
+
+
+class FXProvider(ABC):
+    """Source of USD-based exchange rates"""
+
+    name = "base"
+
+    # Units of each currency per 1 USD
+    @abstractmethod
+    def get_usd_rates(self) -> Dict[str, float]:
+        raise NotImplementedError
+
+    # Month-end USD->currency rates as {"months", "rates"} arrays
+    @abstractmethod
+    def get_monthly_history(self, currency: str, allow_download: bool = False) -> Optional[Dict[str, np.ndarray]]:
+        raise NotImplementedError
+
+
+class FixtureProvider(FXProvider):
+    """Static rates for offline use and tests"""
+
+    name = "fixture"
+
+    def __init__(self, path: Optional[str] = FX_FIXTURE_PATH):
+        rates = dict(DEFAULT_USD_RATES)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                rates.update({code.upper(): float(rate) for code, rate in json.load(f).items()})
+        self.rates = rates
+
+    def get_usd_rates(self) -> Dict[str, float]:
+        return dict(self.rates)
+
+    def get_monthly_history(self, currency: str, allow_download: bool = False) -> Optional[Dict[str, np.ndarray]]:
+        # A fixed rate has no history - backtests report returns unconverted
+        return None
+
+
+class YahooFXProvider(FXProvider):
+    """Live rates from Yahoo Finance currency pairs"""
+
+    name = "yahoo"
+
+    def __init__(self, currencies=None):
+        self.currencies = [c for c in (currencies or DEFAULT_USD_RATES) if c != "USD"]
+
+    def get_usd_rates(self) -> Dict[str, float]:
+        import yfinance as yf
+
+        tickers = [f"USD{currency}=X" for currency in self.currencies]
+        history = yf.download(tickers, period="5d", progress=False, auto_adjust=True)["Close"]
+
+        rates = {"USD": 1.0}
+        for currency, ticker in zip(self.currencies, tickers):
+            if ticker in history:
+                series = history[ticker].dropna()
+                if not series.empty:
+                    rates[currency] = float(series.iloc[-1])
+        return rates
+
+    def get_monthly_history(self, currency: str, allow_download: bool = False) -> Optional[Dict[str, np.ndarray]]:
+        from price_history import get_monthly_closes
+
+        # Request paths read the local bar store; warm_fx_history downloads
+        monthly = get_monthly_closes([f"USD{currency}=X"], allow_download=allow_download)
+        if monthly is None:
+            print(f"No FX history for USD/{currency} - backtests stay in USD")
+            return None
+        return {"months": monthly["months"], "rates": monthly["closes"][:, 0]}
+
+
+# Provider for FX_PROVIDER
+def get_provider(name: str = FX_PROVIDER) -> FXProvider:
+    if name == "fixture":
+        return FixtureProvider()
+    if name == "yahoo":
+        return YahooFXProvider()
+    raise ValueError(f"Unknown FX provider: {name}")
+
+
+# Current USD-based rate table (memory -> shared cache -> provider -> fixture)
+def get_usd_rates(use_cache: bool = True) -> Dict:
+    """
+    Returns:
+        Dict with "rates" ({currency: units per 1 USD}), "source" and "fetched_at"
+    """
+    global _rates_cache
+
+    max_age = FX_CACHE_MINUTES * 60
+    if use_cache and _rates_cache and time.time() - _rates_cache["fetched_at"] < max_age:
+        record_cache("fx_rates", "hit")
+        return _rates_cache
+
+    if use_cache:
+        shared_data = shared_cache.get("fx", "usd_rates", max_age)
+        if shared_data:
+            _rates_cache = shared_data
+            record_cache("fx_rates", "shared_hit")
+            return shared_data
+        record_cache("fx_rates", "expired" if _rates_cache else "miss")
+
+    provider = get_provider()
+    started = time.perf_counter()
+    try:
+        rates = provider.get_usd_rates()
+        source = provider.name
+        record_provider_call(f"fx_{provider.name}", "ok", time.perf_counter() - started)
+    except Exception as e:
+        record_provider_call(f"fx_{provider.name}", "error", time.perf_counter() - started, e)
+        print(f"FX provider '{provider.name}' error: {e}")
+        rates, source = {}, None
+
+    # Fill anything the provider didn't return from the fixture
+    fixture = FixtureProvider()
+    missing = [code for code in fixture.rates if code not in rates]
+    if missing:
+        rates = {**fixture.get_usd_rates(), **rates}
+        source = f"{source} + fixture" if source else "fixture"
+
+    _rates_cache = {"rates": rates, "source": source, "fetched_at": time.time()}
+    shared_cache.set("fx", "usd_rates", _rates_cache)
+    return _rates_cache
+
+
+# How many units of to_currency one unit of from_currency buys
+def get_rate(from_currency: str, to_currency: str) -> float:
+    from_currency, to_currency = from_currency.upper(), to_currency.upper()
+    if from_currency == to_currency:
+        return 1.0
+
+    rates = get_usd_rates()["rates"]
+    if from_currency not in rates or to_currency not in rates:
+        raise ValueError(f"No FX rate for {from_currency}/{to_currency}")
+    return rates[to_currency] / rates[from_currency]
+
+
+# Convert a scalar or a whole array of amounts with one rate lookup
+def convert(amounts: Union[float, np.ndarray], from_currency: str, to_currency: str) -> Union[float, np.ndarray]:
+    rate = get_rate(from_currency, to_currency)
+    if isinstance(amounts, np.ndarray):
+        return amounts * rate
+    return float(amounts) * rate
+
+
+# Amounts in several currencies at once: {currency: converted array}
+def convert_many(amounts: np.ndarray, from_currency: str, to_currencies) -> Dict[str, np.ndarray]:
+    rates = get_usd_rates()["rates"]
+    base = rates[from_currency.upper()]
+    amounts = np.asarray(amounts, dtype=np.float64)
+    return {
+        currency: amounts * (rates[currency.upper()] / base) for currency in to_currencies
+    }
+
+
+# Month-end FX history for every supported currency (startup warm-up / offline jobs)
+def warm_fx_history() -> Dict[str, bool]:
+    """
+    Returns:
+        {currency: True if history is now in the local bar store}
+    """
+    provider = get_provider()
+    return {
+        currency: provider.get_monthly_history(currency, allow_download=True) is not None
+        for currency in DEFAULT_USD_RATES if currency != "USD"
+    }
+
+
+# Monthly FX returns (USD -> currency) aligned to the given months
+def get_monthly_fx_returns(currency: str, months: np.ndarray,
+                           allow_download: bool = False) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Change in the currency's value of 1 USD over each month, for turning
+    USD asset returns into local-currency returns in backtests
+
+    Args:
+        currency: Local currency
+        months: datetime64[M] months of the return series
+        allow_download: Download missing history (offline jobs only)
+
+    Returns:
+        Dict with "returns" (one simple return per month, NaN where not
+        covered) and "covered" (bool per month), or None when there is no
+        FX history (fixed-rate provider or not downloaded yet)
+    """
+    currency = currency.upper()
+    if currency == "USD":
+        return {"returns": np.zeros(len(months)), "covered": np.ones(len(months), dtype=bool)}
+
+    history = get_provider().get_monthly_history(currency, allow_download)
+    if history is None:
+        return None
+
+    # Each month needs its own rate and the previous month's
+    positions = np.searchsorted(history["months"], months)
+    covered = (positions > 0) & (positions < len(history["months"]))
+    covered[covered] = history["months"][positions[covered]] == months[covered]
+
+    rates = history["rates"]
+    returns = np.full(len(months), np.nan)
+    returns[covered] = rates[positions[covered]] / rates[positions[covered] - 1] - 1.0
+    return {"returns": returns, "covered": covered}
+
+
+# Format an amount, optionally converting it first
+def format_amount(amount: float, currency: str = "USD", from_currency: Optional[str] = None) -> str:
+    currency = currency.upper()
+    if from_currency and from_currency.upper() != currency:
+        amount = convert(amount, from_currency, currency)
+
+    if currency in CURRENCY_SYMBOLS:
+        return f"{CURRENCY_SYMBOLS[currency]}{amount:,.2f}"
+    return f"{amount:,.2f} {currency}"
@@ -0,0 +1,352 @@
+"""
+Goal Planner
+Inverse projections: the monthly contribution a goal needs, the time it
+takes, or the chance of reaching it
+
+    contribution - "How much per month for 30k AZN in 5 years?"
+    time         - "How long until 30k AZN at 300 AZN a month?"
+    probability  - "What are my odds of 30k AZN in 5 years at 300 a month?"
+
+Answers come from the Monte Carlo engine, simulated once per return
+assumption with a unit contribution. Each path's value is linear in the
+inputs (contribution * F + initial * G), so a root finder can try many
+contributions or horizons against the same paths: bisection on the
+contribution, and on the month for time-to-goal. A deterministic annuity
+answer at the expected return is reported alongside.
+
+Inputs are snapped to buckets (3 significant digits, whole years, 5%
+confidence steps) and answers are cached per bucket, in memory and in the
+shared cache, so frontend sliders get an instant reply.
+"""
+
+import json
+import math
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import shared_cache
+from allocation_tables import MAX_HORIZON_YEARS, lookup_allocation
+from investment_logic import RISK_PROFILES, determine_risk_profile, get_profile_weights
+from monte_carlo import FALLBACK_SOURCE, estimate_parameters, simulate_paths
+from telemetry import CACHE_ENTRIES, record_cache
+
+# Simulation size for the planner (common random numbers: fixed seed)
+PLANNER_PATHS = 5000
+PLANNER_SEED = 7
+
+# Bisection steps and stopping width (currency units) for contributions
+BISECTION_STEPS = 60
+CONTRIBUTION_TOLERANCE = 0.01
+
+# Answer cache
+GOAL_CACHE_SIZE = 4096
+GOAL_CACHE_HOURS = 24
+
+SOLVE_MODES = ("contribution", "time", "probability")
+
+_answer_cache: "OrderedDict[str, Dict]" = OrderedDict()
+CACHE_ENTRIES.track(lambda: len(_answer_cache), cache="goal_plans")
+
+
+# Round an amount to the slider bucket (3 significant digits)
+def _bucket_amount(amount: Optional[float]) -> Optional[float]:
+    if amount is None:
+        return None
+    return float(f"{float(amount):.3g}")
+
+
+# Unit-contribution (F) and unit-initial (G) values: (paths x months), float32.
+# Only time-to-goal needs every month (~24 MB per entry at 50 years), so few are kept.
+@lru_cache(maxsize=2)
+def _unit_paths(monthly_mu: float, monthly_sigma: float, months: int) -> Tuple[np.ndarray, np.ndarray]:
+    contribution = simulate_paths(1.0, months, monthly_mu, monthly_sigma,
+                                  n_paths=PLANNER_PATHS, seed=PLANNER_SEED)
+    initial = simulate_paths(0.0, months, monthly_mu, monthly_sigma,
+                             n_paths=PLANNER_PATHS, initial_amount=1.0, seed=PLANNER_SEED)
+    return contribution, initial
+
+
+# F and G at the final month only: (paths,) float32 each, ~40 KB per entry
+@lru_cache(maxsize=256)
+def _unit_terminal(monthly_mu: float, monthly_sigma: float, months: int) -> Tuple[np.ndarray, np.ndarray]:
+    final_month = np.array([months])
+    contribution = simulate_paths(1.0, months, monthly_mu, monthly_sigma, n_paths=PLANNER_PATHS,
+                                  seed=PLANNER_SEED, snapshot_months=final_month)
+    initial = simulate_paths(0.0, months, monthly_mu, monthly_sigma, n_paths=PLANNER_PATHS,
+                             initial_amount=1.0, seed=PLANNER_SEED, snapshot_months=final_month)
+    return contribution[:, 0], initial[:, 0]
+
+
+# Contribution that reaches the goal with the given confidence at month t
+def solve_contribution(unit: np.ndarray, growth: np.ndarray, goal_amount: float,
+                       initial_amount: float, confidence: float) -> float:
+    """
+    Bisection on c for quantile(c * F + I * G, 1 - confidence) = goal
+
+    Args:
+        unit: (paths,) value of 1 contributed every month
+        growth: (paths,) value of 1 invested at the start
+        goal_amount: Target value
+        initial_amount: Amount already invested
+        confidence: Required probability of reaching the goal
+
+    Returns:
+        Monthly contribution (0 when the initial amount already suffices)
+    """
+    level = 1.0 - confidence
+    if np.quantile(initial_amount * growth, level) >= goal_amount:
+        return 0.0
+
+    # Paths only gain from the initial amount, so this upper bound already reaches the goal
+    low, high = 0.0, goal_amount / max(float(np.quantile(unit, level)), 1e-12)
+    if initial_amount <= 0:
+        return high
+
+    for _ in range(BISECTION_STEPS):
+        if high - low < CONTRIBUTION_TOLERANCE:
+            break
+        middle = (low + high) / 2
+        if np.quantile(middle * unit + initial_amount * growth, level) >= goal_amount:
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+# First month the goal is reached with the given confidence
+def solve_months(unit: np.ndarray, growth: np.ndarray, goal_amount: float,
+                 monthly_contribution: float, initial_amount: float, confidence: float) -> Optional[int]:
+    """
+    Bisection over months (the quantile path grows with every contribution)
+
+    Args:
+        unit, growth: (paths x months) unit-contribution and unit-initial values
+
+    Returns:
+        1-based month, or None if not reached within the simulated horizon
+    """
+    level = 1.0 - confidence
+
+    def reached(month: int) -> bool:
+        column = month - 1
+        values = (monthly_contribution * unit[:, column].astype(np.float64)
+                  + initial_amount * growth[:, column].astype(np.float64))
+        return bool(np.quantile(values, level) >= goal_amount)
+
+    low, high = 1, unit.shape[1]
+    if not reached(high):
+        return None
+    while low < high:
+        middle = (low + high) // 2
+        if reached(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+# Deterministic annuity at the expected return (contributions at month start)
+def _annuity_factors(annual_return: float, months: float) -> Tuple[float, float]:
+    """
+    Returns:
+        (value of 1 contributed monthly, value of 1 invested at the start)
+    """
+    r = (1.0 + annual_return) ** (1 / 12) - 1.0
+    growth = (1.0 + r) ** months
+    if abs(r) < 1e-12:
+        return float(months), 1.0
+    return (1.0 + r) * (growth - 1.0) / r, growth
+
+
+# Expected-return answer for each mode
+def _expected_case(solve_for: str, annual_return: float, goal_amount: float, years: Optional[int],
+                   monthly_contribution: Optional[float], initial_amount: float) -> Dict:
+    if solve_for == "time":
+        r = (1.0 + annual_return) ** (1 / 12) - 1.0
+        if monthly_contribution <= 0 and initial_amount <= 0:
+            return {"months": None}
+        if abs(r) < 1e-12:
+            months = max(goal_amount - initial_amount, 0.0) / monthly_contribution if monthly_contribution > 0 else None
+        else:
+            # FV(T) = (I + A) (1+r)^T - A with A = c (1+r) / r
+            a = monthly_contribution * (1.0 + r) / r
+            ratio = (goal_amount + a) / (initial_amount + a)
+            months = math.log(ratio) / math.log1p(r) if ratio > 0 else None
+        if months is None:
+            return {"months": None}
+        months = max(math.ceil(months - 1e-9), 0)
+        return {"months": months, "years": round(months / 12, 1)}
+
+    unit, growth = _annuity_factors(annual_return, years * 12)
+    if solve_for == "contribution":
+        needed = max(goal_amount - initial_amount * growth, 0.0) / unit
+        return {"monthly_contribution": round(needed, 2)}
+    return {"final_value": round(monthly_contribution * unit + initial_amount * growth, 2)}
+
+
+# Solve one bucketed plan (no caching)
+def _solve(solve_for: str, goal_amount: float, years: Optional[int], monthly_contribution: Optional[float],
+           initial_amount: float, confidence: float, risk_profile: str, goal: str) -> Dict:
+    if years and lookup_allocation(years, risk_profile, goal):
+        weights = lookup_allocation(years, risk_profile, goal)["weights"]
+    else:
+        weights = get_profile_weights(risk_profile)
+    params = estimate_parameters(weights, risk_profile)
+
+    months = years * 12 if solve_for != "time" else MAX_HORIZON_YEARS * 12
+    mu, sigma = round(params["monthly_mu"], 8), round(params["monthly_sigma"], 8)
+    if solve_for != "time":
+        # Terminal values only, in float64 for the bisection
+        unit, growth = (values.astype(np.float64) for values in _unit_terminal(mu, sigma, months))
+
+    if solve_for == "contribution":
+        needed = solve_contribution(unit, growth, goal_amount, initial_amount, confidence)
+        final = needed * unit + initial_amount * growth
+        answer = {
+            "monthly_contribution": round(needed, 2),
+            "probability_of_goal": round(float((final >= goal_amount).mean()), 4),
+            "total_invested": round(initial_amount + needed * months, 2),
+        }
+    elif solve_for == "time":
+        unit, growth = _unit_paths(mu, sigma, months)
+        month = solve_months(unit, growth, goal_amount, monthly_contribution, initial_amount, confidence)
+        answer = {
+            "months": month,
+            "years": round(month / 12, 1) if month else None,
+            "reachable": month is not None,
+            "max_years": MAX_HORIZON_YEARS,
+        }
+    else:
+        final = monthly_contribution * unit + initial_amount * growth
+        p10, p50, p90 = np.quantile(final, [0.10, 0.50, 0.90])
+        answer = {
+            "probability_of_goal": round(float((final >= goal_amount).mean()), 4),
+            "final": {"p10": round(float(p10), 2), "p50": round(float(p50), 2), "p90": round(float(p90), 2)},
+            "total_invested": round(initial_amount + monthly_contribution * months, 2),
+        }
+
+    return {
+        "solve_for": solve_for,
+        "inputs": {
+            "goal_amount": goal_amount,
+            "years": years,
+            "monthly_contribution": monthly_contribution,
+            "initial_amount": initial_amount,
+            "confidence": confidence,
+        },
+        "risk_profile": risk_profile,
+        "weights": weights,
+        "annual_return": round(params["annual_return"], 4),
+        "annual_volatility": round(params["annual_volatility"], 4),
+        "parameter_source": params["source"],
+        "answer": answer,
+        "expected_case": _expected_case(solve_for, params["annual_return"], goal_amount, years,
+                                        monthly_contribution, initial_amount),
+        "n_paths": PLANNER_PATHS,
+    }
+
+
+# Goal plan: required contribution, time to goal or success probability
+def plan_goal(
+    goal_amount: float,
+    solve_for: str = "contribution",
+    years: Optional[int] = None,
+    monthly_contribution: Optional[float] = None,
+    initial_amount: float = 0.0,
+    confidence: float = 0.5,
+    risk_profile: Optional[str] = None,
+    goal: str = "general"
+) -> Dict:
+    """
+    Args:
+        goal_amount: Target value (any currency - projections are unit-free)
+        solve_for: "contribution", "time" or "probability"
+        years: Horizon (needed for contribution and probability)
+        monthly_contribution: Amount per month (needed for time and probability)
+        initial_amount: Amount already invested
+        confidence: Required chance of reaching the goal (0.5 = median outcome;
+            ignored when solving for the probability)
+        risk_profile: Default: from the horizon (moderate for time-to-goal)
+        goal: Goal text, picks the goal-specific allocation when tables exist
+
+    Returns:
+        Dict with the bucketed inputs, the answer, the expected-return
+        (annuity) answer and whether it came from the cache
+    """
+    if solve_for not in SOLVE_MODES:
+        raise ValueError(f"solve_for must be one of: {', '.join(SOLVE_MODES)}")
+    if goal_amount is None or goal_amount <= 0:
+        raise ValueError("goal_amount must be positive")
+    if solve_for in ("contribution", "probability"):
+        if not years or not 1 <= int(years) <= MAX_HORIZON_YEARS:
+            raise ValueError(f"years must be between 1 and {MAX_HORIZON_YEARS}")
+        years = int(years)
+    else:
+        years = None
+    if solve_for in ("time", "probability"):
+        if monthly_contribution is None or monthly_contribution < 0:
+            raise ValueError("monthly_contribution must be zero or positive")
+    else:
+        monthly_contribution = None
+    if initial_amount < 0:
+        raise ValueError("initial_amount must not be negative")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    if risk_profile is None:
+        risk_profile = determine_risk_profile(years) if years else "moderate"
+    if risk_profile not in RISK_PROFILES:
+        raise ValueError(f"Unknown risk profile: {risk_profile}")
+
+    # Snap to buckets so nearby slider positions share one answer
+    goal_amount = _bucket_amount(goal_amount)
+    monthly_contribution = _bucket_amount(monthly_contribution)
+    initial_amount = _bucket_amount(initial_amount)
+    confidence = min(max(round(confidence * 20) / 20, 0.05), 0.95)
+    if solve_for == "probability":
+        # The probability is the answer here - keep it out of the inputs and the cache key
+        confidence = None
+
+    key = json.dumps([solve_for, goal_amount, years, monthly_contribution, initial_amount,
+                      confidence, risk_profile, goal.strip().lower()])
+
+    if key in _answer_cache:
+        _answer_cache.move_to_end(key)
+        record_cache("goal_plans", "hit")
+        return {**_answer_cache[key], "cached": True}
+
+    result = shared_cache.get("goal_plans", key, GOAL_CACHE_HOURS * 3600)
+    cached = result is not None
+    record_cache("goal_plans", "shared_hit" if cached else "miss")
+    if not cached:
+        result = _solve(solve_for, goal_amount, years, monthly_contribution,
+                        initial_amount, confidence, risk_profile, goal)
+        if result["parameter_source"] == FALLBACK_SOURCE:
+            # Bars not on disk yet: don't keep an answer the real history will replace
+            return {**result, "cached": False}
+        shared_cache.set("goal_plans", key, result)
+
+    _answer_cache[key] = result
+    if len(_answer_cache) > GOAL_CACHE_SIZE:
+        _answer_cache.popitem(last=False)
+    return {**result, "cached": cached}
+
+
+if __name__ == "__main__":
+    for kwargs in [
+        {"goal_amount": 30000, "solve_for": "contribution", "years": 5, "goal": "house"},
+        {"goal_amount": 30000, "solve_for": "contribution", "years": 5, "goal": "house", "confidence": 0.9},
+        {"goal_amount": 30000, "solve_for": "time", "monthly_contribution": 300},
+        {"goal_amount": 30000, "solve_for": "probability", "years": 5, "monthly_contribution": 450},
+    ]:
+        started = time.perf_counter()
+        plan = plan_goal(**kwargs)
+        cold = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        plan_goal(**kwargs)
+        warm = (time.perf_counter() - started) * 1000
+        print(f"🎯 {kwargs}")
+        print(f"   answer {plan['answer']}  expected {plan['expected_case']}  ({cold:.1f} ms, cached {warm:.3f} ms)")
@@ -0,0 +1,38 @@
+# Gunicorn config for InvestBuddy multi-worker deployments
+#
+#   gunicorn backend:app -c gunicorn.conf.py
+#
+# The app (including the sentence-transformers model and torch runtime) is
+# loaded once in the master process and then forked, so workers share those
+# pages copy-on-write instead of each loading its own copy. The embedding
+# matrix is memory-mapped and quote caches are shared through a local file.
+import gc
+import os
+
+# Must be set before the app is imported (preload_app imports it right after this file)
+os.environ.setdefault("INVESTBUDDY_PRELOAD_MODELS", "1")
+os.environ.setdefault("VECTOR_STORE_MMAP", "1")
+os.environ.setdefault(
+    "SHARED_CACHE_PATH",
+    "/dev/shm/investbuddy_cache.db" if os.path.isdir("/dev/shm") else "/tmp/investbuddy_cache.db"
+)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+# torch threads per worker - N workers x all cores would oversubscribe the CPU
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "1"))
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach so collections in
+    # the workers don't touch (and un-share) the parent's pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+    torch.set_num_threads(TORCH_THREADS_PER_WORKER)
@@ -1,10 +1,13 @@
 # Investment Logic Module for InvestBuddy
-from typing import Dict, Tuple
-from financial_api import get_stock_price
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from financial_api import get_stock_price, format_price
+from fx import get_rate, convert_many
+from etf_knowledge import ETF_KNOWLEDGE_BASE
+from allocation_tables import lookup_allocation, lookup_projection
 
-# Exchange rate (approximate)
-AZN_TO_USD = 1.7  # 1 USD ≈ 1.7 AZN
-USD_TO_AZN = 0.59  # 1 AZN ≈ 0.59 USD
+# Home currency: amounts in the API are AZN unless a request says otherwise
+BASE_CURRENCY = "AZN"
 
 # Safety thresholds
 EMERGENCY_FUND_MONTHS = 3  # Minimum emergency fund in months of expenses
@@ -29,12 +32,71 @@ RISK_PROFILES = {
     }
 }
 
+# ETFs used for each asset class in a portfolio
+PORTFOLIO_ETFS = {
+    "stocks": {
+        "asset_type": "Stocks",
+        "etf": "SPY",  # S&P 500
+        "etf_name": "S&P 500 ETF",
+        "description": "Large US companies - Apple, Microsoft, Amazon, etc."
+    },
+    "bonds": {
+        "asset_type": "Bonds",
+        "etf": "BND",  # Bond ETF
+        "etf_name": "Total Bond Market ETF",
+        "description": "Government and corporate bonds - stable and safe"
+    }
+}
+
+# Safety check messages
+SAFE_TO_INVEST_MESSAGE = "✅ Great! You're financially ready to start investing."
+NOT_SAFE_TO_INVEST_MESSAGE = "⚠️ Hold on! Let's secure your finances first before investing."
+
+# Build the list of things to fix before investing
+def build_priority_actions(
+    debt_ratio: float,
+    debt: float,
+    savings: float,
+    monthly_expenses: float,
+    emergency_fund_needed: float,
+    currency: str = BASE_CURRENCY
+) -> List[str]:
+    actions = []
+
+    # Check 1: High debt
+    if debt_ratio > HIGH_DEBT_THRESHOLD:
+        actions.append(
+            f"⚠️ Pay down debt first. Your debt is {debt_ratio*100:.1f}% of monthly income."
+        )
+        actions.append(
+            f"💡 Focus on paying at least {debt * 0.1:.2f} {currency}/month towards debt."
+        )
+
+    # Check 2: Insufficient emergency fund
+    if savings < emergency_fund_needed:
+        gap = emergency_fund_needed - savings
+        actions.append(
+            f"⚠️ Build emergency fund first. You need {gap:.2f} {currency} more."
+        )
+        actions.append(
+            f"💡 Save {gap/6:.2f} {currency}/month for 6 months to reach 3-month safety net."
+        )
+
+    # Check 3: Very low savings relative to expenses
+    if savings < monthly_expenses and debt_ratio <= HIGH_DEBT_THRESHOLD:
+        actions.append(
+            f"💡 Consider saving 1 more month of expenses before investing."
+        )
+
+    return actions
+
 # Perform safety check before investing
 def safety_check(
     salary: float,
     savings: float,
     monthly_expenses: float,
-    debt: float
+    debt: float,
+    currency: str = BASE_CURRENCY
 ) -> Tuple[bool, str, Dict]:
     """
     Check if user is financially ready to invest
@@ -47,46 +109,21 @@ def safety_check(
     # Calculate debt ratio
     debt_ratio = debt / salary if salary > 0 else 0
 
+    # Not safe with high debt or an insufficient emergency fund
+    can_invest = debt_ratio <= HIGH_DEBT_THRESHOLD and savings >= emergency_fund_needed
+
     recommendations = {
-        "can_invest": True,
+        "can_invest": can_invest,
         "emergency_fund_needed": emergency_fund_needed,
         "current_savings": savings,
         "debt_ratio": debt_ratio,
-        "priority_actions": []
-    }
-
-    # Check 1: High debt
-    if debt_ratio > HIGH_DEBT_THRESHOLD:
-        recommendations["can_invest"] = False
-        recommendations["priority_actions"].append(
-            f"⚠️ Pay down debt first. Your debt is {debt_ratio*100:.1f}% of monthly income."
-        )
-        recommendations["priority_actions"].append(
-            f"💡 Focus on paying at least {debt * 0.1:.2f} AZN/month towards debt."
-        )
-
-    # Check 2: Insufficient emergency fund
-    if savings < emergency_fund_needed:
-        recommendations["can_invest"] = False
-        gap = emergency_fund_needed - savings
-        recommendations["priority_actions"].append(
-            f"⚠️ Build emergency fund first. You need {gap:.2f} AZN more."
-        )
-        recommendations["priority_actions"].append(
-            f"💡 Save {gap/6:.2f} AZN/month for 6 months to reach 3-month safety net."
-        )
-
-    # Check 3: Very low savings relative to expenses
-    if savings < monthly_expenses and debt_ratio <= HIGH_DEBT_THRESHOLD:
-        recommendations["priority_actions"].append(
-            f"💡 Consider saving 1 more month of expenses before investing."
+        "priority_actions": build_priority_actions(
+            debt_ratio, debt, savings, monthly_expenses, emergency_fund_needed, currency
         )
+    }
 
     # Generate message
-    if recommendations["can_invest"]:
-        message = "✅ Great! You're financially ready to start investing."
-    else:
-        message = "⚠️ Hold on! Let's secure your finances first before investing."
+    message = SAFE_TO_INVEST_MESSAGE if can_invest else NOT_SAFE_TO_INVEST_MESSAGE
 
     return recommendations["can_invest"], message, recommendations
 
@@ -102,69 +139,93 @@ def determine_risk_profile(time_horizon_years: int) -> str:
     else:
         return "aggressive"
 
+# Display details for an ETF in a portfolio
+def _etf_details(symbol: str) -> Dict:
+    for etf in PORTFOLIO_ETFS.values():
+        if etf["etf"] == symbol:
+            return etf
+
+    info = ETF_KNOWLEDGE_BASE.get(symbol, {})
+    return {
+        "asset_type": info.get("category", "ETF"),
+        "etf": symbol,
+        "etf_name": info.get("name", symbol),
+        "description": info.get("simple_name", "")
+    }
+
+# Target ETF percentages for a risk profile
+def get_profile_weights(risk_profile: str) -> Dict[str, float]:
+    allocation = RISK_PROFILES[risk_profile]
+    return {
+        PORTFOLIO_ETFS["stocks"]["etf"]: allocation["stocks"],
+        PORTFOLIO_ETFS["bonds"]["etf"]: allocation["bonds"]
+    }
+
 # Calculate portfolio allocation
 def calculate_portfolio(
     monthly_investment: float,
     time_horizon_years: int,
-    goal: str = "general"
+    goal: str = "general",
+    currency: str = BASE_CURRENCY
 ) -> Dict:
     """
     Calculate recommended portfolio allocation with real ETF prices
+
+    Uses the precomputed allocation tables when loaded, otherwise the
+    RISK_PROFILES stock/bond split. monthly_investment is in `currency`;
+    the *_azn fields always hold the AZN equivalent.
     """
 
     # Determine risk profile
     risk_profile = determine_risk_profile(time_horizon_years)
-    allocation = RISK_PROFILES[risk_profile]
+    cell = lookup_allocation(time_horizon_years, risk_profile, goal)
 
-    # Calculate amounts
-    monthly_investment_usd = monthly_investment * USD_TO_AZN
-    stocks_amount_usd = monthly_investment_usd * (allocation["stocks"] / 100)
-    bonds_amount_usd = monthly_investment_usd * (allocation["bonds"] / 100)
+    weights = cell["weights"] if cell else get_profile_weights(risk_profile)
 
     # Get current ETF prices
-    stock_etf = "SPY"  # S&P 500
-    bond_etf = "BND"   # Bond ETF
-
-    stock_price_data = get_stock_price(stock_etf)
-    bond_price_data = get_stock_price(bond_etf)
+    prices = {symbol: get_stock_price(symbol) for symbol in weights}
+    held = [s for s, pct in weights.items() if pct > 0 and prices[s]]
+
+    # Convert every amount with one rate lookup: USD, AZN and the user's currency
+    currency = currency.upper()
+    fx_rate = get_rate(currency, "USD")
+    monthly_investment_usd = monthly_investment * fx_rate
+    amounts_usd = np.array([monthly_investment_usd * weights[s] / 100 for s in held])
+    converted = convert_many(
+        np.append(amounts_usd, monthly_investment_usd), "USD", [BASE_CURRENCY, currency]
+    )
+    amounts_azn, amounts_local = converted[BASE_CURRENCY], converted[currency]
 
     portfolio = {
         "risk_profile": risk_profile,
         "time_horizon_years": time_horizon_years,
-        "monthly_investment_azn": monthly_investment,
+        "currency": currency,
+        "fx_rate_usd": round(fx_rate, 6),
+        "monthly_investment_local": monthly_investment,
+        "monthly_investment_azn": round(float(amounts_azn[-1]), 2),
         "monthly_investment_usd": round(monthly_investment_usd, 2),
         "allocations": []
     }
 
-    # Stocks allocation
-    if stocks_amount_usd > 0 and stock_price_data:
-        shares = stocks_amount_usd / stock_price_data["price"]
+    for i, symbol in enumerate(held):
+        etf = _etf_details(symbol)
+        price = prices[symbol]["price"]
         portfolio["allocations"].append({
-            "asset_type": "Stocks",
-            "etf": stock_etf,
-            "etf_name": "S&P 500 ETF",
-            "percentage": allocation["stocks"],
-            "monthly_amount_usd": round(stocks_amount_usd, 2),
-            "monthly_amount_azn": round(monthly_investment * (allocation["stocks"] / 100), 2),
-            "current_price": stock_price_data["price"],
-            "shares_per_month": round(shares, 4),
-            "description": "Large US companies - Apple, Microsoft, Amazon, etc."
+            "asset_type": etf["asset_type"],
+            "etf": symbol,
+            "etf_name": etf["etf_name"],
+            "percentage": weights[symbol],
+            "monthly_amount_usd": round(float(amounts_usd[i]), 2),
+            "monthly_amount_azn": round(float(amounts_azn[i]), 2),
+            "monthly_amount_local": round(float(amounts_local[i]), 2),
+            "current_price": price,
+            "shares_per_month": round(float(amounts_usd[i]) / price, 4),
+            "description": etf["description"]
         })
 
-    # Bonds allocation
-    if bonds_amount_usd > 0 and bond_price_data:
-        shares = bonds_amount_usd / bond_price_data["price"]
-        portfolio["allocations"].append({
-            "asset_type": "Bonds",
-            "etf": bond_etf,
-            "etf_name": "Total Bond Market ETF",
-            "percentage": allocation["bonds"],
-            "monthly_amount_usd": round(bonds_amount_usd, 2),
-            "monthly_amount_azn": round(monthly_investment * (allocation["bonds"] / 100), 2),
-            "current_price": bond_price_data["price"],
-            "shares_per_month": round(shares, 4),
-            "description": "Government and corporate bonds - stable and safe"
-        })
+    if cell:
+        portfolio["goal_category"] = cell["goal_category"]
+        portfolio["glide_path"] = cell["glide_path"]
 
     return portfolio
 
@@ -173,7 +234,8 @@ def generate_recommendation_text(
     portfolio: Dict,
     goal: str,
     salary: float,
-    savings: float
+    savings: float,
+    projection: Optional[Dict] = None
 ) -> str:
     """
     Generate human-readable investment recommendation
@@ -181,7 +243,8 @@ def generate_recommendation_text(
 
     risk_profile = portfolio["risk_profile"]
     time_horizon = portfolio["time_horizon_years"]
-    monthly_inv_azn = portfolio["monthly_investment_azn"]
+    currency = portfolio.get("currency", BASE_CURRENCY)
+    monthly_inv = portfolio.get("monthly_investment_local", portfolio["monthly_investment_azn"])
     monthly_inv_usd = portfolio["monthly_investment_usd"]
 
     # Calculate projections (conservative estimates)
@@ -192,8 +255,8 @@ def generate_recommendation_text(
     else:
         expected_return = 0.09  # 9% annual
 
-    total_invested = monthly_inv_azn * time_horizon * 12
-    future_value = monthly_inv_azn * (((1 + expected_return/12)**(time_horizon*12) - 1) / (expected_return/12)) * (1 + expected_return/12)
+    total_invested = monthly_inv * time_horizon * 12
+    future_value = monthly_inv * (((1 + expected_return/12)**(time_horizon*12) - 1) / (expected_return/12)) * (1 + expected_return/12)
     gains = future_value - total_invested
 
     text = f"""
@@ -201,7 +264,7 @@ def generate_recommendation_text(
 
 🎯 **Goal**: {goal.title()}
 ⏰ **Time Horizon**: {time_horizon} years
-💰 **Monthly Investment**: {monthly_inv_azn:.2f} AZN (~${monthly_inv_usd:.2f} USD)
+💰 **Monthly Investment**: {format_price(monthly_inv, currency)} (~{format_price(monthly_inv_usd)} USD)
 
 ---
 
@@ -213,8 +276,8 @@ def generate_recommendation_text(
         text += f"""
 **{alloc['asset_type']} - {alloc['percentage']}% allocation**
 • ETF: {alloc['etf']} ({alloc['etf_name']})
-• Current Price: ${alloc['current_price']:.2f}
-• Monthly Investment: {alloc['monthly_amount_azn']:.2f} AZN (~${alloc['monthly_amount_usd']:.2f})
+• Current Price: {format_price(alloc['current_price'])}
+• Monthly Investment: {format_price(alloc.get('monthly_amount_local', alloc['monthly_amount_azn']), currency)} (~{format_price(alloc['monthly_amount_usd'])})
 • Shares/month: ~{alloc['shares_per_month']:.3f}
 • What it is: {alloc['description']}
 
@@ -230,16 +293,16 @@ def generate_recommendation_text(
 • **Diversification**: Mix of stocks and bonds reduces risk
 
 📊 **Projected Results** (Conservative estimate)
-• Total Invested: {total_invested:,.2f} AZN
-• Expected Growth: {gains:,.2f} AZN ({expected_return*100:.0f}% avg annual return)
-• Final Value: ~{future_value:,.2f} AZN
-
+• Total Invested: {format_price(total_invested, currency)}
+• Expected Growth: {format_price(gains, currency)} ({expected_return*100:.0f}% avg annual return)
+• Final Value: ~{format_price(future_value, currency)}
+{_format_projection_range(projection, currency)}
 ---
 
 🚀 **How to Start**
 
 1. Open a brokerage account (Interactive Brokers, Trading212, etc.)
-2. Set up automatic monthly investments of {monthly_inv_azn:.2f} AZN
+2. Set up automatic monthly investments of {format_price(monthly_inv, currency)}
 3. Buy {portfolio['allocations'][0]['etf']} and {portfolio['allocations'][1]['etf'] if len(portfolio['allocations']) > 1 else 'bonds'} according to percentages above
 4. Don't panic during market drops - stay the course!
 5. Review your portfolio every 6 months
@@ -257,6 +320,38 @@ def generate_recommendation_text(
 
     return text
 
+# Format Monte Carlo percentile bands for the plan text
+def _format_projection_range(projection: Optional[Dict], currency: str = BASE_CURRENCY) -> str:
+    if not projection:
+        return ""
+
+    final = projection["final"]
+    text = f"""
+🎲 **Range of Outcomes** ({projection['n_paths']:,} simulated markets)
+• Tough markets (P10): ~{format_price(final['p10'], currency)}
+• Typical (P50): ~{format_price(final['p50'], currency)}
+• Strong markets (P90): ~{format_price(final['p90'], currency)}
+"""
+    if projection.get("probability_of_goal") is not None:
+        text += f"• Chance of reaching {format_price(projection['goal_amount'], currency)}: {projection['probability_of_goal']*100:.0f}%\n"
+    return text
+
+# Simulate the portfolio's range of outcomes
+def project_portfolio(portfolio: Dict, goal_amount: Optional[float] = None) -> Optional[Dict]:
+    """
+    Monte Carlo projection (P10/P50/P90 and goal probability) for a portfolio
+
+    Scaled from the precomputed tables. A fresh simulation is over the
+    request latency budget, so until the tables have loaded (or when they
+    don't cover the plan) there is no projection and the plan text keeps
+    only the expected-return figures.
+    """
+    return lookup_projection(
+        portfolio["time_horizon_years"], portfolio["risk_profile"],
+        portfolio.get("monthly_investment_local", portfolio["monthly_investment_azn"]), goal_amount,
+        goal=portfolio.get("goal_category", "general")
+    )
+
 # Generate full investment recommendation
 def generate_investment_recommendation(
     salary: float,
@@ -265,15 +360,19 @@ def generate_investment_recommendation(
     debt: float,
     monthly_investment: float,
     goal: str,
-    time_horizon_years: int
+    time_horizon_years: int,
+    goal_amount: Optional[float] = None,
+    currency: str = BASE_CURRENCY
 ) -> Dict:
     """
     Main function to generate complete investment recommendation
+
+    All amounts (inputs, goal and the plan text) are in `currency`
     """
 
     # Safety check first
     is_safe, safety_message, safety_details = safety_check(
-        salary, savings, monthly_expenses, debt
+        salary, savings, monthly_expenses, debt, currency
     )
 
     result = {
@@ -284,12 +383,14 @@ def generate_investment_recommendation(
 
     # Generate portfolio recommendation only if safe
     if is_safe:
-        portfolio = calculate_portfolio(monthly_investment, time_horizon_years, goal)
+        portfolio = calculate_portfolio(monthly_investment, time_horizon_years, goal, currency)
+        projection = project_portfolio(portfolio, goal_amount)
         recommendation_text = generate_recommendation_text(
-            portfolio, goal, salary, savings
+            portfolio, goal, salary, savings, projection
         )
 
         result["portfolio"] = portfolio
+        result["projection"] = projection
         result["recommendation_text"] = recommendation_text
     else:
         # Provide guidance on what to do instead
@@ -304,7 +405,7 @@ Investing without a safety net is risky. If an emergency happens, you might need
 
 **Next Steps:**
 1. Create a budget to track expenses
-2. Build your emergency fund to {safety_details['emergency_fund_needed']:.2f} AZN
+2. Build your emergency fund to {safety_details['emergency_fund_needed']:.2f} {currency}
 3. Pay down high-interest debt
 4. Then come back and we'll create your investment plan!
 
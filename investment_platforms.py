@@ -128,6 +128,70 @@ INVESTMENT_PLATFORMS = {
     ]
 }
 
+# Order constraints and costs per platform, used by the order planner and
+# the cost simulator. fx_spread_pct is lost converting deposits to USD,
+# custody_fee_pct is charged per year on assets, account_fee_usd per month.
+# Approximate fee schedules - check the platform's current price list
+PLATFORM_TRADING_RULES = {
+    "Interactive Brokers": {
+        "fractional": True,
+        "min_order_usd": 1.0,
+        "fee_fixed_usd": 0.0,
+        "fee_per_share_usd": 0.005,
+        "fee_pct": 0.0,
+        "min_fee_usd": 1.0,
+        "fx_spread_pct": 0.0002,
+        "custody_fee_pct": 0.0,
+        "account_fee_usd": 0.0,
+    },
+    "eToro": {
+        "fractional": True,
+        "min_order_usd": 10.0,
+        "fee_fixed_usd": 0.0,
+        "fee_per_share_usd": 0.0,
+        "fee_pct": 0.0,
+        "min_fee_usd": 0.0,
+        "fx_spread_pct": 0.005,
+        "custody_fee_pct": 0.0,
+        "account_fee_usd": 0.0,
+    },
+    "Saxo Bank": {
+        "fractional": False,
+        "min_order_usd": 0.0,
+        "fee_fixed_usd": 0.0,
+        "fee_per_share_usd": 0.0,
+        "fee_pct": 0.0008,
+        "min_fee_usd": 1.0,
+        "fx_spread_pct": 0.0025,
+        "custody_fee_pct": 0.0012,
+        "account_fee_usd": 0.0,
+    },
+    "Binance": {
+        "fractional": True,
+        "min_order_usd": 10.0,
+        "fee_fixed_usd": 0.0,
+        "fee_per_share_usd": 0.0,
+        "fee_pct": 0.001,
+        "min_fee_usd": 0.0,
+        "fx_spread_pct": 0.005,
+        "custody_fee_pct": 0.0,
+        "account_fee_usd": 0.0,
+    },
+}
+
+# Rules for a platform not in the table: whole shares, no fees or spreads
+DEFAULT_TRADING_RULES = {
+    "fractional": False,
+    "min_order_usd": 0.0,
+    "fee_fixed_usd": 0.0,
+    "fee_per_share_usd": 0.0,
+    "fee_pct": 0.0,
+    "min_fee_usd": 0.0,
+    "fx_spread_pct": 0.0,
+    "custody_fee_pct": 0.0,
+    "account_fee_usd": 0.0,
+}
+
 # Step-by-step guide for complete beginners
 BEGINNERS_GUIDE = """
 # 🎯 Complete Beginner's Guide: How to Actually Invest
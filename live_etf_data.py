@@ -8,10 +8,13 @@ from datetime import datetime, timedelta
 import requests
 from typing import Dict, Optional
 import time
+import shared_cache
+from telemetry import CACHE_ENTRIES, record_cache, record_provider_call
 
 # Cache to avoid hammering APIs
 _price_cache = {}
 _cache_duration = 900  # 15 minutes
+CACHE_ENTRIES.track(lambda: len(_price_cache), cache="live_etf")
 
 def get_live_etf_data(symbol: str) -> Dict:
     """
@@ -27,8 +30,17 @@ def get_live_etf_data(symbol: str) -> Dict:
     if cache_key in _price_cache:
         cached_data, cached_time = _price_cache[cache_key]
         if current_time - cached_time < _cache_duration:
+            record_cache("live_etf", "hit")
             return cached_data
 
+    # Another worker on this host may already have fetched it
+    shared_data = shared_cache.get("live_etf", symbol, _cache_duration)
+    if shared_data:
+        record_cache("live_etf", "shared_hit")
+        return shared_data
+    record_cache("live_etf", "expired" if cache_key in _price_cache else "miss")
+
+    started = time.perf_counter()
     try:
         # Fetch data using yfinance
         ticker = yf.Ticker(symbol)
@@ -82,10 +94,13 @@ def get_live_etf_data(symbol: str) -> Dict:
 
         # Cache the result
         _price_cache[cache_key] = (live_data, current_time)
+        shared_cache.set("live_etf", symbol, live_data)
 
+        record_provider_call("yfinance_live", "ok", time.perf_counter() - started)
         return live_data
 
     except Exception as e:
+        record_provider_call("yfinance_live", "error", time.perf_counter() - started, e)
         print(f"Error fetching live data for {symbol}: {e}")
         # Return minimal data on error
         return {
@@ -95,6 +110,18 @@ def get_live_etf_data(symbol: str) -> Dict:
             'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
 
+def get_cached_live_etf_data(symbol: str) -> Optional[Dict]:
+    """
+    Live data already fetched by this or another worker - never calls Yahoo
+
+    Returns:
+        Cached live data dict, or None if nothing fresh is cached
+    """
+    cached = _price_cache.get(f"{symbol}_live")
+    if cached and time.time() - cached[1] < _cache_duration:
+        return cached[0]
+    return shared_cache.get("live_etf", symbol, _cache_duration)
+
 def get_multiple_live_data(symbols: list) -> Dict[str, Dict]:
     """
     Fetch live data for multiple ETFs
@@ -0,0 +1,233 @@
+"""
+LLM Client
+Pluggable chat-completions client: OpenAI, or a local deterministic stand-in
+
+Everything in the backend talks to `client.chat.completions.create(...)`, so
+any object with that call (OpenAI-compatible) can be plugged in:
+
+    LLM_PROVIDER=openai  - the OpenAI SDK (OPENAI_BASE_URL points it at any
+                           compatible server, e.g. the stand-in below)
+    LLM_PROVIDER=stub    - StubLLMClient, in-process, no network
+
+The stand-in produces the same text for the same prompt, with a fixed time
+to first token and token rate (LLM_STUB_* settings), streamed or not, and
+reports token usage like the real API. Run it as a server to load test the
+full HTTP path, including the OpenAI SDK:
+
+    python llm_client.py --port 8089 --first-token-ms 300 --tokens-per-second 40
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub uvicorn backend:app
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Which client the backend creates
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+
+# Stand-in behaviour
+STUB_FIRST_TOKEN_MS = float(os.getenv("LLM_STUB_FIRST_TOKEN_MS", "300"))
+STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "50"))
+STUB_COMPLETION_TOKENS = int(os.getenv("LLM_STUB_COMPLETION_TOKENS", "200"))
+
+# Words the stand-in answers with (one word = one token)
+STUB_VOCABULARY = (
+    "invest monthly in a low cost index ETF such as SPY or VOO keep an emergency fund "
+    "first diversify with bonds like BND review once a year and stay patient"
+).split()
+
+
+# Token count estimate (about 4 characters per token, like the tokenizer on English)
+def estimate_tokens(messages: List[Dict]) -> int:
+    return sum(len(m.get("content") or "") for m in messages) // 4 + 3 * len(messages)
+
+
+# OpenAI-compatible stand-in with configurable latency
+class StubLLMClient:
+    """
+    Deterministic chat-completions client
+
+    client.chat.completions.create(model, messages, stream=..., stream_options=...)
+    returns objects shaped like the OpenAI SDK's (choices, delta, message, usage).
+    """
+
+    def __init__(self, first_token_ms: float = STUB_FIRST_TOKEN_MS,
+                 tokens_per_second: float = STUB_TOKENS_PER_SECOND,
+                 completion_tokens: int = STUB_COMPLETION_TOKENS):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    # Reply tokens, seeded by the prompt
+    def reply_tokens(self, messages: List[Dict]) -> List[str]:
+        seed = zlib.crc32(json.dumps(messages, sort_keys=True).encode())
+        picks = np.random.default_rng(seed).integers(0, len(STUB_VOCABULARY), self.completion_tokens)
+        return [STUB_VOCABULARY[i] + " " for i in picks]
+
+    def usage(self, messages: List[Dict]) -> SimpleNamespace:
+        prompt_tokens = estimate_tokens(messages)
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=self.completion_tokens,
+                               total_tokens=prompt_tokens + self.completion_tokens)
+
+    # Tokens with their delays: first token after first_token_ms, then at tokens_per_second
+    def timed_tokens(self, messages: List[Dict]) -> Iterator[str]:
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        started = time.perf_counter()
+        for i, token in enumerate(self.reply_tokens(messages)):
+            # Sleep to a schedule so slow consumers don't stretch the rate
+            due = started + self.first_token_ms / 1000 + i * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield token
+
+    def _stream(self, model: str, messages: List[Dict], include_usage: bool):
+        for token in self.timed_tokens(messages):
+            delta = SimpleNamespace(content=token, role="assistant")
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)],
+                                  usage=None)
+        if include_usage:
+            yield SimpleNamespace(model=model, choices=[], usage=self.usage(messages))
+
+    def create(self, model: str, messages: List[Dict], stream: bool = False,
+               stream_options: Optional[Dict] = None, **kwargs):
+        if stream:
+            return self._stream(model, messages, bool((stream_options or {}).get("include_usage")))
+        content = "".join(self.timed_tokens(messages)).strip()
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                               usage=self.usage(messages))
+
+
+# Client for LLM_PROVIDER
+def create_llm_client(provider: str = LLM_PROVIDER, base_url: Optional[str] = None):
+    """
+    Args:
+        provider: "openai" or "stub"
+        base_url: OpenAI-compatible endpoint (default: OPENAI_BASE_URL or api.openai.com)
+    """
+    if provider == "stub":
+        return StubLLMClient()
+    if provider == "openai":
+        from openai import OpenAI
+
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url or os.getenv("OPENAI_BASE_URL") or None)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+# HTTP stand-in for POST /v1/chat/completions
+class StubCompletionsHandler(BaseHTTPRequestHandler):
+    """Serves StubLLMClient over HTTP (JSON or server-sent events)"""
+
+    stub: StubLLMClient = None
+    slots: Optional[threading.BoundedSemaphore] = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        # Provider-side concurrency limit, answered like a rate limit
+        if self.slots and not self.slots.acquire(blocking=False):
+            self._send_json(429, {"error": {"message": "Too many concurrent requests", "type": "rate_limit_error"}})
+            return
+        try:
+            self._complete(request)
+        finally:
+            if self.slots:
+                self.slots.release()
+
+    def _complete(self, request: Dict):
+        model = request.get("model", "stub")
+        messages = request.get("messages", [])
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = vars(self.stub.usage(messages))
+
+        if not request.get("stream"):
+            content = "".join(self.stub.timed_tokens(messages)).strip()
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(chunk: Dict):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        for i, token in enumerate(self.stub.timed_tokens(messages)):
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            send({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+# Stand-in server (call serve_forever() to run it)
+def serve(host: str = "127.0.0.1", port: int = 8089, stub: Optional[StubLLMClient] = None,
+          max_concurrency: int = 0) -> ThreadingHTTPServer:
+    handler = type("Handler", (StubCompletionsHandler,), {
+        "stub": stub or StubLLMClient(),
+        "slots": threading.BoundedSemaphore(max_concurrency) if max_concurrency else None,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--first-token-ms", type=float, default=STUB_FIRST_TOKEN_MS)
+    parser.add_argument("--tokens-per-second", type=float, default=STUB_TOKENS_PER_SECOND)
+    parser.add_argument("--completion-tokens", type=int, default=STUB_COMPLETION_TOKENS)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Answer 429 above this many requests")
+    args = parser.parse_args()
+
+    stub = StubLLMClient(args.first_token_ms, args.tokens_per_second, args.completion_tokens)
+    server = serve(args.host, args.port, stub, args.max_concurrency)
+    print(f"🤖 LLM stand-in on http://{args.host}:{args.port}/v1 "
+          f"({args.first_token_ms:g} ms to first token, {args.tokens_per_second:g} tokens/s, "
+          f"{args.completion_tokens} tokens)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,286 @@
+"""
+Monte Carlo Projection Engine
+Vectorized simulation of monthly-contribution investment paths
+
+All paths are simulated at once with NumPy: monthly log returns are drawn as
+one (paths x months) matrix, compounded with a cumulative sum, and the value
+of every path at every month follows from
+
+    V_t = G_t * (initial + contribution * sum_{k<=t} 1 / G_{k-1})
+
+where G_t is the cumulative growth factor. Contributions go in at the start
+of each month, like the annuity formula in generate_recommendation_text.
+10k paths x 40 years takes tens of milliseconds, mostly spent drawing
+random numbers - above the 50 ms budget on slow cores. Request paths
+therefore never simulate: they scale a precomputed projection from the
+allocation tables (well under a millisecond) and report none until the
+tables are loaded. The benchmarks.py projection suite reports both against
+PROJECTION_TARGET_MS.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from price_history import BARS_MAX_AGE_HOURS, get_monthly_returns
+
+# Default simulation size
+DEFAULT_PATHS = 10000
+
+# Latency budget for one DEFAULT_PATHS x 40-year projection (benchmarks report against it)
+PROJECTION_TARGET_MS = 50
+
+# Years of history used to estimate return and volatility
+HISTORY_YEARS = 20
+
+# Historical estimates kept in memory
+ESTIMATE_CACHE_SIZE = 256
+
+# parameter_source of estimates made without history
+FALLBACK_SOURCE = "default assumptions"
+
+# Used when no cached history is available: (annual return, annual volatility)
+FALLBACK_ASSUMPTIONS = {
+    "conservative": (0.04, 0.06),
+    "moderate": (0.07, 0.10),
+    "aggressive": (0.09, 0.14),
+}
+
+
+# (weights, years) -> {"estimate": (mu, sigma), "computed_at"}
+_estimate_cache: Dict[Tuple, Dict] = {}
+
+
+# Estimate monthly log-return mean and volatility from cached ETF bars
+def _estimate_from_history(weights: Tuple[Tuple[str, float], ...], years: int) -> Optional[Tuple[float, float]]:
+    """
+    Estimates are cached until the bars are due for a refresh; a miss (bars
+    not on disk yet) is not, so bars downloaded later are picked up
+    """
+    key = (weights, years)
+    cached = _estimate_cache.get(key)
+    if cached and time.time() - cached["computed_at"] < BARS_MAX_AGE_HOURS * 3600:
+        return cached["estimate"]
+
+    symbols = [symbol for symbol, _ in weights]
+    history = get_monthly_returns(symbols, years=years, allow_download=False)
+    if history is None or len(history["returns"]) < 24:
+        return None
+
+    w = np.array([weight for _, weight in weights], dtype=np.float64)
+    w = w / w.sum()
+
+    # Monthly-rebalanced portfolio return series
+    portfolio_returns = history["returns"] @ w
+    log_returns = np.log1p(portfolio_returns)
+    estimate = float(log_returns.mean()), float(log_returns.std(ddof=1))
+
+    if key not in _estimate_cache and len(_estimate_cache) >= ESTIMATE_CACHE_SIZE:
+        _estimate_cache.pop(next(iter(_estimate_cache)))
+    _estimate_cache[key] = {"estimate": estimate, "computed_at": time.time()}
+    return estimate
+
+
+# Get simulation parameters for a set of ETF weights
+def estimate_parameters(weights: Dict[str, float], risk_profile: str = "moderate",
+                        years: int = HISTORY_YEARS) -> Dict:
+    """
+    Monthly log-return mean/volatility for a portfolio
+
+    Args:
+        weights: {symbol: percentage or weight}
+        risk_profile: Used to pick fallback assumptions when no history is cached
+        years: Lookback window
+
+    Returns:
+        Dict with monthly_mu, monthly_sigma, annual_return, annual_volatility, source
+    """
+    key = tuple(sorted((symbol.upper(), float(weight)) for symbol, weight in weights.items() if weight > 0))
+    estimate = _estimate_from_history(key, years) if key else None
+
+    if estimate is not None:
+        monthly_mu, monthly_sigma = estimate
+        source = f"historical ({years}y monthly bars)"
+    else:
+        annual_return, annual_volatility = FALLBACK_ASSUMPTIONS.get(
+            risk_profile, FALLBACK_ASSUMPTIONS["moderate"]
+        )
+        monthly_sigma = annual_volatility / np.sqrt(12)
+        # Log-normal: choose mu so the expected annual return matches
+        monthly_mu = np.log1p(annual_return) / 12 - monthly_sigma ** 2 / 2
+        source = FALLBACK_SOURCE
+
+    return {
+        "monthly_mu": monthly_mu,
+        "monthly_sigma": monthly_sigma,
+        "annual_return": float(np.expm1(12 * (monthly_mu + monthly_sigma ** 2 / 2))),
+        "annual_volatility": float(monthly_sigma * np.sqrt(12)),
+        "source": source
+    }
+
+
+# Simulate many contribution paths at once
+def simulate_paths(
+    monthly_contribution: float,
+    months: int,
+    monthly_mu,
+    monthly_sigma,
+    n_paths: int = DEFAULT_PATHS,
+    initial_amount: float = 0.0,
+    seed: Optional[int] = None,
+    snapshot_months: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Args:
+        monthly_mu, monthly_sigma: Log-return mean and volatility, either one
+            value or one per month (a mix that changes over time)
+        snapshot_months: Increasing 1-based month numbers to report
+            (default: every month)
+
+    Returns:
+        (n_paths x len(snapshot_months)) float32 matrix of portfolio values
+        at the end of each snapshot month
+    """
+    if snapshot_months is None:
+        snapshot_months = np.arange(1, months + 1)
+    snapshot_months = np.asarray(snapshot_months)
+
+    rng = np.random.default_rng(seed)
+
+    # Antithetic draws: the second half of the paths use -Z, halving RNG
+    # cost and variance. Written straight into one buffer, no extra copies.
+    half = (n_paths + 1) // 2
+    shocks = rng.standard_normal((half, months), dtype=np.float32)
+    log_growth = np.empty((n_paths, months), dtype=np.float32)
+    monthly_mu = np.broadcast_to(np.asarray(monthly_mu, dtype=np.float32), (months,))
+    np.multiply(shocks, np.asarray(monthly_sigma, dtype=np.float32), out=log_growth[:half])
+    log_growth[:half] += monthly_mu
+
+    # Cumulative log growth L_t = log G_t; float32 keeps 10k x 480 small and fast.
+    # Only the drawn half is summed: the antithetic half is 2 * cumsum(mu) - L_t
+    np.cumsum(log_growth[:half], axis=1, out=log_growth[:half])
+    drift = np.cumsum(monthly_mu, dtype=np.float32) * np.float32(2)
+    np.subtract(drift, log_growth[:n_paths - half], out=log_growth[half:])
+
+    # 1 / G_{t-1}: growth up to the start of each month (G_0 = 1)
+    inverse_prior_growth = shocks if half == n_paths else np.empty_like(log_growth)
+    inverse_prior_growth[:, 0] = 1.0
+    np.exp(np.negative(log_growth[:, :-1]), out=inverse_prior_growth[:, 1:])
+
+    # Sum 1/G within each snapshot interval, then accumulate across intervals -
+    # only the snapshot columns are ever materialized
+    segment_starts = np.concatenate(([0], snapshot_months[:-1]))
+    contribution_factor = np.add.reduceat(inverse_prior_growth, segment_starts, axis=1)
+    np.cumsum(contribution_factor, axis=1, out=contribution_factor)
+
+    snapshot_growth = np.exp(log_growth[:, snapshot_months - 1])
+    return snapshot_growth * (np.float32(initial_amount) + np.float32(monthly_contribution) * contribution_factor)
+
+
+# P10/P50/P90 across paths for each column, via partial sort
+def _percentile_bands(samples: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        samples: (n_paths x n_points) matrix
+
+    Returns:
+        (3 x n_points) array of the 10th, 50th and 90th percentiles
+    """
+    columns = np.ascontiguousarray(samples.T)
+    n = columns.shape[1]
+    ranks = [int(round(q * (n - 1))) for q in (0.10, 0.50, 0.90)]
+    columns.partition(ranks, axis=1)
+    return columns[:, ranks].T
+
+
+# Full projection with percentile bands and goal probability
+def run_projection(
+    monthly_contribution: float,
+    years: int,
+    weights: Dict[str, float],
+    risk_profile: str = "moderate",
+    goal_amount: Optional[float] = None,
+    initial_amount: float = 0.0,
+    n_paths: int = DEFAULT_PATHS,
+    seed: Optional[int] = None
+) -> Dict:
+    """
+    Project a monthly investment plan with Monte Carlo simulation
+
+    Args:
+        monthly_contribution: Amount invested at the start of every month
+        years: Time horizon in years
+        weights: {symbol: percentage} of the portfolio
+        risk_profile: Fallback assumptions when no history is cached
+        goal_amount: Target value (optional) for the success probability
+        initial_amount: Amount already invested
+        n_paths: Number of simulated paths
+
+    Returns:
+        Dict with yearly P10/P50/P90 bands, final-value percentiles and
+        probability of reaching goal_amount
+    """
+    months = max(int(years * 12), 1)
+    params = estimate_parameters(weights, risk_profile)
+
+    # Year-end snapshots for the bands (plus the final month if not a whole year)
+    snapshot_months = np.arange(12, months + 1, 12)
+    if len(snapshot_months) == 0 or snapshot_months[-1] != months:
+        snapshot_months = np.append(snapshot_months, months)
+
+    values = simulate_paths(
+        monthly_contribution, months, params["monthly_mu"], params["monthly_sigma"],
+        n_paths=n_paths, initial_amount=initial_amount, seed=seed,
+        snapshot_months=snapshot_months
+    )
+
+    bands = _percentile_bands(values).astype(np.float64)
+    final_values = values[:, -1]
+
+    projection = {
+        "years": years,
+        "n_paths": n_paths,
+        "total_invested": round(initial_amount + monthly_contribution * months, 2),
+        "annual_return": round(params["annual_return"], 4),
+        "annual_volatility": round(params["annual_volatility"], 4),
+        "parameter_source": params["source"],
+        "bands": {
+            "month": snapshot_months.tolist(),
+            "p10": np.round(bands[0], 2).tolist(),
+            "p50": np.round(bands[1], 2).tolist(),
+            "p90": np.round(bands[2], 2).tolist(),
+        },
+        "final": {
+            "p10": round(float(bands[0, -1]), 2),
+            "p50": round(float(bands[1, -1]), 2),
+            "p90": round(float(bands[2, -1]), 2),
+            "mean": round(float(final_values.mean()), 2),
+        },
+        "goal_amount": goal_amount,
+        "probability_of_goal": None
+    }
+
+    if goal_amount:
+        projection["probability_of_goal"] = round(float((final_values >= goal_amount).mean()), 4)
+
+    return projection
+
+
+if __name__ == "__main__":
+    weights = {"SPY": 80, "BND": 20}
+    run_projection(500, 40, weights, "aggressive", seed=1)  # warm-up
+
+    timings = []
+    for run in range(10):
+        started = time.perf_counter()
+        result = run_projection(500, 40, weights, "aggressive", goal_amount=1_000_000, seed=1)
+        timings.append((time.perf_counter() - started) * 1000)
+    elapsed_ms = float(np.median(timings))
+
+    status = "within" if elapsed_ms <= PROJECTION_TARGET_MS else "over"
+    print(f"10k paths x 40 years: median {elapsed_ms:.1f} ms over 10 runs "
+          f"({status} the {PROJECTION_TARGET_MS} ms target, {result['parameter_source']})")
+    print(f"Final value P10/P50/P90: {result['final']['p10']:,.0f} / "
+          f"{result['final']['p50']:,.0f} / {result['final']['p90']:,.0f}")
+    print(f"Probability of reaching 1,000,000: {result['probability_of_goal']:.1%}")
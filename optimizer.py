@@ -0,0 +1,377 @@
+"""
+Portfolio Optimizer
+Mean-variance allocations over the ETFs in the knowledge base
+
+Returns come from the cached month-end closes in price_history. The
+covariance matrix is shrunk toward a scaled identity (Ledoit-Wolf) so 20+
+ETFs with a few years of history still give a well-conditioned estimate,
+and it is cached per lookback window together with its efficient frontier.
+A request only re-solves the small subsets left after the ETF-count limit
+(cached with the model as well).
+
+The solver is plain NumPy: projected gradient ascent on
+w'mu - (lambda / 2) w'Sigma w over long-only, capped weights, run for a
+whole grid of risk aversions at once. Each row of the result is one point
+of the efficient frontier.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from etf_knowledge import ETF_KNOWLEDGE_BASE
+from price_history import BARS_MAX_AGE_HOURS, get_monthly_returns
+
+# Default lookback window for return/covariance estimates
+DEFAULT_LOOKBACK_YEARS = 10
+
+# Pull each ETF's mean return halfway toward the cross-sectional average -
+# historical means are far noisier than covariances
+RETURN_SHRINKAGE = 0.5
+
+# Annual risk-free rate used for the Sharpe ratio
+RISK_FREE_RATE = 0.02
+
+# Constraints per risk profile: annual volatility cap, ETF count, max weight per ETF
+RISK_PROFILE_CONSTRAINTS = {
+    "conservative": {"max_volatility": 0.06, "max_etfs": 3, "max_weight": 0.80},
+    "moderate": {"max_volatility": 0.11, "max_etfs": 4, "max_weight": 0.60},
+    "aggressive": {"max_volatility": 0.16, "max_etfs": 5, "max_weight": 0.60},
+}
+
+# Weights below this are dropped before the ETF-count limit is applied
+MIN_WEIGHT = 0.05
+
+# Risk aversions traced for the frontier (high end = minimum variance)
+RISK_AVERSIONS = np.geomspace(0.25, 1000.0, 48)
+
+# Covariance estimates: (symbols, lookback) -> estimate dict
+_covariance_cache: Dict[Tuple[Tuple[str, ...], int], Dict] = {}
+_covariance_lock = threading.Lock()
+
+
+# Ledoit-Wolf shrinkage toward a scaled identity
+def shrink_covariance(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Args:
+        returns: (T x N) periodic returns
+
+    Returns:
+        (N x N) shrunk covariance and the shrinkage intensity in [0, 1]
+    """
+    n_obs, n_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / n_obs
+
+    target_scale = np.trace(sample) / n_assets
+    target = target_scale * np.eye(n_assets)
+
+    # Distance of the sample from the target vs. the sampling noise in it
+    d2 = np.sum((sample - target) ** 2)
+    row_norms = np.sum(centered ** 2, axis=1)
+    b2 = (np.sum(row_norms ** 2) - n_obs * np.sum(sample ** 2)) / n_obs ** 2
+    intensity = float(np.clip(b2 / d2, 0.0, 1.0)) if d2 > 0 else 1.0
+
+    return intensity * target + (1.0 - intensity) * sample, intensity
+
+
+# Symbols with monthly history covering the whole lookback window
+def _symbols_with_history(symbols: List[str], lookback_years: int, allow_download: bool) -> List[str]:
+    available = []
+    for symbol in symbols:
+        history = get_monthly_returns([symbol], years=lookback_years, allow_download=allow_download)
+        if history is not None and len(history["returns"]) >= lookback_years * 12:
+            available.append(symbol)
+    return available
+
+
+# Annualized expected returns and shrunk covariance, cached per lookback window
+def estimate_risk_model(
+    symbols: Optional[List[str]] = None,
+    lookback_years: int = DEFAULT_LOOKBACK_YEARS,
+    allow_download: bool = False
+) -> Dict:
+    """
+    Args:
+        symbols: Candidate ETFs (default: the whole knowledge base)
+        lookback_years: Years of monthly returns to use
+        allow_download: Download missing bars (offline jobs only)
+
+    Returns:
+        Dict with symbols, mu (annual), cov (annual), shrinkage, months, computed_at
+    """
+    symbols = sorted(s.upper() for s in (symbols or ETF_KNOWLEDGE_BASE.keys()))
+    key = (tuple(symbols), lookback_years)
+
+    cached = _covariance_cache.get(key)
+    if cached and time.time() - cached["computed_at"] < BARS_MAX_AGE_HOURS * 3600:
+        return cached
+
+    with _covariance_lock:
+        available = _symbols_with_history(symbols, lookback_years, allow_download)
+        if len(available) < 2:
+            raise ValueError(
+                f"Need cached price history for at least 2 ETFs covering {lookback_years} years"
+            )
+
+        history = get_monthly_returns(available, years=lookback_years, allow_download=allow_download)
+        returns = history["returns"]
+
+        cov, intensity = shrink_covariance(returns)
+        mean = returns.mean(axis=0) * 12
+        mu = (1 - RETURN_SHRINKAGE) * mean + RETURN_SHRINKAGE * mean.mean()
+
+        model = {
+            "symbols": available,
+            "mu": mu,
+            "cov": cov * 12,
+            "shrinkage": round(intensity, 4),
+            "months": len(returns),
+            "start": str(history["months"][0]),
+            "end": str(history["months"][-1]),
+            "computed_at": time.time()
+        }
+        _covariance_cache[key] = model
+        return model
+
+
+# Euclidean projection of each row onto {0 <= w <= cap, sum(w) = 1}
+def _project_capped_simplex(v: np.ndarray, cap: float) -> np.ndarray:
+    """
+    sum(clip(v - tau, 0, cap)) is piecewise linear and decreasing in tau with
+    kinks at v and v - cap: evaluate it at every kink, find the segment where
+    it crosses 1 and interpolate - one vectorized pass, no bisection loop.
+    """
+    kinks = np.sort(np.concatenate((v, v - cap), axis=1), axis=1)
+    totals = np.clip(v[:, None, :] - kinks[:, :, None], 0.0, cap).sum(axis=2)
+
+    # Last kink where the total is still >= 1 (totals decrease along the row)
+    k = np.clip((totals >= 1.0).sum(axis=1) - 1, 0, kinks.shape[1] - 2)
+    rows = np.arange(len(v))
+    t0, t1 = kinks[rows, k], kinks[rows, k + 1]
+    f0, f1 = totals[rows, k], totals[rows, k + 1]
+    slope = np.where(f0 > f1, (f0 - 1.0) / np.maximum(f0 - f1, 1e-300), 0.0)
+    tau = t0 + slope * (t1 - t0)
+
+    return np.clip(v - tau[:, None], 0.0, cap)
+
+
+# Efficient frontier: one optimal portfolio per risk aversion
+def efficient_frontier(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    max_weight: float = 1.0,
+    risk_aversions: np.ndarray = RISK_AVERSIONS,
+    iterations: int = 500,
+    tolerance: float = 1e-7,
+    initial: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Args:
+        mu: (N,) expected annual returns
+        cov: (N x N) annual covariance
+        max_weight: Upper bound for every weight
+        risk_aversions: (L,) lambdas, one frontier point each
+        initial: (L x N) warm start (default: equal weights)
+
+    Returns:
+        (L x N) long-only weights, rows summing to 1
+    """
+    n_assets = len(mu)
+    max_weight = max(max_weight, 1.0 / n_assets)
+
+    # Step 1/Lipschitz per row; the gradient's Lipschitz constant is lambda * max eigenvalue
+    lipschitz = risk_aversions[:, None] * np.linalg.eigvalsh(cov)[-1]
+    step = 1.0 / lipschitz
+
+    if initial is None:
+        weights = np.full((len(risk_aversions), n_assets), 1.0 / n_assets)
+    else:
+        weights = _project_capped_simplex(initial, max_weight)
+    momentum = weights.copy()
+    t = 1.0
+
+    # Accelerated (FISTA) projected gradient, all lambdas in one matrix
+    for _ in range(iterations):
+        gradient = mu - risk_aversions[:, None] * (momentum @ cov)
+        updated = _project_capped_simplex(momentum + step * gradient, max_weight)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        momentum = updated + ((t - 1) / t_next) * (updated - weights)
+        converged = np.abs(updated - weights).max() < tolerance
+        weights, t = updated, t_next
+        if converged:
+            break
+
+    return weights
+
+
+# Frontier for a risk model, computed once per weight cap
+def _model_frontier(model: Dict, max_weight: float) -> np.ndarray:
+    frontiers = model.setdefault("frontiers", {})
+    if max_weight not in frontiers:
+        frontiers[max_weight] = efficient_frontier(model["mu"], model["cov"], max_weight)
+    return frontiers[max_weight]
+
+
+# Expected return and volatility of each row of weights
+def portfolio_stats(weights: np.ndarray, mu: np.ndarray, cov: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    expected = weights @ mu
+    volatility = np.sqrt(np.einsum("ij,jk,ik->i", weights, cov, weights))
+    return expected, volatility
+
+
+# Best frontier point under a volatility cap, and whether the cap could be met
+def _best_under_cap(
+    weights: np.ndarray, mu: np.ndarray, cov: np.ndarray, max_volatility: float
+) -> Tuple[np.ndarray, bool]:
+    expected, volatility = portfolio_stats(weights, mu, cov)
+    feasible = volatility <= max_volatility
+    if not feasible.any():
+        # Cap unreachable: fall back to the lowest-volatility point
+        return weights[volatility.argmin()], False
+    return weights[np.where(feasible, expected, -np.inf).argmax()], True
+
+
+# Best portfolio of at most n_keep ETFs under the cap, cached with the model
+def _best_subset(
+    model: Dict, frontier: np.ndarray, max_weight: float, max_volatility: float, n_keep: int
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """
+    Truncating the best full-universe point to its largest holdings can push
+    it over the cap (the dropped ETFs were diversifying it), so the top
+    holdings of every frontier point are tried as a subset and re-solved.
+
+    Returns:
+        Selected indices, their weights and whether the cap is met (if no
+        subset meets it, the lowest-volatility one)
+    """
+    key = (max_weight, max_volatility, n_keep)
+    subsets = model.setdefault("subsets", {})
+    if key in subsets:
+        return subsets[key]
+
+    mu, cov = model["mu"], model["cov"]
+    candidates = sorted({tuple(np.sort(np.argsort(row)[::-1][:n_keep])) for row in frontier})
+
+    best = None
+    for candidate in candidates:
+        selected = np.array(candidate)
+        sub_mu, sub_cov = mu[selected], cov[np.ix_(selected, selected)]
+        # Warm start from the full frontier restricted to the kept ETFs
+        sub_frontier = efficient_frontier(sub_mu, sub_cov, max_weight, initial=frontier[:, selected])
+        weights, cap_met = _best_under_cap(sub_frontier, sub_mu, sub_cov, max_volatility)
+        expected, volatility = portfolio_stats(weights[None, :], sub_mu, sub_cov)
+        # Meeting the cap first, then highest return (or lowest volatility if the cap can't be met)
+        score = (cap_met, float(expected[0]) if cap_met else -float(volatility[0]))
+        if best is None or score > best[0]:
+            best = (score, selected, weights, cap_met)
+
+    subsets[key] = best[1:]
+    return subsets[key]
+
+
+# Optimal allocation for a risk profile
+def optimize_portfolio(
+    risk_profile: str = "moderate",
+    lookback_years: int = DEFAULT_LOOKBACK_YEARS,
+    symbols: Optional[List[str]] = None,
+    max_etfs: Optional[int] = None,
+    max_volatility: Optional[float] = None,
+    allow_download: bool = False
+) -> Dict:
+    """
+    Maximize expected return under the profile's volatility cap and ETF limits
+
+    Args:
+        risk_profile: "conservative", "moderate" or "aggressive"
+        lookback_years: Years of history behind the estimates
+        symbols: Candidate ETFs (default: the whole knowledge base)
+        max_etfs / max_volatility: Override the profile's constraints
+
+    Returns:
+        Dict with allocations, expected return, volatility, Sharpe, cap_met
+        (False when no allowed portfolio stays under max_volatility - the
+        reported volatility is then the lowest achievable) and the frontier
+    """
+    if risk_profile not in RISK_PROFILE_CONSTRAINTS:
+        raise ValueError(f"Unknown risk profile: {risk_profile}")
+
+    started = time.perf_counter()
+    constraints = RISK_PROFILE_CONSTRAINTS[risk_profile]
+    max_etfs = max_etfs or constraints["max_etfs"]
+    max_volatility = max_volatility or constraints["max_volatility"]
+    max_weight = max(constraints["max_weight"], 1.0 / max_etfs)
+
+    model = estimate_risk_model(symbols, lookback_years, allow_download)
+    mu, cov = model["mu"], model["cov"]
+
+    frontier = _model_frontier(model, max_weight)
+    best, cap_met = _best_under_cap(frontier, mu, cov, max_volatility)
+
+    # ETF-count and minimum-weight limits: re-solve on the best subset of
+    # at most n_keep ETFs
+    selected = np.arange(len(mu))
+    n_held = np.count_nonzero(best > 1e-4)
+    n_keep = max(1, min(max_etfs, np.count_nonzero(best >= MIN_WEIGHT)))
+    if n_keep < n_held:
+        selected, best, cap_met = _best_subset(model, frontier, max_weight, max_volatility, n_keep)
+
+    weights = np.zeros(len(mu))
+    weights[selected] = best
+
+    expected_return, volatility = portfolio_stats(weights[None, :], mu, cov)
+    expected_return, volatility = float(expected_return[0]), float(volatility[0])
+    frontier_returns, frontier_volatility = portfolio_stats(frontier, mu, cov)
+
+    allocations = []
+    for i in np.argsort(weights)[::-1]:
+        if weights[i] < 1e-4:
+            break
+        symbol = model["symbols"][i]
+        info = ETF_KNOWLEDGE_BASE.get(symbol, {})
+        allocations.append({
+            "etf": symbol,
+            "etf_name": info.get("name", symbol),
+            "category": info.get("category"),
+            "percentage": round(float(weights[i]) * 100, 1),
+        })
+
+    return {
+        "risk_profile": risk_profile,
+        "allocations": allocations,
+        "expected_return": round(expected_return, 4),
+        "volatility": round(volatility, 4),
+        "sharpe": round((expected_return - RISK_FREE_RATE) / volatility, 3) if volatility > 0 else None,
+        "cap_met": cap_met,
+        "constraints": {"max_volatility": max_volatility, "max_etfs": max_etfs, "max_weight": max_weight},
+        "frontier": [
+            {"volatility": round(float(v), 4), "expected_return": round(float(r), 4)}
+            for v, r in zip(frontier_volatility, frontier_returns)
+        ],
+        "model": {
+            "lookback_years": lookback_years,
+            "start": model["start"],
+            "end": model["end"],
+            "universe": len(model["symbols"]),
+            "shrinkage": model["shrinkage"],
+        },
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    lookback = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LOOKBACK_YEARS
+
+    # First call downloads missing bars and fills the covariance cache
+    estimate_risk_model(lookback_years=lookback, allow_download=True)
+
+    for profile in RISK_PROFILE_CONSTRAINTS:
+        result = optimize_portfolio(profile, lookback)
+        holdings = ", ".join(f"{a['etf']} {a['percentage']}%" for a in result["allocations"])
+        cap = "" if result["cap_met"] else " (over cap)"
+        print(f"{profile:<13} return {result['expected_return']:.2%}  vol {result['volatility']:.2%}{cap}  "
+              f"({result['elapsed_ms']} ms)  {holdings}")
@@ -0,0 +1,402 @@
+"""
+Order Planner
+Month-by-month share purchases that track a target allocation under a
+platform's order rules (fractional shares, order minimums, commissions)
+
+calculate_portfolio reports fractional shares_per_month, but on whole-share
+platforms 150 AZN a month can't buy one SPY share. The planner carries cash
+between months and, each month, picks integer share counts that leave the
+portfolio closest to target:
+
+    1. Route the month's cash to the most underweight ETFs (water filling),
+       giving ideal fractional share counts x
+    2. Bound the search around them: each ETF buys floor(x) - 1, floor(x)
+       or floor(x) + 1 shares
+    3. Score every combination at once (tracking error plus fees), drop the
+       ones that break the budget or order minimum, keep the best
+    4. Polish with single-share moves while any of them lowers the score
+
+Step 3 is one array operation over at most 3^6 = 729 candidates, so a
+month takes well under a millisecond. Fractional platforms skip the share
+rounding but still choose which ETFs get an order: each subset of the most
+underweight ones is water-filled with the cash left after its fees and
+scored the same way, so a small deposit isn't split into several orders
+that each pay a minimum fee. Prices are held at today's quotes for
+the whole schedule.
+"""
+
+import argparse
+import itertools
+import json
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from financial_api import get_stock_price
+from fx import get_rate
+from investment_logic import BASE_CURRENCY
+from investment_platforms import PLATFORM_TRADING_RULES, DEFAULT_TRADING_RULES
+from rebalancing import route_contributions, _user_targets
+
+# ETFs whose share counts are searched (the rest keep floor(x))
+MAX_SEARCHED_ETFS = 6
+
+# Weight of fees (as a fraction of the portfolio) against squared tracking error
+FEE_PENALTY = 1.0
+
+# One-share moves tried after the bounded search
+MAX_POLISH_STEPS = 20
+
+# Longest schedule the planner will build
+MAX_MONTHS = 600
+
+
+# Share-count offsets tried around floor(x): (3^k x k)
+def _offsets(k: int) -> np.ndarray:
+    return np.array(list(itertools.product((-1, 0, 1), repeat=k)), dtype=np.float64).reshape(-1, k)
+
+
+# Every order / no-order choice for k ETFs: (2^k x k)
+def _subsets(k: int) -> np.ndarray:
+    return np.array(list(itertools.product((False, True), repeat=k)), dtype=bool).reshape(-1, k)
+
+
+# Order fees for candidate share counts: (C x N) -> (C x N)
+def order_fees(shares: np.ndarray, prices: np.ndarray, rules: Dict) -> np.ndarray:
+    """
+    Fee of each ETF's order: max(min_fee, fixed + per_share * n + pct * amount),
+    and nothing where no order is placed
+    """
+    amount = shares * prices
+    fees = rules["fee_fixed_usd"] + rules["fee_per_share_usd"] * shares + rules["fee_pct"] * amount
+    fees = np.maximum(fees, rules["min_fee_usd"])
+    return np.where(shares > 0, fees, 0.0)
+
+
+# Best whole-share purchase for one month
+def plan_whole_shares(values: np.ndarray, cash: float, prices: np.ndarray,
+                      target_weights: np.ndarray, rules: Dict) -> np.ndarray:
+    """
+    Args:
+        values: (N,) USD value held per ETF
+        cash: USD available this month
+        prices: (N,) USD prices
+        target_weights: (N,) target weights summing to 1
+        rules: Platform trading rules
+
+    Returns:
+        (N,) whole shares to buy
+    """
+    total = values.sum() + cash
+    shortfall = target_weights * total - values
+    ideal = route_contributions(shortfall[None, :], np.array([cash]))[0] / prices
+    base = np.floor(ideal)
+
+    # Search the ETFs with the biggest ideal purchases; the rest keep floor(x)
+    searched = np.argsort(-ideal * prices)[:MAX_SEARCHED_ETFS]
+    candidates = np.repeat(base[None, :], 3 ** len(searched), axis=0)
+    candidates[:, searched] += _offsets(len(searched))
+    candidates = np.maximum(candidates, 0.0)
+    candidates = np.vstack([candidates, np.zeros_like(base)])
+
+    scores = _score(candidates, values, cash, prices, target_weights, rules)
+    best, best_score = candidates[np.argmin(scores)], scores.min()
+
+    # Polish: move one share at a time (any ETF +1 or -1) while that helps
+    steps = np.vstack([np.eye(len(prices)), -np.eye(len(prices))])
+    for _ in range(MAX_POLISH_STEPS):
+        moves = np.maximum(best + steps, 0.0)
+        move_scores = _score(moves, values, cash, prices, target_weights, rules)
+        if move_scores.min() >= best_score - 1e-15:
+            break
+        best, best_score = moves[np.argmin(move_scores)], move_scores.min()
+
+    return best
+
+
+# Score candidate purchases (lower is better, inf = not allowed)
+def _score(candidates: np.ndarray, values: np.ndarray, cash: float, prices: np.ndarray,
+           target_weights: np.ndarray, rules: Dict) -> np.ndarray:
+    amounts = candidates * prices
+    fee_total = order_fees(candidates, prices, rules).sum(axis=1)
+    spent = amounts.sum(axis=1) + fee_total
+
+    # Budget and order minimum
+    feasible = spent <= cash + 1e-9
+    feasible &= ~((amounts > 0) & (amounts < rules["min_order_usd"])).any(axis=1)
+
+    # Tracking error after the trade (cash left over counts as underweight) plus fees
+    after = np.maximum(values.sum() + cash - fee_total, 1e-9)
+    gap = (values + amounts - target_weights * after[:, None]) / after[:, None]
+    score = (gap ** 2).sum(axis=1) + FEE_PENALTY * fee_total / after
+    score[~feasible] = np.inf
+    return score
+
+
+# Fractional purchase for one month
+def plan_fractional(values: np.ndarray, cash: float, prices: np.ndarray,
+                    target_weights: np.ndarray, rules: Dict) -> np.ndarray:
+    """
+    Every subset of the most underweight ETFs (buying nothing included)
+    is water-filled with the cash left after its own fees, then scored like
+    the whole-share candidates, so small deposits go into fewer orders
+    instead of paying a minimum fee on each ETF
+
+    Returns:
+        (N,) fractional shares to buy
+    """
+    total = values.sum() + cash
+    shortfall = target_weights * total - values
+    ideal = route_contributions(shortfall[None, :], np.array([cash]))[0]
+
+    # Order / no-order for the ETFs with the biggest ideal buys: (2^k x N)
+    searched = np.argsort(-ideal)[:MAX_SEARCHED_ETFS]
+    masks = np.zeros((2 ** len(searched), len(prices)), dtype=bool)
+    masks[:, searched] = _subsets(len(searched))
+
+    # ETFs left out of a subset sit below any fill level, so they get nothing
+    masked_shortfall = np.where(masks, shortfall, shortfall.min() - cash - 1.0)
+
+    # Shrink each subset's budget by its fees until they fit. Fees only grow
+    # with the amount bought, so every pass lowers the budget of the rows
+    # still over and the loop ends once all of them fit.
+    budgets = np.full(len(masks), float(cash))
+    while True:
+        buys = route_contributions(masked_shortfall, budgets) * masks
+        fees = order_fees(buys / prices, prices, rules).sum(axis=1)
+        over = buys.sum(axis=1) + fees > cash + 1e-9
+        if not over.any():
+            break
+        budgets[over] = np.maximum(cash - fees[over], 0.0)
+
+    candidates = buys / prices
+    scores = _score(candidates, values, cash, prices, target_weights, rules)
+    return candidates[np.argmin(scores)]
+
+
+# Month-by-month orders for a fixed contribution
+def plan_orders(
+    prices: np.ndarray,
+    target_weights: np.ndarray,
+    monthly_usd: float,
+    months: int,
+    rules: Dict,
+    shares: Optional[np.ndarray] = None,
+    cash: float = 0.0
+) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        prices: (N,) USD prices, held for the whole schedule
+        target_weights: (N,) target weights summing to 1
+        monthly_usd: New money each month
+        months: Schedule length
+        rules: Platform trading rules
+        shares: (N,) shares already held
+        cash: USD already waiting to be invested
+
+    Returns:
+        Dict of arrays: buys (months x N shares), fees (months x N USD),
+        cash (months,) left after each month, shares (N,) held at the end
+    """
+    n_etfs = len(prices)
+    shares = np.zeros(n_etfs) if shares is None else shares.astype(np.float64).copy()
+    planner = plan_fractional if rules["fractional"] else plan_whole_shares
+
+    buys = np.zeros((months, n_etfs))
+    fees = np.zeros((months, n_etfs))
+    cash_left = np.zeros(months)
+
+    for month in range(months):
+        cash += monthly_usd
+        bought = planner(shares * prices, cash, prices, target_weights, rules)
+        month_fees = order_fees(bought, prices, rules)
+
+        shares += bought
+        cash -= (bought * prices).sum() + month_fees.sum()
+        buys[month], fees[month], cash_left[month] = bought, month_fees, cash
+
+    return {"buys": buys, "fees": fees, "cash": cash_left, "shares": shares}
+
+
+# Trading rules for a platform name, with optional overrides
+def get_trading_rules(platform: Optional[str] = None, fractional: Optional[bool] = None) -> Dict:
+    if platform and platform not in PLATFORM_TRADING_RULES:
+        raise ValueError(f"Unknown platform: {platform}. Known: {', '.join(PLATFORM_TRADING_RULES)}")
+
+    rules = dict(PLATFORM_TRADING_RULES.get(platform, DEFAULT_TRADING_RULES))
+    if fractional is not None:
+        rules["fractional"] = fractional
+    return rules
+
+
+# Order schedule for one user
+def plan_order_schedule(
+    monthly_investment: float,
+    months: int = 12,
+    platform: Optional[str] = None,
+    currency: str = BASE_CURRENCY,
+    time_horizon_years: Optional[int] = None,
+    risk_profile: Optional[str] = None,
+    goal: str = "general",
+    target_weights: Optional[Dict[str, float]] = None,
+    holdings: Optional[Dict[str, float]] = None,
+    fractional: Optional[bool] = None,
+    prices: Optional[Dict[str, float]] = None
+) -> Dict:
+    """
+    Args:
+        monthly_investment: Money added each month, in currency
+        months: Schedule length
+        platform: Name from PLATFORM_TRADING_RULES (default: whole shares, no fees)
+        currency: Currency of monthly_investment
+        time_horizon_years, risk_profile, goal, target_weights: Target
+            allocation, as in rebalancing
+        holdings: {symbol: shares} already held
+        fractional: Override the platform's fractional-share support
+        prices: {symbol: USD price} to use instead of live quotes
+
+    Returns:
+        Dict with the rules used, one entry per month (orders, fees, cash
+        carried) and the final weights against target
+    """
+    if not 1 <= months <= MAX_MONTHS:
+        raise ValueError(f"months must be between 1 and {MAX_MONTHS}")
+    if monthly_investment < 0:
+        raise ValueError("monthly_investment must not be negative")
+
+    rules = get_trading_rules(platform, fractional)
+    targets = _user_targets({
+        "target_weights": target_weights,
+        "risk_profile": risk_profile,
+        "time_horizon_years": time_horizon_years,
+        "goal": goal,
+    })
+    holdings = {s.upper(): float(q) for s, q in (holdings or {}).items()}
+    symbols = sorted({s.upper() for s in targets} | set(holdings))
+
+    if prices is None:
+        prices = {}
+        for symbol in symbols:
+            price_data = get_stock_price(symbol)
+            if price_data:
+                prices[symbol] = price_data["price"]
+    missing = [s for s in symbols if not prices.get(s)]
+    if missing:
+        raise ValueError(f"No price for {', '.join(missing)}")
+
+    price_vector = np.array([prices[s] for s in symbols], dtype=np.float64)
+    weights = np.array([float(targets.get(s, 0.0)) for s in symbols])
+    weights /= weights.sum()
+    shares = np.array([holdings.get(s, 0.0) for s in symbols])
+
+    fx_rate_usd = get_rate(currency, "USD")
+    monthly_usd = monthly_investment * fx_rate_usd
+    if currency.upper() != "USD":
+        # The platform keeps its spread when the deposit is converted
+        monthly_usd *= 1.0 - rules["fx_spread_pct"]
+    plan = plan_orders(price_vector, weights, monthly_usd, months, rules, shares)
+
+    schedule = []
+    for month in range(months):
+        orders = [
+            {
+                "etf": symbol,
+                "shares": round(float(plan["buys"][month, j]), 4),
+                "price": round(float(price_vector[j]), 2),
+                "cost_usd": round(float(plan["buys"][month, j] * price_vector[j]), 2),
+                "fee_usd": round(float(plan["fees"][month, j]), 2),
+            }
+            for j, symbol in enumerate(symbols) if plan["buys"][month, j] > 0
+        ]
+        schedule.append({
+            "month": month + 1,
+            "orders": orders,
+            "fees_usd": round(float(plan["fees"][month].sum()), 2),
+            "cash_carried_usd": round(float(plan["cash"][month]), 2),
+        })
+
+    values = plan["shares"] * price_vector
+    cash = float(plan["cash"][-1])
+    total = values.sum() + cash
+    final_weights = values / total if total > 0 else np.zeros_like(values)
+    gap = final_weights - weights
+    contributed = monthly_usd * months
+
+    return {
+        "platform": platform,
+        "rules": rules,
+        "currency": currency.upper(),
+        "fx_rate_usd": round(fx_rate_usd, 6),
+        "monthly_investment_usd": round(monthly_usd, 2),
+        "months": months,
+        "schedule": schedule,
+        "final": {
+            "positions": [
+                {
+                    "etf": symbol,
+                    "shares": round(float(plan["shares"][j]), 4),
+                    "value_usd": round(float(values[j]), 2),
+                    "weight": round(float(final_weights[j]) * 100, 2),
+                    "target_weight": round(float(weights[j]) * 100, 2),
+                }
+                for j, symbol in enumerate(symbols)
+            ],
+            "cash_usd": round(cash, 2),
+            "total_fees_usd": round(float(plan["fees"].sum()), 2),
+            "fees_pct_of_contributions": round(float(plan["fees"].sum()) / contributed * 100, 3) if contributed > 0 else 0.0,
+            "max_weight_gap": round(float(np.abs(gap).max()) * 100, 2),
+            "tracking_error": round(float(np.sqrt((gap ** 2).sum())) * 100, 2),
+            "months_without_orders": int((plan["buys"].sum(axis=1) == 0).sum()),
+        },
+    }
+
+
+# Time the planner over many random budgets
+def benchmark(n_plans: int = 1000, months: int = 24, seed: int = 0) -> Dict:
+    rng = np.random.default_rng(seed)
+    prices = np.array([500.0, 72.0, 230.0, 48.0])
+    weights = np.array([0.5, 0.25, 0.15, 0.10])
+    budgets = rng.uniform(50, 2000, n_plans)
+
+    results = {}
+    for name, rules in [("whole_shares", get_trading_rules("Saxo Bank")),
+                        ("fractional", get_trading_rules("Interactive Brokers"))]:
+        started = time.perf_counter()
+        gaps = []
+        for budget in budgets:
+            plan = plan_orders(prices, weights, budget, months, rules)
+            values = plan["shares"] * prices
+            total = values.sum() + plan["cash"][-1]
+            gaps.append(np.abs(values / total - weights).max())
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "plans": n_plans,
+            "months": months,
+            "seconds": round(elapsed, 3),
+            "ms_per_month": round(elapsed / (n_plans * months) * 1000, 4),
+            "median_max_weight_gap": round(float(np.median(gaps)) * 100, 2),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Whole/fractional share order planner")
+    parser.add_argument("--monthly", type=float, default=200.0, help="Monthly investment")
+    parser.add_argument("--currency", default=BASE_CURRENCY)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--platform", default=None, choices=list(PLATFORM_TRADING_RULES))
+    parser.add_argument("--horizon", type=int, default=10, help="Time horizon in years")
+    parser.add_argument("--benchmark", type=int, default=0, metavar="N", help="Time N random plans instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print("⏱️ Order planner benchmark")
+        print(json.dumps(benchmark(args.benchmark, args.months), indent=2))
+    else:
+        result = plan_order_schedule(args.monthly, args.months, args.platform, args.currency,
+                                     time_horizon_years=args.horizon)
+        for month in result["schedule"]:
+            orders = ", ".join(f"{o['shares']:g} {o['etf']}" for o in month["orders"]) or "wait"
+            print(f"Month {month['month']:>3}: {orders} (cash ${month['cash_carried_usd']:,.2f})")
+        print(json.dumps(result["final"], indent=2))
@@ -0,0 +1,173 @@
+"""
+Historical Price Bars
+Local cache of daily ETF bars used by projections, backtests and charts
+
+Daily adjusted closes are downloaded once with yfinance and kept as compact
+.npz files (one per symbol), then served from memory. Everything that needs
+history - Monte Carlo parameters, backtests, covariance estimates - reads it
+from here instead of calling Yahoo inside a request.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Where bar files live and how old they may get before a refresh
+BARS_DIR = os.getenv("PRICE_HISTORY_DIR", "./data/bars")
+BARS_MAX_AGE_HOURS = float(os.getenv("PRICE_HISTORY_MAX_AGE_HOURS", "24"))
+
+# In-memory copy of loaded bars: symbol -> {"dates", "close", "volume", "loaded_at"}
+_bars_cache: Dict[str, Dict] = {}
+_bars_lock = threading.Lock()
+
+
+# Path of the bar file for a symbol
+def _bars_path(symbol: str) -> str:
+    return os.path.join(BARS_DIR, f"{symbol.upper()}.npz")
+
+
+# Download full daily history from Yahoo Finance
+def _download_bars(symbol: str) -> Optional[Dict[str, np.ndarray]]:
+    try:
+        import yfinance as yf
+
+        history = yf.Ticker(symbol).history(period="max", auto_adjust=True)
+        if history.empty:
+            return None
+
+        dates = history.index.tz_localize(None).values.astype("datetime64[D]")
+        return {
+            "dates": dates,
+            "close": history["Close"].to_numpy(dtype=np.float64),
+            "volume": history["Volume"].to_numpy(dtype=np.float64) if "Volume" in history else np.zeros(len(dates)),
+        }
+    except Exception as e:
+        print(f"Price history download error for {symbol}: {e}")
+        return None
+
+
+# Save bars atomically so readers never see a partial file
+def _save_bars(symbol: str, bars: Dict[str, np.ndarray]):
+    os.makedirs(BARS_DIR, exist_ok=True)
+    path = _bars_path(symbol)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, dates=bars["dates"], close=bars["close"], volume=bars["volume"])
+    os.replace(tmp_path, path)
+
+
+# Load bars from disk
+def _load_bars(symbol: str) -> Optional[Dict[str, np.ndarray]]:
+    path = _bars_path(symbol)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {"dates": data["dates"], "close": data["close"], "volume": data["volume"]}
+
+
+# Get daily bars for a symbol (memory -> disk -> download)
+def get_daily_bars(symbol: str, refresh: bool = False, allow_download: bool = True) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Get daily adjusted closes for a symbol
+
+    Args:
+        symbol: ETF symbol
+        refresh: Force a new download
+        allow_download: False = only use bars already on disk (request paths)
+
+    Returns:
+        Dict with "dates" (datetime64[D]), "close" and "volume" arrays, or None
+    """
+    symbol = symbol.upper()
+    max_age = BARS_MAX_AGE_HOURS * 3600
+
+    cached = _bars_cache.get(symbol)
+    if cached and not refresh and time.time() - cached["loaded_at"] < max_age:
+        return cached
+
+    with _bars_lock:
+        bars = None
+        path = _bars_path(symbol)
+        is_fresh = os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+
+        if not refresh and (is_fresh or not allow_download):
+            bars = _load_bars(symbol)
+
+        if bars is None and allow_download:
+            print(f"Downloading price history for {symbol}...")
+            bars = _download_bars(symbol)
+            if bars is not None:
+                _save_bars(symbol, bars)
+            else:
+                # Fall back to stale bars rather than nothing
+                bars = _load_bars(symbol)
+
+        if bars is None:
+            return None
+
+        bars["loaded_at"] = time.time()
+        _bars_cache[symbol] = bars
+        return bars
+
+
+# Refresh bars for many symbols (nightly job / startup warm-up)
+def refresh_bars(symbols: List[str]) -> Dict[str, int]:
+    counts = {}
+    for symbol in symbols:
+        bars = get_daily_bars(symbol, refresh=True)
+        counts[symbol] = len(bars["close"]) if bars else 0
+    return counts
+
+
+# Month-end closes aligned across symbols
+def get_monthly_closes(symbols: List[str], years: Optional[int] = None,
+                       allow_download: bool = True) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Returns:
+        Dict with "months" (datetime64[M], shape T) and "closes" (T x N),
+        covering only months where every symbol has data, or None
+    """
+    series = []
+    for symbol in symbols:
+        bars = get_daily_bars(symbol, allow_download=allow_download)
+        if bars is None or len(bars["close"]) == 0:
+            return None
+
+        months = bars["dates"].astype("datetime64[M]")
+        # Last trading day of each month: where the next bar is in a later month
+        is_month_end = np.append(months[1:] != months[:-1], True)
+        series.append((months[is_month_end], bars["close"][is_month_end]))
+
+    common = series[0][0]
+    for months, _ in series[1:]:
+        common = np.intersect1d(common, months)
+
+    if years:
+        common = common[-(years * 12 + 1):]
+    if len(common) < 2:
+        return None
+
+    closes = np.column_stack([
+        closes[np.searchsorted(months, common)] for months, closes in series
+    ])
+    return {"months": common, "closes": closes}
+
+
+# Simple monthly returns aligned across symbols
+def get_monthly_returns(symbols: List[str], years: Optional[int] = None,
+                        allow_download: bool = True) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Returns:
+        Dict with "months" (T) and "returns" (T x N simple returns), or None
+    """
+    monthly = get_monthly_closes(symbols, years=years, allow_download=allow_download)
+    if monthly is None:
+        return None
+
+    closes = monthly["closes"]
+    return {
+        "months": monthly["months"][1:],
+        "returns": closes[1:] / closes[:-1] - 1.0
+    }
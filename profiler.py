@@ -0,0 +1,313 @@
+"""
+Sampling Profiler
+Opt-in, low-overhead stack sampling of the running backend process
+
+A background thread reads every thread's current stack (sys._current_frames)
+every few milliseconds and counts identical stacks. Frames are named
+module:function, so time in torch, yfinance (`ticker.info`), pandas
+(`history()`) or our own prompt building shows up by name. Profiles render
+as folded stacks ("a;b;c 42" per line), the input format of flamegraph.pl,
+speedscope and most flame graph viewers, or as a top-functions summary.
+
+Three triggers, all off unless configured:
+
+    POST /admin/profile      - time-boxed profile of the whole process
+                               (X-Admin-Token must match ADMIN_TOKEN)
+    kill -USR2 <pid>         - same, written to PROFILE_DIR
+                               (PROFILER_SIGNAL_ENABLED=1)
+    X-Profile: 1 header      - profile one request (with the admin token),
+                               or PROFILE_SAMPLE_RATE=0.01 for 1% of requests;
+                               the response carries X-Profile-Id
+
+Per-request profiles sample every thread while the request runs, so other
+requests running at the same time show up in them too. Sampling stops when
+the response headers are sent, so the body of a streaming response isn't
+covered - the backend skips its streaming routes.
+"""
+
+import hmac
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Default time between samples
+DEFAULT_INTERVAL_MS = 5.0
+
+# Limits for the admin endpoint
+MAX_PROFILE_SECONDS = 120
+MIN_INTERVAL_MS = 1.0
+
+PROFILER_THREAD_NAME = "sampling-profiler"
+
+# Deepest stack kept per sample (innermost frames win)
+MAX_STACK_DEPTH = 128
+
+# Shared secret for admin endpoints (unset = admin endpoints disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Fraction of requests profiled without a header
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Per-request profiles running at once (more are skipped) and kept for retrieval
+MAX_ACTIVE_REQUEST_PROFILES = 4
+MAX_STORED_PROFILES = 200
+
+# SIGUSR2 profiles: opt-in, duration and output directory
+PROFILER_SIGNAL_ENABLED = os.getenv("PROFILER_SIGNAL_ENABLED", "0") == "1"
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "30"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+
+
+# Frame label: module:function
+def _frame_name(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_name}"
+
+
+# Root-first stack of one frame, joined for folded output
+def _fold(frame) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Counts the stacks of every other thread at a fixed interval"""
+
+    def __init__(self, interval_ms: float = DEFAULT_INTERVAL_MS, exclude_threads=()):
+        self.interval = max(interval_ms, MIN_INTERVAL_MS) / 1000
+        self.exclude_threads = set(exclude_threads)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.seconds = 0.0
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        next_sample = time.perf_counter()
+        while not self._stop.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self.exclude_threads:
+                    continue
+                if thread_id not in thread_names:
+                    thread_names = {t.ident: t.name for t in threading.enumerate()}
+                name = thread_names.get(thread_id, thread_id)
+                # Other profilers are overhead, not workload
+                if name == PROFILER_THREAD_NAME:
+                    continue
+                self.stacks[f"{name};{_fold(frame)}"] += 1
+            self.samples += 1
+
+            # Fixed schedule; skip missed ticks instead of bursting
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay < 0:
+                next_sample = time.perf_counter()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=PROFILER_THREAD_NAME, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self._started
+        return self
+
+    # Folded stacks, most frequent first
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    # Functions by self time (innermost frame) and total time (anywhere on the stack)
+    def summary(self, top: int = 30) -> Dict:
+        self_counts, total_counts = Counter(), Counter()
+        total = sum(self.stacks.values())
+        for stack, count in self.stacks.items():
+            # First element is the thread name
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for name in set(frames):
+                total_counts[name] += count
+
+        def rows(counts: Counter) -> List[Dict]:
+            return [
+                {"function": name, "samples": count, "percent": round(count / total * 100, 2)}
+                for name, count in counts.most_common(top)
+            ]
+
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "seconds": round(self.seconds, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stack_samples": total,
+            "self": rows(self_counts),
+            "total": rows(total_counts),
+        }
+
+
+# One whole-process profile at a time
+_process_lock = threading.Lock()
+
+
+# Profile the whole process for a fixed time (blocks the calling thread)
+def profile_process(seconds: float, interval_ms: float = DEFAULT_INTERVAL_MS) -> SamplingProfiler:
+    """
+    Raises:
+        ValueError: seconds out of range
+        RuntimeError: another process profile is already running
+    """
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    if not _process_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        # The caller only sleeps - leave it out
+        profiler = SamplingProfiler(interval_ms, exclude_threads={threading.get_ident()}).start()
+        time.sleep(seconds)
+        return profiler.stop()
+    finally:
+        _process_lock.release()
+
+
+# Write a profile to PROFILE_DIR as folded stacks
+def save_profile(profiler: SamplingProfiler, label: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"profile-{label}-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}.folded")
+    with open(path, "w") as f:
+        f.write(profiler.folded())
+    return path
+
+
+# SIGUSR2: profile in the background, write to PROFILE_DIR
+def _on_signal(signum, frame):
+    def run():
+        try:
+            profiler = profile_process(PROFILE_SIGNAL_SECONDS)
+            print(f"🔥 Profile written to {save_profile(profiler, 'signal')}")
+        except (RuntimeError, ValueError) as e:
+            print(f"⚠️ Signal profile skipped: {e}")
+
+    threading.Thread(target=run, name="signal-profile", daemon=True).start()
+
+
+# Install the SIGUSR2 handler (main thread only) when enabled
+def install_signal_handler() -> bool:
+    if not PROFILER_SIGNAL_ENABLED or not hasattr(signal, "SIGUSR2"):
+        return False
+    try:
+        signal.signal(signal.SIGUSR2, _on_signal)
+    except ValueError:
+        # Not the main thread
+        return False
+    print(f"🔥 SIGUSR2 profiling enabled (pid {os.getpid()}, {PROFILE_SIGNAL_SECONDS:g}s)")
+    return True
+
+
+# Recent per-request profiles: id -> {"route", "method", "profile"}
+_request_profiles: "OrderedDict[str, Dict]" = OrderedDict()
+_request_lock = threading.Lock()
+_active_request_profiles = 0
+
+
+# Admin token check (constant time); False when admin endpoints are disabled
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# Should this request be profiled? (header with admin token, or random sample)
+def should_profile_request(profile_header: Optional[str], admin_token: Optional[str]) -> bool:
+    if profile_header == "1" and is_admin(admin_token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+# Start a per-request profile (None when too many are already running)
+def start_request_profile(interval_ms: float = DEFAULT_INTERVAL_MS) -> Optional[SamplingProfiler]:
+    global _active_request_profiles
+    with _request_lock:
+        if _active_request_profiles >= MAX_ACTIVE_REQUEST_PROFILES:
+            return None
+        _active_request_profiles += 1
+    return SamplingProfiler(interval_ms).start()
+
+
+# Stop a per-request profile and keep it for /admin/profiles
+def finish_request_profile(profiler: SamplingProfiler, method: str, route: str, status: int) -> str:
+    global _active_request_profiles
+    profiler.stop()
+    profile_id = uuid.uuid4().hex[:16]
+    with _request_lock:
+        _active_request_profiles -= 1
+        _request_profiles[profile_id] = {"method": method, "route": route, "status": status, "profile": profiler}
+        while len(_request_profiles) > MAX_STORED_PROFILES:
+            _request_profiles.popitem(last=False)
+    return profile_id
+
+
+# Stored request profiles, newest first
+def list_request_profiles(route: Optional[str] = None) -> List[Dict]:
+    with _request_lock:
+        items = list(_request_profiles.items())
+    return [
+        {"id": profile_id, "method": entry["method"], "route": entry["route"], "status": entry["status"],
+         "started_at": entry["profile"].started_at.isoformat(timespec="seconds"),
+         "ms": round(entry["profile"].seconds * 1000, 1), "samples": entry["profile"].samples}
+        for profile_id, entry in reversed(items)
+        if route is None or entry["route"] == route
+    ]
+
+
+# One stored profile, or all profiles of a route merged into one
+def get_request_profile(profile_id: Optional[str] = None, route: Optional[str] = None) -> Optional[SamplingProfiler]:
+    with _request_lock:
+        if profile_id is not None:
+            entry = _request_profiles.get(profile_id)
+            return entry["profile"] if entry else None
+        matches = [e["profile"] for e in _request_profiles.values() if route is None or e["route"] == route]
+    if not matches:
+        return None
+
+    merged = SamplingProfiler(matches[0].interval * 1000)
+    for profiler in matches:
+        merged.stacks.update(profiler.stacks)
+        merged.samples += profiler.samples
+        merged.seconds += profiler.seconds
+    merged.started_at = min(p.started_at for p in matches)
+    return merged
+
+
+if __name__ == "__main__":
+    # Profile a busy loop for a second and print the hottest functions
+    import json
+
+    def busy():
+        end = time.time() + 1.2
+        while time.time() < end:
+            sum(i * i for i in range(1000))
+
+    worker = threading.Thread(target=busy, name="busy")
+    worker.start()
+    result = profile_process(1.0)
+    worker.join()
+    print(json.dumps(result.summary(top=5), indent=2))
@@ -0,0 +1,250 @@
+"""
+Quote Stream
+One server-side quote refresher fanned out to every subscribed client
+
+Clients subscribe to symbols over WebSocket (/ws/quotes) or Server-Sent
+Events (/stream/quotes). A single refresher task fetches each subscribed
+symbol once per QUOTE_STREAM_REFRESH_SECONDS through get_stock_price (which
+also keeps the poll endpoints' cache warm) and pushes changed quotes to the
+subscribers of that symbol. Upstream calls therefore grow with the number of
+distinct symbols, not with the number of clients. With SHARED_CACHE_PATH set,
+a quote another worker fetched during this interval is reused as well.
+
+Every subscription holds at most one pending quote per symbol: a newer quote
+replaces one the client has not read yet, so rapid changes coalesce into the
+latest value. A client that leaves quotes unread for longer than
+SLOW_CONSUMER_SECONDS is disconnected instead of buffering without bound.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+import shared_cache
+from financial_api import get_stock_price
+from telemetry import Counter, Gauge
+
+# Seconds between upstream refreshes of each subscribed symbol
+QUOTE_STREAM_REFRESH_SECONDS = float(os.getenv("QUOTE_STREAM_REFRESH_SECONDS", "60"))
+
+# Unread quotes older than this get the client disconnected
+SLOW_CONSUMER_SECONDS = float(os.getenv("QUOTE_STREAM_SLOW_CONSUMER_SECONDS", "30"))
+
+# Keep-alive for idle connections (proxies close silent ones)
+HEARTBEAT_SECONDS = 15
+
+MAX_SYMBOLS_PER_CLIENT = 20
+MAX_CONCURRENT_FETCHES = 4
+
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9.^=-]{1,12}$")
+
+QUOTE_STREAM_CLIENTS = Gauge("investbuddy_quote_stream_clients", "Connected quote stream clients")
+QUOTE_STREAM_SYMBOLS = Gauge("investbuddy_quote_stream_symbols", "Symbols with at least one subscriber")
+QUOTE_STREAM_PUSHES = Counter("investbuddy_quote_stream_pushes_total", "Quote batches sent to clients")
+QUOTE_STREAM_DROPS = Counter(
+    "investbuddy_quote_stream_drops_total", "Clients disconnected by the server", ["reason"]
+)
+
+
+# Upper-case, de-duplicated, validated symbols
+def parse_symbols(symbols: Iterable[str]) -> List[str]:
+    result = []
+    for symbol in symbols:
+        symbol = symbol.strip().upper()
+        if not symbol or symbol in result:
+            continue
+        if not SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f"Invalid symbol: {symbol}")
+        result.append(symbol)
+    return result
+
+
+class Subscription:
+    """One client: its symbols and the latest unread quote of each"""
+
+    def __init__(self):
+        self.symbols: Set[str] = set()
+        self.pending: Dict[str, Dict] = {}
+        self.pending_since: Optional[float] = None
+        self.closed_reason: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    # Queue a quote, replacing an unread one for the same symbol
+    def offer(self, symbol: str, quote: Dict):
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending[symbol] = quote
+        self._ready.set()
+
+    def close(self, reason: str):
+        self.closed_reason = reason
+        self._ready.set()
+
+    # Next batch of quotes ({} after a heartbeat interval with no updates)
+    async def next_batch(self, timeout: float = HEARTBEAT_SECONDS) -> Dict[str, Dict]:
+        """
+        Raises:
+            ConnectionError: the hub closed this subscription
+        """
+        if not self.pending and self.closed_reason is None:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.closed_reason is not None:
+            raise ConnectionError(self.closed_reason)
+        batch, self.pending, self.pending_since = self.pending, {}, None
+        self._ready.clear()
+        return batch
+
+
+class QuoteHub:
+    """Symbol -> subscribers, the last quote per symbol and the refresher loop"""
+
+    def __init__(self, refresh_seconds: float = QUOTE_STREAM_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self.subscriptions: Set[Subscription] = set()
+        self.last_quotes: Dict[str, Dict] = {}
+        self.last_fetched: Dict[str, float] = {}
+        self._wake = asyncio.Event()
+
+    def connect(self) -> Subscription:
+        subscription = Subscription()
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def disconnect(self, subscription: Subscription):
+        self.unsubscribe(subscription, list(subscription.symbols))
+        self.subscriptions.discard(subscription)
+
+    # Add symbols; known quotes are sent right away, new symbols fetched on the next tick
+    def subscribe(self, subscription: Subscription, symbols: List[str]):
+        if len(subscription.symbols | set(symbols)) > MAX_SYMBOLS_PER_CLIENT:
+            raise ValueError(f"At most {MAX_SYMBOLS_PER_CLIENT} symbols per connection")
+        for symbol in symbols:
+            subscription.symbols.add(symbol)
+            if symbol not in self.subscribers:
+                self.subscribers[symbol] = set()
+                self._wake.set()
+            self.subscribers[symbol].add(subscription)
+            if symbol in self.last_quotes:
+                subscription.offer(symbol, self.last_quotes[symbol])
+
+    def unsubscribe(self, subscription: Subscription, symbols: List[str]):
+        for symbol in symbols:
+            subscription.symbols.discard(symbol)
+            subscription.pending.pop(symbol, None)
+            subscribers = self.subscribers.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    # Nobody watches it any more: stop fetching it
+                    del self.subscribers[symbol]
+                    self.last_fetched.pop(symbol, None)
+
+    # Fan a quote out to the symbol's subscribers (unchanged quotes are skipped)
+    def publish(self, symbol: str, quote: Dict):
+        previous = self.last_quotes.get(symbol)
+        self.last_quotes[symbol] = quote
+        if previous and (previous.get("price"), previous.get("change_percent")) == \
+                (quote.get("price"), quote.get("change_percent")):
+            return
+
+        now = time.monotonic()
+        for subscription in list(self.subscribers.get(symbol, ())):
+            if subscription.pending_since is not None and now - subscription.pending_since > SLOW_CONSUMER_SECONDS:
+                QUOTE_STREAM_DROPS.inc(reason="slow_consumer")
+                subscription.close("slow consumer")
+                self.disconnect(subscription)
+                continue
+            subscription.offer(symbol, quote)
+
+    # One upstream lookup (shared cache first, so workers don't fetch the same symbol)
+    def _fetch(self, symbol: str) -> Optional[Dict]:
+        quote = shared_cache.get("quotes", symbol, self.refresh_seconds)
+        if quote:
+            return quote
+        return get_stock_price(symbol, use_cache=False)
+
+    # Fetch every subscribed symbol that is due, a few at a time
+    async def refresh_due(self):
+        now = time.monotonic()
+        due = [s for s in self.subscribers if now - self.last_fetched.get(s, float("-inf")) >= self.refresh_seconds]
+        if not due:
+            return
+        limit = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+        async def refresh(symbol: str):
+            async with limit:
+                self.last_fetched[symbol] = time.monotonic()
+                try:
+                    quote = await asyncio.to_thread(self._fetch, symbol)
+                except Exception as e:
+                    print(f"⚠️ Quote stream refresh failed for {symbol}: {e}")
+                    return
+            if quote and symbol in self.subscribers:
+                self.publish(symbol, quote)
+
+        await asyncio.gather(*(refresh(symbol) for symbol in due))
+
+    # Refresher loop (runs for the life of the app)
+    async def run(self):
+        print(f"📡 Quote stream refresher started (every {self.refresh_seconds:g}s per symbol)")
+        while True:
+            await self.refresh_due()
+            # Wake early when a new symbol is subscribed
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), min(self.refresh_seconds, HEARTBEAT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+
+# Apply a client command: {"action": "subscribe" | "unsubscribe", "symbols": [...]}
+def handle_command(hub: QuoteHub, subscription: Subscription, text: str) -> Dict:
+    """
+    Returns:
+        Reply for the client (the subscribed symbols, or an error)
+    """
+    try:
+        command = json.loads(text)
+        action = command.get("action")
+        symbols = command.get("symbols") or []
+        # A bare string would be split into letters
+        if not isinstance(symbols, list):
+            raise ValueError("symbols must be a list")
+        symbols = parse_symbols(symbols)
+        if action == "subscribe":
+            hub.subscribe(subscription, symbols)
+        elif action == "unsubscribe":
+            hub.unsubscribe(subscription, symbols)
+        else:
+            raise ValueError("action must be subscribe or unsubscribe")
+    except (ValueError, AttributeError, TypeError) as e:
+        return {"type": "error", "detail": str(e)}
+    return {"type": "subscribed", "symbols": sorted(subscription.symbols)}
+
+
+# Server-Sent Events for one subscription (disconnects it when the client goes away)
+async def iter_sse_events(hub: QuoteHub, subscription: Subscription) -> AsyncIterator[str]:
+    try:
+        while True:
+            batch = await subscription.next_batch()
+            if batch:
+                QUOTE_STREAM_PUSHES.inc()
+                yield f"event: quotes\ndata: {json.dumps(batch, default=str)}\n\n"
+            else:
+                yield ": heartbeat\n\n"
+    except ConnectionError as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    finally:
+        hub.disconnect(subscription)
+
+
+quote_hub = QuoteHub()
+QUOTE_STREAM_CLIENTS.track(lambda: len(quote_hub.subscriptions))
+QUOTE_STREAM_SYMBOLS.track(lambda: len(quote_hub.subscribers))
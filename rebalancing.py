@@ -0,0 +1,282 @@
+"""
+Rebalancing Calculator
+Holdings-aware trade planning: drift from target weights, contribution
+routing and optional sells
+
+All users are planned in one pass: holdings become a (users x ETFs) share
+matrix, valued with one price vector, and every step after that is a matrix
+operation. New money goes to the most underweight ETFs first ("water
+filling" - the buys that bring the portfolio closest to target), and sells
+are only planned when a user allows them and drift is past the band.
+"""
+
+import argparse
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from financial_api import get_stock_price
+from fx import get_usd_rates
+from allocation_tables import lookup_allocation
+from investment_logic import BASE_CURRENCY, RISK_PROFILES, determine_risk_profile, get_profile_weights
+
+# Rebalance with sells only when some ETF is this far off target (weight points)
+DRIFT_BAND = 0.05
+
+# Trades smaller than this (USD) are not worth placing
+MIN_TRADE_USD = 1.0
+
+# User fields that decide the target allocation
+TARGET_FIELDS = ("target_weights", "risk_profile", "time_horizon_years", "goal")
+
+
+# Route cash to the most underweight positions
+def route_contributions(shortfall: np.ndarray, cash: np.ndarray) -> np.ndarray:
+    """
+    Buys b >= 0 with sum(b) = cash minimizing ||shortfall - b||, per row
+
+    The answer is b = max(shortfall - tau, 0): fill the largest shortfalls
+    down to a common level tau, found with one sort per row.
+
+    Args:
+        shortfall: (U x N) target value minus current value
+        cash: (U,) money to invest
+
+    Returns:
+        (U x N) buy amounts
+    """
+    ordered = -np.sort(-shortfall, axis=1)
+    cumulative = np.cumsum(ordered, axis=1) - cash[:, None]
+    counts = np.arange(1, shortfall.shape[1] + 1)
+
+    # Largest k whose k-th shortfall is still above the level
+    active = ordered - cumulative / counts > 0
+    k = np.maximum(active.sum(axis=1), 1)
+    tau = cumulative[np.arange(len(cash)), k - 1] / k
+
+    buys = np.maximum(shortfall - tau[:, None], 0.0)
+    buys[cash <= 0] = 0.0
+    return buys
+
+
+# Plan trades for many users at once
+def plan_rebalance(
+    shares: np.ndarray,
+    prices: np.ndarray,
+    target_weights: np.ndarray,
+    contributions: np.ndarray,
+    allow_sells: np.ndarray,
+    drift_band: float = DRIFT_BAND
+) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        shares: (U x N) shares held
+        prices: (N,) USD prices
+        target_weights: (U x N) target weights, rows summing to 1
+        contributions: (U,) new money in USD
+        allow_sells: (U,) whether sells may be planned
+        drift_band: Max drift before a full rebalance with sells
+
+    Returns:
+        Dict of arrays: values, current_weights, drift, max_drift,
+        rebalanced (sells used), trades (USD, + buy / - sell), new_weights
+    """
+    values = shares * prices
+    invested = values.sum(axis=1)
+    current_weights = np.divide(values, invested[:, None], out=np.zeros_like(values),
+                                where=invested[:, None] > 0)
+
+    drift = np.where(invested[:, None] > 0, current_weights - target_weights, 0.0)
+    max_drift = np.abs(drift).max(axis=1)
+
+    total = invested + contributions
+    shortfall = target_weights * total[:, None] - values
+
+    # Buys only: route the contribution; full rebalance where sells are allowed and needed
+    trades = route_contributions(shortfall, contributions)
+    rebalanced = allow_sells & (max_drift > drift_band)
+    trades[rebalanced] = shortfall[rebalanced]
+
+    # Drop dust trades (the cash they would have used stays uninvested)
+    trades[np.abs(trades) < MIN_TRADE_USD] = 0.0
+
+    new_values = values + trades
+    new_total = new_values.sum(axis=1)
+    new_weights = np.divide(new_values, new_total[:, None], out=np.zeros_like(new_values),
+                            where=new_total[:, None] > 0)
+
+    return {
+        "values": values,
+        "current_weights": current_weights,
+        "drift": drift,
+        "max_drift": max_drift,
+        "rebalanced": rebalanced,
+        "trades": trades,
+        "new_weights": new_weights,
+    }
+
+
+# Target weights {symbol: percentage} for a user
+def _user_targets(user: Dict) -> Dict[str, float]:
+    if user.get("target_weights"):
+        targets = user["target_weights"]
+        for symbol, weight in targets.items():
+            if not isinstance(weight, (int, float)) or not np.isfinite(weight) or weight < 0:
+                raise ValueError(f"Invalid target weight for {symbol}: {weight}")
+        if sum(targets.values()) <= 0:
+            raise ValueError("target_weights must add up to more than zero")
+        return targets
+
+    horizon = user.get("time_horizon_years")
+    risk_profile = user.get("risk_profile") or determine_risk_profile(int(horizon or 10))
+    if risk_profile not in RISK_PROFILES:
+        raise ValueError(f"Unknown risk profile: {risk_profile}")
+    if horizon:
+        cell = lookup_allocation(int(horizon), risk_profile, user.get("goal", "general"))
+        if cell:
+            return cell["weights"]
+    return get_profile_weights(risk_profile)
+
+
+# Rebalancing plans for a whole user base
+def rebalance_users(users: List[Dict], drift_band: float = DRIFT_BAND,
+                    prices: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Args:
+        users: Dicts with "holdings" ({symbol: shares}), "monthly_contribution"
+            (in "currency", default AZN), "allow_sells", optional "id", and
+            either "target_weights", "risk_profile" or "time_horizon_years"/"goal"
+        drift_band: Drift (weight fraction) that triggers a full rebalance
+        prices: {symbol: USD price} to use instead of live quotes
+
+    Returns:
+        One plan per user, in input order
+    """
+    if not users:
+        return []
+
+    # Users sharing a horizon/profile/goal share a target - look each up once
+    target_cache = {}
+    targets = []
+    for user in users:
+        key = json.dumps([user.get(field) for field in TARGET_FIELDS], sort_keys=True)
+        if key not in target_cache:
+            target_cache[key] = _user_targets(user)
+        targets.append(target_cache[key])
+    symbols = sorted(
+        {s.upper() for t in targets for s in t} |
+        {s.upper() for user in users for s in user.get("holdings", {})}
+    )
+    column = {symbol: j for j, symbol in enumerate(symbols)}
+
+    # One quote per ETF for the whole batch
+    if prices is None:
+        prices = {}
+        for symbol in symbols:
+            price_data = get_stock_price(symbol)
+            if price_data:
+                prices[symbol] = price_data["price"]
+    missing = [s for s in symbols if not prices.get(s)]
+    if missing:
+        raise ValueError(f"No price for {', '.join(missing)}")
+    price_vector = np.array([prices[s] for s in symbols], dtype=np.float64)
+
+    n_users, n_etfs = len(users), len(symbols)
+    shares = np.zeros((n_users, n_etfs))
+    target_weights = np.zeros((n_users, n_etfs))
+    for i, (user, target) in enumerate(zip(users, targets)):
+        for symbol, quantity in user.get("holdings", {}).items():
+            shares[i, column[symbol.upper()]] += float(quantity)
+        for symbol, percentage in target.items():
+            target_weights[i, column[symbol.upper()]] = float(percentage)
+    target_weights /= target_weights.sum(axis=1, keepdims=True)
+
+    # Contributions to USD with one rate table
+    usd_rates = get_usd_rates()["rates"]
+    currencies = [user.get("currency", BASE_CURRENCY).upper() for user in users]
+    unknown = sorted({c for c in currencies if c not in usd_rates})
+    if unknown:
+        raise ValueError(f"No FX rate for {', '.join(unknown)}")
+    local_per_usd = np.array([usd_rates[c] for c in currencies])
+    contributions = np.array([float(user.get("monthly_contribution", 0) or 0) for user in users])
+    contributions_usd = contributions / local_per_usd
+
+    allow_sells = np.array([bool(user.get("allow_sells", False)) for user in users])
+
+    plan = plan_rebalance(shares, price_vector, target_weights, contributions_usd, allow_sells, drift_band)
+
+    # Round whole matrices once, then only index Python lists per user
+    trades_usd = np.abs(plan["trades"])
+    rounded = {
+        "shares": np.round(shares, 4).tolist(),
+        "value_usd": np.round(plan["values"], 2).tolist(),
+        "current_weight": np.round(plan["current_weights"] * 100, 2).tolist(),
+        "target_weight": np.round(target_weights * 100, 2).tolist(),
+        "new_weight": np.round(plan["new_weights"] * 100, 2).tolist(),
+    }
+    trade_usd = np.round(trades_usd, 2).tolist()
+    trade_local = np.round(trades_usd * local_per_usd[:, None], 2).tolist()
+    trade_shares = np.round(trades_usd / price_vector, 4).tolist()
+    is_sell = (plan["trades"] < 0).tolist()
+    has_trade = (plan["trades"] != 0).tolist()
+    is_listed = ((plan["values"] > 0) | (target_weights > 0)).tolist()
+    portfolio_values = np.round(plan["values"].sum(axis=1), 2).tolist()
+    max_drift = np.round(plan["max_drift"], 4).tolist()
+    needs_rebalance = (plan["max_drift"] > drift_band).tolist()
+    rebalanced = plan["rebalanced"].tolist()
+    etf_columns = list(enumerate(symbols))
+
+    results = []
+    for i, user in enumerate(users):
+        trades = [
+            {
+                "etf": symbol,
+                "action": "sell" if is_sell[i][j] else "buy",
+                "amount_usd": trade_usd[i][j],
+                "amount_local": trade_local[i][j],
+                "shares": trade_shares[i][j],
+            }
+            for j, symbol in etf_columns if has_trade[i][j]
+        ]
+        # Sells first (they fund the buys), then the biggest buys
+        trades.sort(key=lambda t: (t["action"] != "sell", -t["amount_usd"]))
+
+        results.append({
+            "id": user.get("id"),
+            "currency": currencies[i],
+            "portfolio_value_usd": portfolio_values[i],
+            "max_drift": max_drift[i],
+            "needs_rebalance": needs_rebalance[i],
+            "rebalanced_with_sells": rebalanced[i],
+            "positions": [
+                {"etf": symbol, **{field: values[i][j] for field, values in rounded.items()}}
+                for j, symbol in etf_columns if is_listed[i][j]
+            ],
+            "trades": trades,
+        })
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nightly rebalancing notices")
+    parser.add_argument("holdings", help="JSONL file, one user per line")
+    parser.add_argument("--out", default=None, help="Write notices here (default: stdout)")
+    parser.add_argument("--drift-band", type=float, default=DRIFT_BAND)
+    parser.add_argument("--all", action="store_true", help="Include users within the band")
+    args = parser.parse_args()
+
+    with open(args.holdings) as f:
+        users = [json.loads(line) for line in f if line.strip()]
+
+    plans = rebalance_users(users, drift_band=args.drift_band)
+    notices = [plan for plan in plans if args.all or plan["needs_rebalance"]]
+
+    lines = "\n".join(json.dumps(plan, ensure_ascii=False) for plan in notices)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(lines + "\n" if lines else "")
+        print(f"✅ {len(notices)} of {len(plans)} users need rebalancing -> {args.out}")
+    else:
+        print(lines)
@@ -0,0 +1,218 @@
+"""
+Recommendation Analytics
+Bulk export/import of stored recommendations and aggregate reports
+
+Exports stream the recommendations table in id order (keyset pagination), so
+memory stays flat no matter how many rows are stored. Aggregates run as SQL
+GROUP BY queries over the columnar projection that save_recommendation keeps
+up to date, instead of json.loads-ing every portfolio in Python.
+"""
+
+import argparse
+import gzip
+import json
+import time
+from typing import Dict, Iterator, List
+
+from database import get_storage, aggregate_recommendations
+
+# Rows fetched / inserted per round trip
+EXPORT_BATCH_SIZE = 50000
+IMPORT_BATCH_SIZE = 5000
+
+
+# Arrow schema for exported recommendations
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("session_id", pa.string()),
+        ("salary", pa.float64()),
+        ("savings", pa.float64()),
+        ("monthly_expenses", pa.float64()),
+        ("debt", pa.float64()),
+        ("goal", pa.string()),
+        ("time_horizon", pa.int32()),
+        ("portfolio", pa.string()),
+        ("recommendation_text", pa.string()),
+        ("created_at", pa.string()),
+        ("risk_profile", pa.string()),
+        ("monthly_investment_azn", pa.float64()),
+    ])
+
+
+# Portfolio is exported as JSON text so every format can round-trip it
+def _serializable(row: Dict) -> Dict:
+    row = dict(row)
+    if not isinstance(row["portfolio"], str):
+        row["portfolio"] = json.dumps(row["portfolio"] or {})
+    return row
+
+
+# Export every recommendation to Parquet, Arrow IPC or gzipped JSONL
+def export_recommendations(path: str, fmt: str = "parquet", batch_size: int = EXPORT_BATCH_SIZE) -> Dict:
+    """
+    Stream all recommendations to a file
+
+    Args:
+        path: Output file
+        fmt: "parquet", "arrow" or "jsonl" (always gzipped, whatever the extension)
+        batch_size: Rows per database round trip / record batch
+
+    Returns:
+        Dict with row count and elapsed seconds
+    """
+    started = time.time()
+    storage = get_storage()
+    rows_written = 0
+
+    if fmt in ("parquet", "arrow"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _arrow_schema()
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(path, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(path, schema)
+
+        try:
+            for batch in storage.iter_recommendations(batch_size):
+                records = pa.RecordBatch.from_pylist([_serializable(row) for row in batch], schema=schema)
+                if fmt == "parquet":
+                    writer.write_batch(records)
+                else:
+                    writer.write(records)
+                rows_written += len(batch)
+        finally:
+            writer.close()
+
+    elif fmt == "jsonl":
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for batch in storage.iter_recommendations(batch_size):
+                for row in batch:
+                    f.write(json.dumps(_serializable(row), ensure_ascii=False) + "\n")
+                rows_written += len(batch)
+
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    return {"rows": rows_written, "path": path, "seconds": round(time.time() - started, 3)}
+
+
+# Format of an export file from its magic bytes (the exporter doesn't enforce extensions)
+def _detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(6)
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.startswith(b"ARROW1"):
+        return "arrow"
+    if head.startswith(b"\x1f\x8b"):
+        return "jsonl.gz"
+    return "jsonl"
+
+
+# Read an export file back in batches
+def _read_batches(path: str, batch_size: int) -> Iterator[List[Dict]]:
+    fmt = _detect_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for records in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield records.to_pylist()
+
+    elif fmt == "arrow":
+        import pyarrow as pa
+
+        reader = pa.ipc.open_file(path)
+        batch: List[Dict] = []
+        for i in range(reader.num_record_batches):
+            batch.extend(reader.get_batch(i).to_pylist())
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if batch:
+            yield batch
+
+    else:
+        opener = gzip.open if fmt == "jsonl.gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            batch = []
+            for line in f:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+
+# Bulk import recommendations from an export file
+def import_recommendations(path: str, batch_size: int = IMPORT_BATCH_SIZE) -> Dict:
+    """
+    Load recommendations from Parquet, Arrow or JSONL (gzipped or not),
+    recognized by content rather than by file extension
+
+    Rows get new ids; the columnar projection is rebuilt from each portfolio.
+
+    Returns:
+        Dict with row count and elapsed seconds
+    """
+    started = time.time()
+    storage = get_storage()
+    rows_imported = 0
+
+    for batch in _read_batches(path, batch_size):
+        for row in batch:
+            if isinstance(row.get("portfolio"), str):
+                row["portfolio"] = json.loads(row["portfolio"]) if row["portfolio"] else {}
+        rows_imported += storage.bulk_insert_recommendations(batch)
+
+    return {"rows": rows_imported, "path": path, "seconds": round(time.time() - started, 3)}
+
+
+# Aggregate report used by the analytics endpoint
+def get_recommendation_report(dimension: str = "recommendations", group_by: List[str] = None) -> Dict:
+    """
+    Example:
+        get_recommendation_report("recommendations", ["goal", "risk_profile"])
+        -> distribution of risk profiles by goal
+    """
+    started = time.time()
+    rows = aggregate_recommendations(dimension, group_by or [])
+    return {
+        "dimension": dimension,
+        "group_by": group_by or [],
+        "rows": rows,
+        "query_ms": round((time.time() - started) * 1000, 2)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="InvestBuddy recommendation analytics")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=["parquet", "arrow", "jsonl"], default="parquet")
+
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path")
+
+    report_parser = subparsers.add_parser("report")
+    report_parser.add_argument("--dimension", choices=["recommendations", "allocations"],
+                               default="recommendations")
+    report_parser.add_argument("--group-by", default="goal,risk_profile")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(export_recommendations(args.path, args.format), indent=2))
+    elif args.command == "import":
+        print(json.dumps(import_recommendations(args.path), indent=2))
+    else:
+        group_by = [column for column in args.group_by.split(",") if column]
+        print(json.dumps(get_recommendation_report(args.dimension, group_by), indent=2))
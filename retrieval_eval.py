@@ -0,0 +1,418 @@
+"""
+Retrieval Evaluation
+Quality and speed of ETF retrieval backends on a labeled query set
+
+Each query in LABELED_QUERIES lists the ETFs a good answer retrieves, graded
+2 (what we'd recommend first) or 1 (also fine). Every backend ranks the same
+ETF embeddings for the same query vectors and is scored on:
+
+    recall@k  - share of the relevant ETFs found in the top k
+    MRR       - 1 / rank of the first relevant ETF
+    nDCG@k    - graded gain, discounted by rank, relative to the ideal order
+
+alongside per-query search latency, index build time and index memory, so
+a change to embeddings or index structure is judged on speed and quality
+together. Backends:
+
+    torch   - util.cos_sim + topk (ETFVectorStore.search default path)
+    numpy   - dot product on a normalized float32 matrix (VECTOR_STORE_MMAP path)
+    hybrid  - numpy cosine blended with BM25 keyword scores over the documents
+    ann     - inverted-file index (k-means lists, nprobe lists searched)
+
+Query embedding time is reported once - every backend uses the same model.
+
+    python retrieval_eval.py                     # sentence-transformers model
+    python retrieval_eval.py --stub-embeddings   # offline, hashed word vectors
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RESULTS_DIR = "./data/retrieval_eval"
+
+CUTOFFS = (1, 3, 5)
+
+# Query -> {symbol: grade}; 2 = best answer, 1 = acceptable
+LABELED_QUERIES = [
+    ("I want safe investments with low risk", {"BND": 2, "AGG": 2, "VTTVX": 1}),
+    ("Which ETFs are good for technology companies?", {"QQQ": 2, "XLK": 2, "ARKK": 1}),
+    ("I'm a beginner and don't know where to start", {"VOO": 2, "SPY": 2, "VTI": 2, "VTTVX": 1}),
+    ("I want to invest in sustainable and responsible companies", {"ESGU": 2}),
+    ("Cheapest way to own the S&P 500", {"VOO": 2, "SPY": 1}),
+    ("Own the whole US stock market in one fund", {"VTI": 2, "ITOT": 2}),
+    ("Bonds to protect my savings from stock crashes", {"BND": 2, "AGG": 2}),
+    ("Companies outside America in rich countries", {"VEA": 2}),
+    ("Fast-growing emerging markets like China and India", {"VWO": 2}),
+    ("Regular dividend income I can live on", {"VYM": 2, "SCHD": 2}),
+    ("Healthcare and pharmaceutical companies", {"XLV": 2}),
+    ("Banks and financial companies", {"XLF": 2}),
+    ("Oil and energy stocks", {"XLE": 2}),
+    ("Growth stocks with big future potential", {"VUG": 2, "QQQ": 1, "ARKK": 1}),
+    ("Undervalued, cheap, stable companies", {"VTV": 2}),
+    ("Small companies that could grow a lot", {"VB": 2}),
+    ("Invest in real estate without buying a house", {"VNQ": 2}),
+    ("Protection against inflation with gold", {"GLD": 2}),
+    ("One fund that handles everything until I retire", {"VTTVX": 2}),
+    ("High risk disruptive innovation like AI and genomics", {"ARKK": 2}),
+    ("Saving for retirement over 30 years", {"VTTVX": 2, "VOO": 1, "VTI": 1, "SPY": 1}),
+    ("Low fee index fund", {"VOO": 2, "VTI": 2, "ITOT": 2}),
+    ("ESG fund that avoids fossil fuels", {"ESGU": 2}),
+    ("Apple, Microsoft and Amazon in one ETF", {"QQQ": 2, "XLK": 2, "SPY": 1, "VOO": 1}),
+    ("Something stable for money I need in two years", {"BND": 2, "AGG": 2}),
+    ("Diversify internationally", {"VEA": 2, "VWO": 2}),
+    ("Quarterly dividends from quality companies", {"SCHD": 2, "VYM": 2}),
+    ("Hedge against a market crash", {"GLD": 2, "BND": 1, "AGG": 1}),
+]
+
+
+# Retrieval metrics for one ranked list
+def recall_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+    return len(set(ranked[:k]) & relevant.keys()) / len(relevant)
+
+
+def reciprocal_rank(ranked: List[str], relevant: Dict[str, int]) -> float:
+    for rank, symbol in enumerate(ranked, start=1):
+        if symbol in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+    gain = lambda grade: 2 ** grade - 1
+    dcg = sum(gain(relevant.get(s, 0)) / math.log2(i + 2) for i, s in enumerate(ranked[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum(gain(g) / math.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+# Row-normalized float32 copy of an embedding matrix
+def _normalize(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix.cpu().numpy() if hasattr(matrix, "cpu") else matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+# Top-k indices by score, best first
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class RetrievalBackend(ABC):
+    """Index over document embeddings; search returns row indices, best first"""
+
+    name = "base"
+
+    @abstractmethod
+    def build(self, embeddings, documents: List[str]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, query_vector: np.ndarray, query_text: str, k: int) -> List[int]:
+        raise NotImplementedError
+
+    # Bytes held by the index
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        raise NotImplementedError
+
+
+class TorchBackend(RetrievalBackend):
+    """Cosine similarity with sentence_transformers.util and torch.topk"""
+
+    name = "torch"
+
+    def build(self, embeddings, documents):
+        import torch
+
+        self.torch = torch
+        self.embeddings = torch.as_tensor(np.asarray(
+            embeddings.cpu().numpy() if hasattr(embeddings, "cpu") else embeddings, dtype=np.float32
+        ))
+
+    def search(self, query_vector, query_text, k):
+        from sentence_transformers import util
+
+        scores = util.cos_sim(self.torch.as_tensor(query_vector), self.embeddings)[0]
+        return self.torch.topk(scores, k=min(k, len(scores)))[1].tolist()
+
+    def memory_bytes(self):
+        return self.embeddings.element_size() * self.embeddings.nelement()
+
+
+class NumpyBackend(RetrievalBackend):
+    """Dot product on a normalized float32 matrix"""
+
+    name = "numpy"
+
+    def build(self, embeddings, documents):
+        self.matrix = _normalize(embeddings)
+
+    def scores(self, query_vector):
+        return self.matrix @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
+
+    def search(self, query_vector, query_text, k):
+        return _top_k(self.scores(query_vector), k).tolist()
+
+    def memory_bytes(self):
+        return self.matrix.nbytes
+
+
+class HybridBackend(NumpyBackend):
+    """alpha * cosine + (1 - alpha) * BM25, each min-max scaled per query"""
+
+    name = "hybrid"
+
+    def __init__(self, alpha: float = 0.7, k1: float = 1.2, b: float = 0.75):
+        self.alpha, self.k1, self.b = alpha, k1, b
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return re.findall(r"[a-z0-9&]+", text.lower())
+
+    def build(self, embeddings, documents):
+        super().build(embeddings, documents)
+        tokenized = [self.tokenize(doc) for doc in documents]
+        self.vocabulary = {term: i for i, term in enumerate(sorted({t for doc in tokenized for t in doc}))}
+
+        # Term frequencies as a dense (terms x docs) matrix - fine at knowledge-base scale
+        self.tf = np.zeros((len(self.vocabulary), len(documents)), dtype=np.float32)
+        for j, doc in enumerate(tokenized):
+            for term, count in Counter(doc).items():
+                self.tf[self.vocabulary[term], j] = count
+        lengths = np.array([len(doc) for doc in tokenized], dtype=np.float32)
+        self.length_norm = self.k1 * (1 - self.b + self.b * lengths / lengths.mean())
+        df = (self.tf > 0).sum(axis=1)
+        self.idf = np.log(1 + (len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def bm25(self, query_text):
+        rows = [self.vocabulary[t] for t in set(self.tokenize(query_text)) if t in self.vocabulary]
+        if not rows:
+            return np.zeros(self.tf.shape[1], dtype=np.float32)
+        tf = self.tf[rows]
+        return (self.idf[rows, None] * tf * (self.k1 + 1) / (tf + self.length_norm)).sum(axis=0)
+
+    def search(self, query_vector, query_text, k):
+        def scaled(values):
+            spread = values.max() - values.min()
+            return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+        scores = self.alpha * scaled(self.scores(query_vector)) + (1 - self.alpha) * scaled(self.bm25(query_text))
+        return _top_k(scores, k).tolist()
+
+    def memory_bytes(self):
+        return super().memory_bytes() + self.tf.nbytes + self.idf.nbytes + self.length_norm.nbytes
+
+
+class IVFBackend(NumpyBackend):
+    """
+    Inverted-file ANN: k-means partitions the vectors into lists, a query
+    scans only the nprobe lists with the closest centroids
+    """
+
+    name = "ann"
+
+    def __init__(self, n_lists: Optional[int] = None, nprobe: int = 2, iterations: int = 20, seed: int = 7):
+        self.n_lists, self.nprobe, self.iterations, self.seed = n_lists, nprobe, iterations, seed
+
+    def build(self, embeddings, documents):
+        super().build(embeddings, documents)
+        n = len(self.matrix)
+        n_lists = min(self.n_lists or max(int(math.sqrt(n)), 1), n)
+
+        # Spherical k-means (cosine) from random starting points
+        rng = np.random.default_rng(self.seed)
+        centroids = self.matrix[rng.choice(n, n_lists, replace=False)]
+        for _ in range(self.iterations):
+            assignment = np.argmax(self.matrix @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = self.matrix[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == c) for c in range(n_lists)]
+
+    def search(self, query_vector, query_text, k):
+        query = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+        probe = _top_k(self.centroids @ query, self.nprobe)
+        candidates = np.concatenate([self.lists[c] for c in probe])
+        if not len(candidates):
+            return []
+        order = _top_k(self.matrix[candidates] @ query, k)
+        return candidates[order].tolist()
+
+    def memory_bytes(self):
+        return super().memory_bytes() + self.centroids.nbytes + sum(l.nbytes for l in self.lists)
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "numpy": NumpyBackend,
+    "hybrid": HybridBackend,
+    "ann": IVFBackend,
+}
+
+
+# Latency summary in milliseconds
+def _latency(seconds: List[float]) -> Dict:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+# Score one backend on every labeled query
+def evaluate_backend(backend: RetrievalBackend, embeddings, documents: List[str], symbols: List[str],
+                     query_vectors: np.ndarray, repeats: int = 20) -> Dict:
+    """
+    Args:
+        backend: Unbuilt RetrievalBackend
+        embeddings: (docs x dims) document embeddings, row order = symbols
+        documents: Document texts (for keyword backends)
+        symbols: ETF symbol per row
+        query_vectors: (queries x dims) embeddings of LABELED_QUERIES
+        repeats: Timed searches per query (latency is the median of these)
+
+    Returns:
+        Dict with mean metrics, latency, build time, memory and per-query rows
+    """
+    k = max(CUTOFFS)
+
+    started = time.perf_counter()
+    backend.build(embeddings, documents)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    per_query, latencies = [], []
+    for (query, relevant), vector in zip(LABELED_QUERIES, query_vectors):
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            indices = backend.search(vector, query, k)
+            timings.append(time.perf_counter() - started)
+        latency = float(np.median(timings))
+        latencies.append(latency)
+
+        ranked = [symbols[i] for i in indices]
+        row = {"query": query, "retrieved": ranked, "latency_ms": round(latency * 1000, 4),
+               "mrr": round(reciprocal_rank(ranked, relevant), 4),
+               f"ndcg@{k}": round(ndcg_at_k(ranked, relevant, k), 4)}
+        row.update({f"recall@{c}": round(recall_at_k(ranked, relevant, c), 4) for c in CUTOFFS})
+        per_query.append(row)
+
+    # Peak Python/NumPy allocation of one pass over the queries (torch memory is not traced)
+    tracemalloc.start()
+    for (query, _), vector in zip(LABELED_QUERIES, query_vectors):
+        backend.search(vector, query, k)
+    search_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    metric_names = [f"recall@{c}" for c in CUTOFFS] + ["mrr", f"ndcg@{k}"]
+    return {
+        "metrics": {name: round(float(np.mean([row[name] for row in per_query])), 4) for name in metric_names},
+        "latency": _latency(latencies),
+        "build_ms": round(build_ms, 3),
+        "index_bytes": int(backend.memory_bytes()),
+        "search_peak_bytes": int(search_peak),
+        "per_query": per_query,
+    }
+
+
+# Evaluate every backend against the store's embeddings
+def run_evaluation(store, backends: Optional[List[str]] = None, repeats: int = 20) -> Dict:
+    """
+    Args:
+        store: Loaded ETFVectorStore (embedding model + document embeddings)
+        backends: Names from BACKENDS (default: all)
+
+    Returns:
+        {"queries", "embedding", "backends": {name: result or {"skipped": reason}}}
+    """
+    symbols = [m["symbol"] for m in store.metadata]
+    unknown = {s for _, relevant in LABELED_QUERIES for s in relevant} - set(symbols)
+    if unknown:
+        raise ValueError(f"Labeled ETFs missing from the store: {', '.join(sorted(unknown))}")
+
+    # Embed every query once; all backends share the vectors
+    timings, vectors = [], []
+    for query, _ in LABELED_QUERIES:
+        started = time.perf_counter()
+        vector = store.embedding_model.encode(query, convert_to_numpy=True)
+        timings.append(time.perf_counter() - started)
+        vectors.append(np.asarray(vector, dtype=np.float32))
+    query_vectors = np.vstack(vectors)
+
+    results = {}
+    for name in backends or BACKENDS:
+        try:
+            results[name] = evaluate_backend(BACKENDS[name](), store.embeddings, store.documents, symbols,
+                                             query_vectors, repeats)
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name or e}"}
+
+    return {
+        "queries": len(LABELED_QUERIES),
+        "documents": len(symbols),
+        "dimensions": int(query_vectors.shape[1]),
+        "embedding": _latency(timings),
+        "backends": results,
+    }
+
+
+if __name__ == "__main__":
+    from vector_store import ETFVectorStore
+
+    parser = argparse.ArgumentParser(description="Evaluate ETF retrieval backends")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Comma-separated: {', '.join(BACKENDS)}")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed searches per query")
+    parser.add_argument("--stub-embeddings", action="store_true", help="Hashed word vectors instead of the model")
+    parser.add_argument("--output", default=None, help="JSON file (default: data/retrieval_eval/eval-<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Print every query")
+    args = parser.parse_args()
+
+    if args.stub_embeddings:
+        import tempfile
+        from benchmarks import StubEmbeddingModel
+
+        store = ETFVectorStore(cache_file=os.path.join(tempfile.mkdtemp(), "etf_embeddings.pkl"), lazy=True)
+        store.embedding_model = StubEmbeddingModel()
+        store.load_embeddings()
+    else:
+        store = ETFVectorStore()
+
+    report = run_evaluation(store, args.backends.split(","), args.repeats)
+    report["embedding_model"] = "stub" if args.stub_embeddings else "sentence-transformers"
+
+    print(f"\n📏 {report['queries']} queries over {report['documents']} ETFs "
+          f"(query embedding p50 {report['embedding']['p50_ms']:.2f} ms)")
+    print(f"{'backend':<8} {'R@1':>6} {'R@3':>6} {'R@5':>6} {'MRR':>6} {'nDCG@5':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'index KB':>9}")
+    for name, result in report["backends"].items():
+        if "skipped" in result:
+            print(f"{name:<8} skipped ({result['skipped']})")
+            continue
+        m, lat = result["metrics"], result["latency"]
+        print(f"{name:<8} {m['recall@1']:>6.3f} {m['recall@3']:>6.3f} {m['recall@5']:>6.3f} {m['mrr']:>6.3f} "
+              f"{m['ndcg@5']:>7.3f} {lat['p50_ms']:>8.4f} {lat['p95_ms']:>8.4f} {result['index_bytes'] / 1024:>9.1f}")
+        if args.verbose:
+            for row in result["per_query"]:
+                print(f"    {row['mrr']:.2f}  {row['query'][:50]:<50} {', '.join(row['retrieved'])}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"eval-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {output}")
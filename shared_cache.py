@@ -0,0 +1,150 @@
+"""
+Shared Local Cache
+A small SQLite-backed key/value store shared by every worker process on a host
+
+Each uvicorn/gunicorn worker keeps its own in-memory price cache. When
+SHARED_CACHE_PATH is set, financial_api.py and live_etf_data.py also read and
+write through this store, so a quote fetched by one worker is reused by all
+of them instead of every worker hitting Alpha Vantage / Yahoo separately.
+Point it at tmpfs (e.g. /dev/shm) to keep it off the disk.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Path of the shared cache file (unset = shared cache disabled)
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+
+_local = threading.local()
+
+
+# Shared cache is opt-in (multi-worker deployments)
+def is_enabled() -> bool:
+    return bool(SHARED_CACHE_PATH)
+
+
+# One connection per thread, created on first use
+def _get_connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+
+# Read a value if it is younger than max_age_seconds
+def get(namespace: str, key: str, max_age_seconds: float) -> Optional[Any]:
+    if not is_enabled():
+        return None
+
+    try:
+        row = _get_connection().execute(
+            "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Shared cache read error: {e}")
+        return None
+
+    if row and time.time() - row[1] < max_age_seconds:
+        return json.loads(row[0])
+    return None
+
+
+# Store a JSON-serializable value
+def set(namespace: str, key: str, value: Any):
+    if not is_enabled():
+        return
+
+    try:
+        _get_connection().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, default=str), time.time())
+        )
+    except sqlite3.Error as e:
+        print(f"Shared cache write error: {e}")
+
+
+# Read every fresh value in a namespace
+def get_namespace(namespace: str, max_age_seconds: float) -> Dict[str, Any]:
+    if not is_enabled():
+        return {}
+
+    rows = _get_connection().execute(
+        "SELECT key, value FROM cache WHERE namespace = ? AND stored_at > ?",
+        (namespace, time.time() - max_age_seconds)
+    ).fetchall()
+    return {key: json.loads(value) for key, value in rows}
+
+
+# Move some keys of a namespace into one folded value, in one transaction
+def fold_keys(namespace: str, keys: List[str], into_namespace: str, into_key: str,
+              fold: Callable[[Optional[Any], List[Any]], Any]) -> Optional[Any]:
+    """
+    Deletes the keys that still exist and stores fold(current value, their
+    values) under into_key - concurrent callers never fold the same key twice
+
+    Returns:
+        The folded value (None if the shared cache is disabled or failed)
+    """
+    if not is_enabled():
+        return None
+
+    conn = _get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ?", (into_namespace, into_key)
+            ).fetchone()
+            current = json.loads(row[0]) if row else None
+
+            values = []
+            for key in keys:
+                found = conn.execute(
+                    "SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                if found:
+                    values.append(json.loads(found[0]))
+                    conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+            if values:
+                current = fold(current, values)
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                    (into_namespace, into_key, json.dumps(current, default=str), time.time())
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        print(f"Shared cache fold error: {e}")
+        return None
+    return current
+
+
+# Drop one namespace (or everything)
+def clear(namespace: Optional[str] = None):
+    if not is_enabled():
+        return
+
+    if namespace:
+        _get_connection().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+    else:
+        _get_connection().execute("DELETE FROM cache")
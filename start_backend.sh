@@ -16,6 +16,12 @@ if [ ! -f ".env" ]; then
     exit 1
 fi
 
+# Multi-worker mode: one preloaded model shared by all workers
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    echo "📡 Starting $WEB_CONCURRENCY workers on http://localhost:8000"
+    exec gunicorn backend:app -c gunicorn.conf.py
+fi
+
 # Start backend
 echo "📡 Starting FastAPI server on http://localhost:8000"
 echo "   Press Ctrl+C to stop"
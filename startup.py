@@ -0,0 +1,116 @@
+"""
+Startup Orchestrator
+Phased application startup with per-component status for the readiness endpoint
+
+Phase 1 ("core") runs before the app accepts traffic and must stay cheap
+(database schema, API client). Phase 2 ("background") loads the heavy
+components - embedding model, embedding matrix, market-data warm-up - in a
+worker thread after the server is already answering requests.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Component states
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupOrchestrator:
+    """Tracks the load state of every startup component"""
+
+    def __init__(self):
+        self.components: Dict[str, Dict] = {}
+        self.started_at = time.time()
+        self._background_task: Optional[asyncio.Task] = None
+
+    # Register a component so it shows up as pending before it runs
+    def register(self, name: str, phase: str):
+        self.components[name] = {
+            "phase": phase,
+            "status": PENDING,
+            "load_seconds": None,
+            "ready_at": None,
+            "error": None
+        }
+
+    # Run one component loader and record how it went
+    def run_component(self, name: str, loader: Callable, phase: str = "core") -> bool:
+        if name not in self.components:
+            self.register(name, phase)
+
+        component = self.components[name]
+        component["status"] = LOADING
+        started = time.time()
+
+        try:
+            loader()
+            component["status"] = READY
+            component["ready_at"] = datetime.now().isoformat()
+            return True
+        except Exception as e:
+            component["status"] = FAILED
+            component["error"] = str(e)
+            print(f"❌ Startup component '{name}' failed: {e}")
+            return False
+        finally:
+            component["load_seconds"] = round(time.time() - started, 3)
+            print(f"⏱️ {name}: {component['status']} in {component['load_seconds']}s")
+
+    # Record a component that was loaded before the app started (pre-fork)
+    def mark_ready(self, name: str, phase: str, load_seconds: float):
+        self.register(name, phase)
+        self.components[name].update({
+            "status": READY,
+            "load_seconds": round(load_seconds, 3),
+            "ready_at": datetime.now().isoformat()
+        })
+
+    # Run the core phase synchronously (before accepting traffic)
+    def run_core(self, steps: List[Tuple[str, Callable]]):
+        for name, loader in steps:
+            self.run_component(name, loader, phase="core")
+
+    # Run heavy components one after another in a worker thread
+    def start_background(self, steps: List[Tuple[str, Callable]]):
+        for name, _ in steps:
+            self.register(name, "background")
+
+        async def _run():
+            for name, loader in steps:
+                await asyncio.to_thread(self.run_component, name, loader, "background")
+            print(f"✅ Background startup finished after {time.time() - self.started_at:.1f}s")
+
+        self._background_task = asyncio.create_task(_run())
+
+    # Cancel background loading on shutdown
+    async def shutdown(self):
+        if self._background_task and not self._background_task.done():
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+
+    # Check a single component
+    def is_ready(self, name: str) -> bool:
+        return self.components.get(name, {}).get("status") == READY
+
+    # Core components must be ready before the app reports ready
+    def core_ready(self) -> bool:
+        return all(
+            c["status"] == READY for c in self.components.values() if c["phase"] == "core"
+        )
+
+    # Status report for the readiness endpoint
+    def status(self) -> Dict:
+        return {
+            "ready": self.core_ready(),
+            "fully_loaded": all(c["status"] == READY for c in self.components.values()),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "components": self.components
+        }
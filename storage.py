@@ -0,0 +1,815 @@
+"""
+Storage Backends for InvestBuddy
+SQLite (single host) and PostgreSQL (shared by several backend nodes)
+
+database.py exposes the public functions (save_message, get_conversation_history, ...)
+and forwards them to the backend chosen here. Set DATABASE_URL to a
+postgresql:// URL to share state between nodes; otherwise the local SQLite
+file at DATABASE_PATH is used.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Connection pool sizing for PostgreSQL
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# Columns returned by get_latest_recommendation, in order
+RECOMMENDATION_COLUMNS = [
+    "id", "session_id", "salary", "savings", "monthly_expenses", "debt",
+    "goal", "time_horizon", "portfolio", "recommendation_text", "created_at"
+]
+
+# Extra columns returned by iter_recommendations (bulk export)
+EXPORT_COLUMNS = RECOMMENDATION_COLUMNS + ["risk_profile", "monthly_investment_azn"]
+
+# Aggregate queries served by the analytics endpoint.
+# group_by names are checked against this whitelist before reaching SQL.
+ANALYTICS_DIMENSIONS = {
+    "recommendations": {
+        "table": "recommendations",
+        "group_by": ["goal", "risk_profile", "time_horizon"],
+        "aggregates": [
+            ("count", "COUNT(*)"),
+            ("avg_monthly_investment_azn", "AVG(monthly_investment_azn)"),
+            ("total_monthly_investment_azn", "SUM(monthly_investment_azn)"),
+            ("avg_salary", "AVG(salary)"),
+            ("avg_time_horizon", "AVG(time_horizon)"),
+        ],
+    },
+    "allocations": {
+        "table": "recommendation_allocations",
+        "group_by": ["goal", "risk_profile", "time_horizon", "etf", "asset_type"],
+        "aggregates": [
+            ("count", "COUNT(*)"),
+            ("avg_percentage", "AVG(percentage)"),
+            ("total_monthly_amount_azn", "SUM(monthly_amount_azn)"),
+            ("total_monthly_amount_usd", "SUM(monthly_amount_usd)"),
+        ],
+    },
+}
+
+
+# Build a GROUP BY query for one analytics dimension
+def build_aggregate_query(dimension: str, group_by: List[str]) -> Tuple[str, List[str]]:
+    """
+    Returns:
+        (sql, column names of the result rows)
+    """
+    if dimension not in ANALYTICS_DIMENSIONS:
+        raise ValueError(f"Unknown analytics dimension: {dimension}")
+
+    spec = ANALYTICS_DIMENSIONS[dimension]
+    invalid = [column for column in group_by if column not in spec["group_by"]]
+    if invalid:
+        raise ValueError(f"Cannot group {dimension} by: {', '.join(invalid)}")
+
+    select_parts = list(group_by) + [f"{expr} AS {name}" for name, expr in spec["aggregates"]]
+    sql = f"SELECT {', '.join(select_parts)} FROM {spec['table']}"
+    if group_by:
+        sql += f" GROUP BY {', '.join(group_by)} ORDER BY count DESC"
+
+    return sql, list(group_by) + [name for name, _ in spec["aggregates"]]
+
+
+# Pull the columnar fields out of a portfolio dict
+def project_portfolio(portfolio: Dict) -> Tuple[Optional[str], Optional[float], List[Tuple]]:
+    """
+    Returns:
+        (risk_profile, monthly_investment_azn, allocation tuples) where each
+        tuple is (etf, asset_type, percentage, monthly_amount_azn, monthly_amount_usd)
+    """
+    portfolio = portfolio or {}
+    allocations = [
+        (
+            alloc.get("etf"),
+            alloc.get("asset_type"),
+            alloc.get("percentage"),
+            alloc.get("monthly_amount_azn"),
+            alloc.get("monthly_amount_usd"),
+        )
+        for alloc in portfolio.get("allocations", [])
+    ]
+    return portfolio.get("risk_profile") or "", portfolio.get("monthly_investment_azn"), allocations
+
+
+# Timestamps come back as strings from SQLite and datetimes from PostgreSQL
+def _format_timestamp(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+# Build the recommendation dict shared by every backend
+def _recommendation_from_row(row) -> Dict:
+    recommendation = dict(zip(RECOMMENDATION_COLUMNS, row))
+    portfolio = recommendation["portfolio"]
+    if isinstance(portfolio, str):
+        portfolio = json.loads(portfolio) if portfolio else {}
+    recommendation["portfolio"] = portfolio or {}
+    recommendation["created_at"] = _format_timestamp(recommendation["created_at"])
+    return recommendation
+
+
+class StorageBackend(ABC):
+    """Interface implemented by every storage backend"""
+
+    name = "base"
+
+    @abstractmethod
+    def init_schema(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_or_get_user(self, session_id: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_message(self, session_id: str, role: str, content: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_conversation_history(self, session_id: str, limit: int = 50) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_recommendation(self, session_id: str, salary: float, savings: float,
+                            monthly_expenses: float, debt: float, goal: str,
+                            time_horizon: int, portfolio: Dict, recommendation_text: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_latest_recommendation(self, session_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear_conversation(self, session_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_recommendations(self, batch_size: int = 50000) -> Iterator[List[Dict]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_insert_recommendations(self, rows: List[Dict]) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def aggregate_recommendations(self, dimension: str, group_by: List[str]) -> List[Dict]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # Async variants - backends without a native async driver run the
+    # blocking call in a worker thread so the event loop stays free
+    async def create_or_get_user_async(self, session_id: str) -> int:
+        return await asyncio.to_thread(self.create_or_get_user, session_id)
+
+    async def save_message_async(self, session_id: str, role: str, content: str):
+        return await asyncio.to_thread(self.save_message, session_id, role, content)
+
+    async def get_conversation_history_async(self, session_id: str, limit: int = 50) -> List[Dict]:
+        return await asyncio.to_thread(self.get_conversation_history, session_id, limit)
+
+    async def save_recommendation_async(self, *args, **kwargs):
+        return await asyncio.to_thread(self.save_recommendation, *args, **kwargs)
+
+    async def get_latest_recommendation_async(self, session_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get_latest_recommendation, session_id)
+
+    async def clear_conversation_async(self, session_id: str):
+        return await asyncio.to_thread(self.clear_conversation, session_id)
+
+    async def close_async(self):
+        self.close()
+
+
+class SQLiteStorage(StorageBackend):
+    """Local SQLite file - one connection per thread, reused across calls"""
+
+    name = "sqlite"
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self._local = threading.local()
+
+    # Get this thread's connection (opened on first use)
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # Run a unit of work in a transaction
+    @contextmanager
+    def transaction(self):
+        conn = self._get_connection()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def init_schema(self):
+        with self.transaction() as cursor:
+            # Incremental auto-vacuum lets the maintenance job hand freed pages back
+            # to the OS in small steps (only takes effect on a fresh database file)
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+            # WAL mode keeps readers and the maintenance job from blocking writers
+            cursor.execute("PRAGMA journal_mode = WAL")
+
+            # Users table - stores basic user session information
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT UNIQUE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Conversations table - stores chat messages
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES users(session_id)
+                )
+            """)
+
+            # Recommendations table - stores investment recommendations
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recommendations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    salary REAL,
+                    savings REAL,
+                    monthly_expenses REAL,
+                    debt REAL,
+                    goal TEXT,
+                    time_horizon INTEGER,
+                    portfolio JSON,
+                    recommendation_text TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES users(session_id)
+                )
+            """)
+
+            # Create indexes for better query performance
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversations_session
+                ON conversations(session_id)
+            """)
+
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversations_timestamp
+                ON conversations(timestamp)
+            """)
+
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_recommendations_session
+                ON recommendations(session_id)
+            """)
+
+            self._migrate_projection(cursor)
+
+    # Add the columnar projection to existing databases and backfill it with JSON1
+    def _migrate_projection(self, cursor):
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(recommendations)")}
+        if "risk_profile" not in existing:
+            cursor.execute("ALTER TABLE recommendations ADD COLUMN risk_profile TEXT")
+        if "monthly_investment_azn" not in existing:
+            cursor.execute("ALTER TABLE recommendations ADD COLUMN monthly_investment_azn REAL")
+
+        # Recommendation allocations - one row per ETF, for analytics
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recommendation_allocations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recommendation_id INTEGER NOT NULL,
+                session_id TEXT NOT NULL,
+                goal TEXT,
+                risk_profile TEXT,
+                time_horizon INTEGER,
+                etf TEXT,
+                asset_type TEXT,
+                percentage REAL,
+                monthly_amount_azn REAL,
+                monthly_amount_usd REAL,
+                FOREIGN KEY (recommendation_id) REFERENCES recommendations(id)
+            )
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_recommendations_goal_risk
+            ON recommendations(goal, risk_profile)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_allocations_recommendation
+            ON recommendation_allocations(recommendation_id)
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_allocations_etf
+            ON recommendation_allocations(etf)
+        """)
+
+        # Rows written before the projection existed have risk_profile NULL
+        cursor.execute("""
+            INSERT INTO recommendation_allocations
+            (recommendation_id, session_id, goal, risk_profile, time_horizon,
+             etf, asset_type, percentage, monthly_amount_azn, monthly_amount_usd)
+            SELECT r.id, r.session_id, r.goal,
+                   json_extract(r.portfolio, '$.risk_profile'), r.time_horizon,
+                   json_extract(a.value, '$.etf'),
+                   json_extract(a.value, '$.asset_type'),
+                   json_extract(a.value, '$.percentage'),
+                   json_extract(a.value, '$.monthly_amount_azn'),
+                   json_extract(a.value, '$.monthly_amount_usd')
+            FROM recommendations r, json_each(r.portfolio, '$.allocations') a
+            WHERE r.risk_profile IS NULL
+        """)
+
+        cursor.execute("""
+            UPDATE recommendations
+            SET risk_profile = COALESCE(json_extract(portfolio, '$.risk_profile'), ''),
+                monthly_investment_azn = json_extract(portfolio, '$.monthly_investment_azn')
+            WHERE risk_profile IS NULL
+        """)
+
+    def create_or_get_user(self, session_id: str) -> int:
+        with self.transaction() as cursor:
+            # Try to get existing user
+            cursor.execute("SELECT id FROM users WHERE session_id = ?", (session_id,))
+            user = cursor.fetchone()
+
+            if user:
+                # Update last active time
+                cursor.execute(
+                    "UPDATE users SET last_active = ? WHERE session_id = ?",
+                    (datetime.now(), session_id)
+                )
+                return user[0]
+
+            # Create new user
+            cursor.execute("INSERT INTO users (session_id) VALUES (?)", (session_id,))
+            return cursor.lastrowid
+
+    def save_message(self, session_id: str, role: str, content: str):
+        with self.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO conversations (session_id, role, content) VALUES (?, ?, ?)",
+                (session_id, role, content)
+            )
+
+    def get_conversation_history(self, session_id: str, limit: int = 50) -> List[Dict]:
+        with self.transaction() as cursor:
+            cursor.execute(
+                """SELECT role, content, timestamp
+                   FROM conversations
+                   WHERE session_id = ?
+                   ORDER BY timestamp ASC
+                   LIMIT ?""",
+                (session_id, limit)
+            )
+            return [
+                {"role": row[0], "content": row[1], "timestamp": row[2]}
+                for row in cursor.fetchall()
+            ]
+
+    # Insert one recommendation plus its allocation rows (inside a transaction)
+    def _insert_recommendation(self, cursor, session_id, salary, savings, monthly_expenses,
+                               debt, goal, time_horizon, portfolio, recommendation_text,
+                               created_at=None):
+        risk_profile, monthly_investment_azn, allocations = project_portfolio(portfolio)
+
+        cursor.execute(
+            """INSERT INTO recommendations
+               (session_id, salary, savings, monthly_expenses, debt, goal,
+                time_horizon, portfolio, recommendation_text,
+                risk_profile, monthly_investment_azn, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))""",
+            (session_id, salary, savings, monthly_expenses, debt, goal,
+             time_horizon, json.dumps(portfolio), recommendation_text,
+             risk_profile, monthly_investment_azn, created_at)
+        )
+        recommendation_id = cursor.lastrowid
+
+        cursor.executemany(
+            """INSERT INTO recommendation_allocations
+               (recommendation_id, session_id, goal, risk_profile, time_horizon,
+                etf, asset_type, percentage, monthly_amount_azn, monthly_amount_usd)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(recommendation_id, session_id, goal, risk_profile, time_horizon) + alloc
+             for alloc in allocations]
+        )
+        return recommendation_id
+
+    def save_recommendation(self, session_id: str, salary: float, savings: float,
+                            monthly_expenses: float, debt: float, goal: str,
+                            time_horizon: int, portfolio: Dict, recommendation_text: str):
+        with self.transaction() as cursor:
+            self._insert_recommendation(
+                cursor, session_id, salary, savings, monthly_expenses, debt, goal,
+                time_horizon, portfolio, recommendation_text
+            )
+
+    def get_latest_recommendation(self, session_id: str) -> Optional[Dict]:
+        with self.transaction() as cursor:
+            cursor.execute(
+                f"""SELECT {", ".join(RECOMMENDATION_COLUMNS)}
+                    FROM recommendations
+                    WHERE session_id = ?
+                    ORDER BY created_at DESC
+                    LIMIT 1""",
+                (session_id,)
+            )
+            row = cursor.fetchone()
+        return _recommendation_from_row(row) if row else None
+
+    def clear_conversation(self, session_id: str):
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+
+    def iter_recommendations(self, batch_size: int = 50000) -> Iterator[List[Dict]]:
+        last_id = 0
+        while True:
+            with self.transaction() as cursor:
+                cursor.execute(
+                    f"""SELECT {", ".join(EXPORT_COLUMNS)}
+                        FROM recommendations
+                        WHERE id > ?
+                        ORDER BY id
+                        LIMIT ?""",
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [dict(zip(EXPORT_COLUMNS, row)) for row in rows]
+
+    def bulk_insert_recommendations(self, rows: List[Dict]) -> int:
+        with self.transaction() as cursor:
+            for row in rows:
+                self._insert_recommendation(
+                    cursor, row["session_id"], row.get("salary"), row.get("savings"),
+                    row.get("monthly_expenses"), row.get("debt"), row.get("goal"),
+                    row.get("time_horizon"), row.get("portfolio") or {},
+                    row.get("recommendation_text"), row.get("created_at")
+                )
+        return len(rows)
+
+    def aggregate_recommendations(self, dimension: str, group_by: List[str]) -> List[Dict]:
+        sql, columns = build_aggregate_query(dimension, group_by)
+        with self.transaction() as cursor:
+            cursor.execute(sql)
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class PostgresStorage(StorageBackend):
+    """
+    PostgreSQL shared by several backend nodes
+
+    Uses psycopg 3 with a pooled connection for sync callers and a separate
+    async pool for coroutines, so request handlers never block the event loop.
+    """
+
+    name = "postgres"
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGSERIAL PRIMARY KEY,
+            session_id TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            last_active TIMESTAMPTZ DEFAULT now()
+        )
+        """,
+        # No foreign key on session_id: save_message may run before the
+        # session row exists (SQLite never enforced it either)
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id BIGSERIAL PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMPTZ DEFAULT now()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS recommendations (
+            id BIGSERIAL PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            salary DOUBLE PRECISION,
+            savings DOUBLE PRECISION,
+            monthly_expenses DOUBLE PRECISION,
+            debt DOUBLE PRECISION,
+            goal TEXT,
+            time_horizon INTEGER,
+            portfolio JSONB,
+            recommendation_text TEXT,
+            created_at TIMESTAMPTZ DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_recommendations_session ON recommendations(session_id)",
+        # Columnar projection of the portfolio JSON (see _migrate_projection for SQLite)
+        "ALTER TABLE recommendations ADD COLUMN IF NOT EXISTS risk_profile TEXT",
+        "ALTER TABLE recommendations ADD COLUMN IF NOT EXISTS monthly_investment_azn DOUBLE PRECISION",
+        """
+        CREATE TABLE IF NOT EXISTS recommendation_allocations (
+            id BIGSERIAL PRIMARY KEY,
+            recommendation_id BIGINT NOT NULL REFERENCES recommendations(id) ON DELETE CASCADE,
+            session_id TEXT NOT NULL,
+            goal TEXT,
+            risk_profile TEXT,
+            time_horizon INTEGER,
+            etf TEXT,
+            asset_type TEXT,
+            percentage DOUBLE PRECISION,
+            monthly_amount_azn DOUBLE PRECISION,
+            monthly_amount_usd DOUBLE PRECISION
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_recommendations_goal_risk ON recommendations(goal, risk_profile)",
+        "CREATE INDEX IF NOT EXISTS idx_allocations_recommendation ON recommendation_allocations(recommendation_id)",
+        "CREATE INDEX IF NOT EXISTS idx_allocations_etf ON recommendation_allocations(etf)",
+        """
+        INSERT INTO recommendation_allocations
+        (recommendation_id, session_id, goal, risk_profile, time_horizon,
+         etf, asset_type, percentage, monthly_amount_azn, monthly_amount_usd)
+        SELECT r.id, r.session_id, r.goal, r.portfolio->>'risk_profile', r.time_horizon,
+               a->>'etf', a->>'asset_type',
+               (a->>'percentage')::double precision,
+               (a->>'monthly_amount_azn')::double precision,
+               (a->>'monthly_amount_usd')::double precision
+        FROM recommendations r
+        CROSS JOIN LATERAL jsonb_array_elements(COALESCE(r.portfolio->'allocations', '[]'::jsonb)) a
+        WHERE r.risk_profile IS NULL
+        """,
+        """
+        UPDATE recommendations
+        SET risk_profile = COALESCE(portfolio->>'risk_profile', ''),
+            monthly_investment_azn = (portfolio->>'monthly_investment_azn')::double precision
+        WHERE risk_profile IS NULL
+        """,
+    ]
+
+    UPSERT_USER = """
+        INSERT INTO users (session_id) VALUES (%s)
+        ON CONFLICT (session_id) DO UPDATE SET last_active = now()
+        RETURNING id
+    """
+    INSERT_MESSAGE = "INSERT INTO conversations (session_id, role, content) VALUES (%s, %s, %s)"
+    SELECT_HISTORY = """
+        SELECT role, content, timestamp
+        FROM conversations
+        WHERE session_id = %s
+        ORDER BY timestamp ASC
+        LIMIT %s
+    """
+    INSERT_RECOMMENDATION = """
+        INSERT INTO recommendations
+        (session_id, salary, savings, monthly_expenses, debt, goal,
+         time_horizon, portfolio, recommendation_text,
+         risk_profile, monthly_investment_azn, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, COALESCE(%s, now()))
+        RETURNING id
+    """
+    INSERT_ALLOCATION = """
+        INSERT INTO recommendation_allocations
+        (recommendation_id, session_id, goal, risk_profile, time_horizon,
+         etf, asset_type, percentage, monthly_amount_azn, monthly_amount_usd)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    SELECT_RECOMMENDATION_BATCH = f"""
+        SELECT {", ".join(EXPORT_COLUMNS)}
+        FROM recommendations
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    """
+    SELECT_LATEST_RECOMMENDATION = f"""
+        SELECT {", ".join(RECOMMENDATION_COLUMNS)}
+        FROM recommendations
+        WHERE session_id = %s
+        ORDER BY created_at DESC
+        LIMIT 1
+    """
+    DELETE_CONVERSATION = "DELETE FROM conversations WHERE session_id = %s"
+
+    def __init__(self, database_url: str, min_size: int = DB_POOL_MIN_SIZE,
+                 max_size: int = DB_POOL_MAX_SIZE):
+        from psycopg_pool import ConnectionPool
+
+        self.database_url = database_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = ConnectionPool(database_url, min_size=min_size, max_size=max_size, open=True)
+        self._async_pool = None
+
+    # Async pool must be opened inside a running event loop
+    async def _get_async_pool(self):
+        if self._async_pool is None:
+            from psycopg_pool import AsyncConnectionPool
+
+            pool = AsyncConnectionPool(
+                self.database_url, min_size=self.min_size, max_size=self.max_size, open=False
+            )
+            await pool.open()
+            self._async_pool = pool
+        return self._async_pool
+
+    @staticmethod
+    def _portfolio_param(portfolio: Dict):
+        from psycopg.types.json import Jsonb
+        return Jsonb(portfolio)
+
+    # Parameters for INSERT_RECOMMENDATION and the matching allocation rows
+    def _recommendation_params(self, session_id, salary, savings, monthly_expenses, debt,
+                               goal, time_horizon, portfolio, recommendation_text,
+                               created_at=None):
+        risk_profile, monthly_investment_azn, allocations = project_portfolio(portfolio)
+        params = (session_id, salary, savings, monthly_expenses, debt, goal,
+                  time_horizon, self._portfolio_param(portfolio), recommendation_text,
+                  risk_profile, monthly_investment_azn, created_at)
+        allocation_prefix = (session_id, goal, risk_profile, time_horizon)
+        return params, allocation_prefix, allocations
+
+    # Insert one recommendation plus its allocation rows on an open connection
+    def _insert_recommendation(self, conn, *args, **kwargs):
+        params, prefix, allocations = self._recommendation_params(*args, **kwargs)
+        recommendation_id = conn.execute(self.INSERT_RECOMMENDATION, params).fetchone()[0]
+        if allocations:
+            with conn.cursor() as cursor:
+                cursor.executemany(
+                    self.INSERT_ALLOCATION,
+                    [(recommendation_id,) + prefix + alloc for alloc in allocations]
+                )
+        return recommendation_id
+
+    def init_schema(self):
+        with self.pool.connection() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def create_or_get_user(self, session_id: str) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute(self.UPSERT_USER, (session_id,)).fetchone()[0]
+
+    def save_message(self, session_id: str, role: str, content: str):
+        with self.pool.connection() as conn:
+            conn.execute(self.INSERT_MESSAGE, (session_id, role, content))
+
+    def get_conversation_history(self, session_id: str, limit: int = 50) -> List[Dict]:
+        with self.pool.connection() as conn:
+            rows = conn.execute(self.SELECT_HISTORY, (session_id, limit)).fetchall()
+        return [
+            {"role": row[0], "content": row[1], "timestamp": _format_timestamp(row[2])}
+            for row in rows
+        ]
+
+    def save_recommendation(self, session_id: str, salary: float, savings: float,
+                            monthly_expenses: float, debt: float, goal: str,
+                            time_horizon: int, portfolio: Dict, recommendation_text: str):
+        with self.pool.connection() as conn:
+            self._insert_recommendation(
+                conn, session_id, salary, savings, monthly_expenses, debt, goal,
+                time_horizon, portfolio, recommendation_text
+            )
+
+    def get_latest_recommendation(self, session_id: str) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(self.SELECT_LATEST_RECOMMENDATION, (session_id,)).fetchone()
+        return _recommendation_from_row(row) if row else None
+
+    def clear_conversation(self, session_id: str):
+        with self.pool.connection() as conn:
+            conn.execute(self.DELETE_CONVERSATION, (session_id,))
+
+    def iter_recommendations(self, batch_size: int = 50000) -> Iterator[List[Dict]]:
+        last_id = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(self.SELECT_RECOMMENDATION_BATCH, (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            batch = []
+            for row in rows:
+                record = dict(zip(EXPORT_COLUMNS, row))
+                record["created_at"] = _format_timestamp(record["created_at"])
+                batch.append(record)
+            yield batch
+
+    def bulk_insert_recommendations(self, rows: List[Dict]) -> int:
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                for row in rows:
+                    self._insert_recommendation(
+                        conn, row["session_id"], row.get("salary"), row.get("savings"),
+                        row.get("monthly_expenses"), row.get("debt"), row.get("goal"),
+                        row.get("time_horizon"), row.get("portfolio") or {},
+                        row.get("recommendation_text"), row.get("created_at")
+                    )
+        return len(rows)
+
+    def aggregate_recommendations(self, dimension: str, group_by: List[str]) -> List[Dict]:
+        sql, columns = build_aggregate_query(dimension, group_by)
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        self.pool.close()
+
+    # Native async implementations (psycopg AsyncConnectionPool)
+    async def create_or_get_user_async(self, session_id: str) -> int:
+        pool = await self._get_async_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(self.UPSERT_USER, (session_id,))
+            return (await cursor.fetchone())[0]
+
+    async def save_message_async(self, session_id: str, role: str, content: str):
+        pool = await self._get_async_pool()
+        async with pool.connection() as conn:
+            await conn.execute(self.INSERT_MESSAGE, (session_id, role, content))
+
+    async def get_conversation_history_async(self, session_id: str, limit: int = 50) -> List[Dict]:
+        pool = await self._get_async_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(self.SELECT_HISTORY, (session_id, limit))
+            rows = await cursor.fetchall()
+        return [
+            {"role": row[0], "content": row[1], "timestamp": _format_timestamp(row[2])}
+            for row in rows
+        ]
+
+    async def save_recommendation_async(self, session_id: str, salary: float, savings: float,
+                                        monthly_expenses: float, debt: float, goal: str,
+                                        time_horizon: int, portfolio: Dict, recommendation_text: str):
+        params, prefix, allocations = self._recommendation_params(
+            session_id, salary, savings, monthly_expenses, debt, goal,
+            time_horizon, portfolio, recommendation_text
+        )
+        pool = await self._get_async_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(self.INSERT_RECOMMENDATION, params)
+            recommendation_id = (await cursor.fetchone())[0]
+            if allocations:
+                async with conn.cursor() as allocation_cursor:
+                    await allocation_cursor.executemany(
+                        self.INSERT_ALLOCATION,
+                        [(recommendation_id,) + prefix + alloc for alloc in allocations]
+                    )
+
+    async def get_latest_recommendation_async(self, session_id: str) -> Optional[Dict]:
+        pool = await self._get_async_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(self.SELECT_LATEST_RECOMMENDATION, (session_id,))
+            row = await cursor.fetchone()
+        return _recommendation_from_row(row) if row else None
+
+    async def clear_conversation_async(self, session_id: str):
+        pool = await self._get_async_pool()
+        async with pool.connection() as conn:
+            await conn.execute(self.DELETE_CONVERSATION, (session_id,))
+
+    async def close_async(self):
+        if self._async_pool is not None:
+            await self._async_pool.close()
+            self._async_pool = None
+        self.close()
+
+
+# Pick a backend from a DATABASE_URL (or fall back to the SQLite file)
+def create_storage(database_url: Optional[str], database_path: str) -> StorageBackend:
+    if database_url and database_url.startswith(("postgres://", "postgresql://")):
+        return PostgresStorage(database_url)
+    if database_url and database_url.startswith("sqlite:///"):
+        return SQLiteStorage(database_url[len("sqlite:///"):])
+    return SQLiteStorage(database_path)
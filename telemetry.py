@@ -0,0 +1,426 @@
+"""
+Telemetry
+Prometheus-format metrics and optional OpenTelemetry traces
+
+Metrics live in a small in-process registry (counters, gauges and
+fixed-bucket histograms) so recording on the hot path is a dict lookup and a few adds
+under a lock, with no dependency. Each worker publishes a snapshot of its
+registry to the shared cache, and /metrics merges the snapshots of every
+worker on the host - whichever worker answers the scrape reports them all.
+Counters and histograms of workers that exited are kept in a retired total,
+so the merged counters never go down.
+
+Pipeline stages are timed with stage_span(). With OTEL_TRACES_ENABLED=1 and
+opentelemetry installed, each stage is also an OpenTelemetry span (exported
+over OTLP when the SDK and exporter are installed; configure with the
+standard OTEL_EXPORTER_OTLP_* variables).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional
+
+import shared_cache
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# How often each worker publishes its metrics snapshot
+PUBLISH_INTERVAL_SECONDS = 15
+
+OTEL_TRACES_ENABLED = os.getenv("OTEL_TRACES_ENABLED", "0") == "1"
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "investbuddy")
+
+# Every metric created in this process
+REGISTRY: List["Metric"] = []
+
+
+class Metric:
+    """Base for registry metrics: one value per label combination"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._series: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    # Label values in declaration order
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    # JSON-serializable copy of the current values
+    def snapshot(self) -> Dict:
+        with self._lock:
+            series = [[list(key), _copy(value)] for key, value in self._series.items()]
+        return {"type": self.type, "help": self.help, "label_names": list(self.label_names), "series": series}
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets, plus their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts (last = +Inf), sum, count]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class Gauge(Metric):
+    """Current value, set directly or read from a function at snapshot time"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, label_names=()):
+        super().__init__(name, help, label_names)
+        self._functions: Dict[tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = float(value)
+
+    # Read the value from fn whenever metrics are collected (e.g. a cache's len)
+    def track(self, fn: Callable[[], float], **labels):
+        self._functions[self._key(labels)] = fn
+
+    def snapshot(self) -> Dict:
+        for key, fn in list(self._functions.items()):
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            with self._lock:
+                self._series[key] = value
+        return super().snapshot()
+
+
+def _copy(value):
+    if isinstance(value, list):
+        return [list(value[0]), value[1], value[2]]
+    return value
+
+
+# Time spent in each request pipeline stage (chat: profile, RAG, prompt, LLM, ...)
+STAGE_SECONDS = Histogram(
+    "investbuddy_stage_seconds", "Time spent in each request pipeline stage", ["stage"]
+)
+
+# Whole HTTP requests, by route template
+HTTP_REQUEST_SECONDS = Histogram(
+    "investbuddy_http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+
+
+# Cache lookups by result (hit, shared_hit, expired, miss)
+CACHE_REQUESTS = Counter(
+    "investbuddy_cache_requests_total", "Cache lookups by result", ["cache", "result"]
+)
+CACHE_ENTRIES = Gauge("investbuddy_cache_entries", "Entries held in each in-process cache", ["cache"])
+
+# Cache results that count as hits for the derived hit ratio
+CACHE_HIT_RESULTS = ("hit", "shared_hit")
+
+# Market-data providers (Alpha Vantage, Yahoo Finance, ...)
+PROVIDER_CALLS = Counter(
+    "investbuddy_provider_calls_total", "Provider calls by outcome (ok, empty, rate_limited, error)",
+    ["provider", "outcome"]
+)
+PROVIDER_ERRORS = Counter(
+    "investbuddy_provider_errors_total", "Provider exceptions by class", ["provider", "error_class"]
+)
+PROVIDER_SECONDS = Histogram("investbuddy_provider_seconds", "Provider call latency", ["provider"])
+PROVIDER_FALLBACKS = Counter(
+    "investbuddy_provider_fallbacks_total", "Requests served by a fallback provider",
+    ["from_provider", "to_provider"]
+)
+
+# Embedding model encode calls and texts encoded
+EMBEDDING_ENCODES = Counter("investbuddy_embedding_encodes_total", "Embedding encode calls", ["kind"])
+EMBEDDING_TEXTS = Counter("investbuddy_embedding_texts_total", "Texts embedded", ["kind"])
+
+# LLM calls and token usage
+LLM_REQUESTS = Counter("investbuddy_llm_requests_total", "LLM calls", ["endpoint", "model", "status"])
+LLM_TOKENS = Counter(
+    "investbuddy_llm_tokens_total", "LLM tokens by type (prompt, completion)", ["endpoint", "model", "type"]
+)
+
+
+# Count a cache lookup
+def record_cache(cache: str, result: str):
+    CACHE_REQUESTS.inc(cache=cache, result=result)
+
+
+# Count and time one provider call
+def record_provider_call(provider: str, outcome: str, seconds: float, error: Optional[BaseException] = None):
+    PROVIDER_CALLS.inc(provider=provider, outcome=outcome)
+    PROVIDER_SECONDS.observe(seconds, provider=provider)
+    if error is not None:
+        PROVIDER_ERRORS.inc(provider=provider, error_class=type(error).__name__)
+
+
+# Count an LLM call and its token usage (usage may be None)
+def record_llm_usage(endpoint: str, model: str, usage, status: str = "ok"):
+    LLM_REQUESTS.inc(endpoint=endpoint, model=model, status=status)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, endpoint=endpoint, model=model, type="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, endpoint=endpoint, model=model, type="completion")
+
+
+# ---- OpenTelemetry (optional) ----
+
+_tracer = None
+
+
+# Set up the tracer once, if traces are enabled and opentelemetry is installed
+def _init_tracer():
+    global _tracer
+
+    if not OTEL_TRACES_ENABLED:
+        return
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        print("⚠️ OTEL_TRACES_ENABLED=1 but opentelemetry-api is not installed - traces disabled")
+        return
+
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    except ImportError:
+        # API only: spans go to whatever provider the process was started with
+        # (e.g. opentelemetry-instrument), or nowhere
+        pass
+
+    _tracer = trace.get_tracer("investbuddy")
+
+
+_init_tracer()
+
+
+# Time a block as a pipeline stage (histogram + optional trace span)
+@contextmanager
+def stage_span(stage: str, **attributes) -> Iterator[None]:
+    span = _tracer.start_as_current_span(stage, attributes=attributes) if _tracer else nullcontext()
+    started = time.perf_counter()
+    with span:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+# Attach attributes known only at the end of a stage to the current span
+def set_span_attributes(**attributes):
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+    trace.get_current_span().set_attributes(attributes)
+
+
+# Record a stage measured elsewhere (e.g. time to first token)
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+# Parent span for a whole request, so stage spans nest under it
+def request_span(name: str, **attributes):
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+# ---- Prometheus exposition ----
+
+# This worker's registry as {metric name: snapshot}
+def snapshot_registry() -> Dict[str, Dict]:
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+# Publish this worker's snapshot for the others to merge
+def publish_snapshot() -> Dict[str, Dict]:
+    snapshot = snapshot_registry()
+    shared_cache.set("metrics", str(os.getpid()), snapshot)
+    return snapshot
+
+
+# Whether a worker process on this host is still running
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Counters and histograms of exited workers added to the retired total
+def _fold_retired(retired: Optional[Dict[str, Dict]], snapshots: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    merged = merge_snapshots(([retired] if retired else []) + snapshots)
+    return {
+        name: {**metric, "series": [[list(key), value] for key, value in metric["series"].items()]}
+        for name, metric in merged.items() if metric["type"] in ("counter", "histogram")
+    }
+
+
+# Snapshots of every worker on this host (just this one without a shared cache)
+def collect_snapshots() -> List[Dict[str, Dict]]:
+    """
+    Workers that exited are folded into a persistent "retired" snapshot, so
+    merged counters never go down when a worker is recycled (Prometheus
+    would read the drop as a counter reset). Their gauges are dropped.
+    """
+    current = publish_snapshot()
+    snapshots = shared_cache.get_namespace("metrics", float("inf"))
+    snapshots[str(os.getpid())] = current
+
+    retired = shared_cache.get("metrics_retired", "total", float("inf"))
+    exited = [key for key in snapshots if not _is_running(int(key))]
+    if exited:
+        folded = shared_cache.fold_keys("metrics", exited, "metrics_retired", "total", _fold_retired)
+        # On a fold error the exited snapshots are still reported as they are
+        if folded is not None:
+            retired = folded
+            snapshots = {key: snapshot for key, snapshot in snapshots.items() if key not in exited}
+
+    return list(snapshots.values()) + ([retired] if retired else [])
+
+
+# Sum several snapshots of the same metrics
+def merge_snapshots(snapshots: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "series": {}})
+            for labels, value in metric["series"]:
+                key = tuple(labels)
+                current = target["series"].get(key)
+                if current is None:
+                    target["series"][key] = _copy(value)
+                elif isinstance(value, list):
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                else:
+                    target["series"][key] = current + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in (extra or {}).items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# Render merged metrics in the Prometheus text format (0.0.4)
+def render_prometheus(metrics: Dict[str, Dict]) -> str:
+    lines = []
+    for name, metric in sorted(metrics.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["label_names"]
+
+        for key, value in sorted(metric["series"].items()):
+            if metric["type"] == "histogram":
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(names, key, {'le': _number(bound)})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, key)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(names, key)} {count}")
+            else:
+                lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# Hit ratio per cache, from the merged lookup counts
+def _add_cache_hit_ratios(metrics: Dict[str, Dict]):
+    lookups = metrics.get(CACHE_REQUESTS.name)
+    if not lookups:
+        return
+
+    hits: Dict[tuple, float] = {}
+    totals: Dict[tuple, float] = {}
+    for (cache, result), count in lookups["series"].items():
+        totals[(cache,)] = totals.get((cache,), 0.0) + count
+        if result in CACHE_HIT_RESULTS:
+            hits[(cache,)] = hits.get((cache,), 0.0) + count
+
+    metrics["investbuddy_cache_hit_ratio"] = {
+        "type": "gauge",
+        "help": "Share of cache lookups served from a cache",
+        "label_names": ["cache"],
+        "series": {key: hits.get(key, 0.0) / total for key, total in totals.items() if total > 0},
+    }
+
+
+# /metrics body for every worker on this host
+def render_metrics() -> str:
+    metrics = merge_snapshots(collect_snapshots())
+    _add_cache_hit_ratios(metrics)
+    return render_prometheus(metrics)
+
+
+# Background loop started from the app lifespan
+async def publish_periodically(interval_seconds: float = PUBLISH_INTERVAL_SECONDS):
+    while True:
+        try:
+            await asyncio.to_thread(publish_snapshot)
+        except Exception as e:
+            print(f"Metrics publish error: {e}")
+        await asyncio.sleep(interval_seconds)
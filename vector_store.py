@@ -3,22 +3,35 @@ Vector Store for ETF Knowledge Base
 Simple semantic search using sentence-transformers (no ChromaDB needed)
 """
 
-from sentence_transformers import SentenceTransformer, util
 from etf_knowledge import ETF_KNOWLEDGE_BASE
-import torch
+from telemetry import EMBEDDING_ENCODES, EMBEDDING_TEXTS, stage_span
 import pickle
 import os
 
+# torch and sentence-transformers are imported inside the methods that need
+# them, so importing this module (e.g. from backend.py) stays cheap
+
+# Embedding model used for documents and queries
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Serve the embedding matrix from a memory-mapped .npy file so every worker
+# process on the host shares one copy through the page cache
+MMAP_EMBEDDINGS = os.getenv("VECTOR_STORE_MMAP", "0") == "1"
+
 class ETFVectorStore:
     """Simple vector store for ETF semantic search"""
 
     # Initialize the embedding model
-    def __init__(self, cache_file="./etf_embeddings.pkl"):
-        """Initialize vector store with embedding model"""
+    def __init__(self, cache_file="./etf_embeddings.pkl", lazy=False):
+        """
+        Initialize vector store with embedding model
+
+        With lazy=True nothing is loaded yet - call load_model() and
+        load_embeddings() (the startup orchestrator does this in the background).
+        """
         print("🔄 Initializing ETF Vector Store...")
 
-        # Initialize sentence transformer model (fast and efficient)
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = None
         self.cache_file = cache_file
 
         # Storage for embeddings and metadata
@@ -26,12 +39,30 @@ class ETFVectorStore:
         self.embeddings = None
         self.metadata = []
 
-        # Load or create embeddings
-        if os.path.exists(cache_file):
+        if not lazy:
+            self.load_model()
+            self.load_embeddings()
+
+    # Load the sentence transformer model (fast and efficient)
+    def load_model(self):
+        """Load the embedding model (imports torch on first call)"""
+        if self.embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            self.embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    # Load or create embeddings
+    def load_embeddings(self):
+        """Load the embedding matrix from cache, creating it if missing"""
+        if os.path.exists(self.cache_file):
             self._load_embeddings()
         else:
+            self.load_model()
             self._create_embeddings()
 
+    # Both the model and the embedding matrix are in memory
+    def is_loaded(self):
+        return self.embedding_model is not None and self.embeddings is not None
+
     # Create embeddings for all ETFs
     def _create_embeddings(self):
         """Create embeddings for all ETF knowledge"""
@@ -62,6 +93,8 @@ class ETFVectorStore:
             })
 
         # Generate embeddings
+        EMBEDDING_ENCODES.inc(kind="documents")
+        EMBEDDING_TEXTS.inc(len(self.documents), kind="documents")
         self.embeddings = self.embedding_model.encode(
             self.documents,
             convert_to_tensor=True,
@@ -91,8 +124,36 @@ class ETFVectorStore:
             self.documents = data['documents']
             self.embeddings = data['embeddings']
             self.metadata = data['metadata']
+
+        if MMAP_EMBEDDINGS:
+            self.embeddings = self._mmap_embeddings()
+
         print(f"✅ Loaded {len(self.documents)} ETF embeddings from cache")
 
+    # Map the normalized embedding matrix from a shared .npy file
+    def _mmap_embeddings(self):
+        """
+        Write <cache_file>.npy (L2-normalized float32) if it is missing or
+        older than the pickle, then open it read-only with mmap
+        """
+        import numpy as np
+
+        npy_file = os.path.splitext(self.cache_file)[0] + ".npy"
+        if not os.path.exists(npy_file) or os.path.getmtime(npy_file) < os.path.getmtime(self.cache_file):
+            matrix = np.asarray(
+                self.embeddings.cpu().numpy() if hasattr(self.embeddings, "cpu") else self.embeddings,
+                dtype=np.float32
+            )
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+            # Write then rename so a worker never maps a half-written file
+            tmp_file = f"{npy_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                np.save(f, matrix)
+            os.replace(tmp_file, npy_file)
+
+        return np.load(npy_file, mmap_mode='r')
+
     # Semantic search for ETFs
     def search(self, query, n_results=5):
         """
@@ -105,18 +166,40 @@ class ETFVectorStore:
         Returns:
             List of relevant ETFs with metadata
         """
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode(query, convert_to_tensor=True)
+        EMBEDDING_ENCODES.inc(kind="query")
+        EMBEDDING_TEXTS.inc(kind="query")
+
+        if MMAP_EMBEDDINGS:
+            import numpy as np
+
+            # Memory-mapped matrix is already normalized - cosine is a dot product
+            with stage_span("query_embedding"):
+                query_embedding = self.embedding_model.encode(
+                    query, convert_to_numpy=True, normalize_embeddings=True
+                )
+            with stage_span("vector_search"):
+                cos_scores = self.embeddings @ query_embedding
+                top_indices = np.argsort(-cos_scores)[:n_results]
+                top_results = (cos_scores[top_indices], top_indices)
+        else:
+            from sentence_transformers import util
+            import torch
+
+            # Generate query embedding
+            with stage_span("query_embedding"):
+                query_embedding = self.embedding_model.encode(query, convert_to_tensor=True)
 
-        # Calculate cosine similarities
-        cos_scores = util.cos_sim(query_embedding, self.embeddings)[0]
+            with stage_span("vector_search"):
+                # Calculate cosine similarities
+                cos_scores = util.cos_sim(query_embedding, self.embeddings)[0]
 
-        # Get top results
-        top_results = torch.topk(cos_scores, k=min(n_results, len(cos_scores)))
+                # Get top results
+                top_results = torch.topk(cos_scores, k=min(n_results, len(cos_scores)))
 
         # Format results
         formatted_results = []
         for score, idx in zip(top_results[0], top_results[1]):
+            idx = int(idx)
             symbol = self.metadata[idx]['symbol']
             formatted_results.append({
                 'symbol': symbol,
@@ -166,7 +249,8 @@ class ETFVectorStore:
             if include_live_data:
                 try:
                     from live_etf_data import get_live_etf_data, format_live_data_for_ai
-                    live_data = get_live_etf_data(symbol)
+                    with stage_span("live_data", symbol=symbol):
+                        live_data = get_live_etf_data(symbol)
                     live_info = format_live_data_for_ai(symbol, live_data)
                     context_part += f"\n{live_info}\n"
                 except Exception as e:
@@ -180,6 +264,17 @@ class ETFVectorStore:
 # Global vector store instance
 _vector_store = None
 
+# Install a store loaded elsewhere (startup orchestrator)
+def set_vector_store(store):
+    """Make a fully loaded store the global instance"""
+    global _vector_store
+    _vector_store = store
+
+# Check whether semantic search can run without loading anything
+def is_vector_store_ready():
+    """True once the model and embeddings are in memory"""
+    return _vector_store is not None and _vector_store.is_loaded()
+
 # Get or create vector store instance
 def get_vector_store():
     """Get or create global vector store instance"""
@@ -0,0 +1,99 @@
+"""
+Worker Memory Stats
+Per-process memory reporting for multi-worker deployments
+
+RSS counts pages shared with the parent (copy-on-write model weights) in every
+worker, so it overstates the real cost of adding a worker. PSS splits shared
+pages between the processes using them and is the number to plan with.
+Each worker publishes its stats to the shared cache so any worker can report
+on all of them.
+"""
+
+import asyncio
+import os
+import resource
+import time
+from typing import Dict
+
+import shared_cache
+
+# How often each worker publishes its stats
+PUBLISH_INTERVAL_SECONDS = 30
+
+
+# Parse "Key:   1234 kB" lines from a /proc file into bytes
+def _read_proc_kb(path: str, keys) -> Dict[str, int]:
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in keys:
+                    values[name] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return values
+
+
+# Memory usage of the current process
+def get_process_memory() -> Dict:
+    """
+    Returns:
+        Dict with rss/pss/shared/private bytes (Linux) or peak RSS elsewhere
+    """
+    status = _read_proc_kb("/proc/self/status", {"VmRSS", "VmHWM"})
+    rollup = _read_proc_kb(
+        "/proc/self/smaps_rollup",
+        {"Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"}
+    )
+
+    stats = {
+        "pid": os.getpid(),
+        "ppid": os.getppid(),
+        "updated_at": time.time()
+    }
+
+    if status:
+        stats["rss_bytes"] = status.get("VmRSS")
+        stats["peak_rss_bytes"] = status.get("VmHWM")
+    else:
+        # ru_maxrss is kB on Linux, bytes on macOS
+        stats["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    if rollup:
+        stats["pss_bytes"] = rollup.get("Pss")
+        stats["shared_bytes"] = rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0)
+        stats["private_bytes"] = rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0)
+
+    return stats
+
+
+# Publish this worker's stats for the others to see
+def publish_worker_stats():
+    stats = get_process_memory()
+    shared_cache.set("workers", str(stats["pid"]), stats)
+    return stats
+
+
+# Stats for every live worker on this host
+def get_all_worker_stats() -> Dict:
+    current = publish_worker_stats()
+    workers = shared_cache.get_namespace("workers", PUBLISH_INTERVAL_SECONDS * 3)
+    workers[str(current["pid"])] = current
+
+    pss_values = [w["pss_bytes"] for w in workers.values() if w.get("pss_bytes")]
+    return {
+        "worker_count": len(workers),
+        "total_pss_bytes": sum(pss_values) if pss_values else None,
+        "workers": sorted(workers.values(), key=lambda w: w["pid"])
+    }
+
+
+# Background loop started from the app lifespan
+async def publish_periodically(interval_seconds: float = PUBLISH_INTERVAL_SECONDS):
+    while True:
+        try:
+            await asyncio.to_thread(publish_worker_stats)
+        except Exception as e:
+            print(f"Worker stats error: {e}")
+        await asyncio.sleep(interval_seconds)